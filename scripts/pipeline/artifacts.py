@@ -0,0 +1,135 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+#----- Bump this whenever the on-disk layout changes; readers refuse other formats
+ARTIFACT_FORMAT = 1
+
+META_FILE = 'meta.json'
+
+
+def tmp_path_for(path):
+    #----- Unique per process and thread, so two writers of the same path never share a temp file
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w'):
+    """Open a temp file next to `path` and rename it over `path` once the block exits cleanly.
+
+    Readers see the old file or the whole new one, never a truncated one. On
+    an error the temp file is removed and `path` is left as it was.
+    """
+    tmp_path = tmp_path_for(path)
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+@contextlib.contextmanager
+def atomic_dir(path):
+    """Yield an empty temp directory next to `path`, swapped in for `path` once the block exits cleanly."""
+    tmp_path = tmp_path_for(path)
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        yield tmp_path
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def encode_column(values):
+    """(kind, array, extra meta) for one column: numbers as they are, dates as int64 ns, text dictionary-encoded."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        if not all(isinstance(category, str) for category in categories):
+            raise TypeError(f'{values.name!r}: only string categories can be stored')
+        return 'category', values.cat.codes.to_numpy(dtype=np.int32), {'categories': list(categories)}
+    if pd.api.types.is_datetime64_dtype(values.dtype):
+        return 'datetime', values.to_numpy(dtype='datetime64[ns]').view(np.int64), {}
+    if values.dtype == object:
+        missing = values.isna().to_numpy()
+        if not all(isinstance(value, str) for value in values[~missing]):
+            raise TypeError(f'{values.name!r}: object columns must hold strings or missing values')
+        codes, categories = pd.factorize(values)
+        return 'string', codes.astype(np.int32), {'categories': list(categories)}
+    if values.dtype.kind in 'biuf':
+        return 'numeric', values.to_numpy(), {}
+    raise TypeError(f'{values.name!r}: cannot store dtype {values.dtype}')
+
+
+def decode_column(column, array):
+    if column['kind'] == 'category':
+        return pd.Categorical.from_codes(array, categories=column['categories'])
+    if column['kind'] == 'datetime':
+        return array.view('datetime64[ns]')
+    if column['kind'] == 'string':
+        #----- Back to plain object strings, NaN where the code is -1, like read_csv gives
+        categories = np.array(column['categories'] + [np.nan], dtype=object)
+        return categories[array]
+    return array
+
+
+def write_frame(frame, path):
+    """Write `frame` as a directory of one .npy file per column plus meta.json; returns its content digest.
+
+    Columns keep their types (ints, floats, bools, datetimes, categoricals;
+    text is dictionary-encoded), so reading back needs no parsing. A
+    non-default index is stored as one more column. The directory is built
+    next to `path` and renamed into place, so readers never see half of it.
+    """
+    default_index = isinstance(frame.index, pd.RangeIndex) and frame.index.start == 0 and frame.index.step == 1
+    columns = [(name, frame[name]) for name in frame.columns]
+    if not default_index:
+        columns.append((frame.index.name, frame.index.to_series()))
+
+    with atomic_dir(path) as tmp_path:
+        digest = hashlib.sha256()
+        meta = {'format': ARTIFACT_FORMAT, 'rows': len(frame), 'columns': []}
+        for i, (name, values) in enumerate(columns):
+            kind, array, extra = encode_column(values)
+            array = np.ascontiguousarray(array)
+            np.save(os.path.join(tmp_path, f'{i}.npy'), array, allow_pickle=False)
+            meta['columns'].append({'name': name, 'kind': kind, 'dtype': array.dtype.str, **extra})
+            digest.update(array.tobytes())
+        meta['index'] = not default_index
+        digest.update(json.dumps(meta, sort_keys=True).encode())
+        meta['digest'] = digest.hexdigest()
+        with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=1)
+    return meta['digest']
+
+
+def read_meta(path):
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f'{path}: artifact format {meta.get("format")}, expected {ARTIFACT_FORMAT}')
+    return meta
+
+
+def read_frame(path):
+    meta = read_meta(path)
+    arrays = [
+        decode_column(column, np.load(os.path.join(path, f'{i}.npy'), allow_pickle=False))
+        for i, column in enumerate(meta['columns'])
+    ]
+    names = [column['name'] for column in meta['columns']]
+    index = None
+    if meta['index']:
+        index = pd.Index(arrays.pop(), name=names.pop())
+    return pd.DataFrame(dict(zip(names, arrays)), index=index, columns=names)
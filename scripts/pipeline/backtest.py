@@ -0,0 +1,244 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.special import xlogy
+
+from pipeline import artifacts, forecast, glm
+
+CACHE_DIR = os.environ.get('AMTRAK_BACKTEST_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'amtrak_backtest'))
+
+#----- Bump this whenever a model or the fold layout changes; every fold is recomputed
+CACHE_FORMAT = 1
+
+#----- Default rolling origins: a cutoff every STEP months from FIRST_CUTOFF, each scored HORIZON months ahead
+FIRST_CUTOFF = '2019-01-01'
+STEP = 3
+HORIZON = 12
+
+#----- Stations with fewer training months than this sit a fold out
+MIN_TRAIN_MONTHS = len(forecast.DESIGN_COLUMNS)
+
+METRIC_COLUMNS = ['model', 'station_name', 'horizon', 'folds', 'mape', 'deviance']
+
+#----- Set in each worker by init_worker, so the grid crosses the process boundary once per worker
+_grid = None
+
+
+def month_grid(amtrak_df):
+    """Dense station x month grid of rides with the shared designs, built once for every fold.
+
+    Returns a dict with station names, the months, rides (NaN where a station
+    has no row), the fit design (month starts) and the forecast design
+    (month ends, as forecast.station_blocks dates future months), both
+    months x 13 and shared by every station.
+    """
+    amtrak_df = amtrak_df[amtrak_df['Rides'].notna()]
+    year_month = forecast.month_starts(amtrak_df)
+    months = pd.period_range(year_month.min(), year_month.max(), freq='M')
+    codes, names = pd.factorize(amtrak_df['station_name'], sort=True)
+    position = (year_month.dt.year - months[0].year) * 12 + year_month.dt.month - months[0].month
+
+    rides = np.full((len(names), len(months)), np.nan)
+    rides[codes, position.to_numpy()] = amtrak_df['Rides'].to_numpy(dtype=np.float64)
+
+    start = months[0].to_timestamp()
+    month_ends = months.to_timestamp(how='end').normalize()
+    return {
+        'names': np.asarray(names, dtype=object),
+        'months': months.to_timestamp(),
+        'rides': rides,
+        'X_fit': forecast.design_matrix((months.to_timestamp() - start).days, months.month),
+        'X_forecast': forecast.design_matrix((month_ends - start).days, months.month)
+    }
+
+
+def grid_digest(grid):
+    digest = hashlib.sha256(json.dumps([CACHE_FORMAT, list(grid['names'])]).encode())
+    digest.update(grid['months'].to_numpy().tobytes())
+    digest.update(grid['rides'].tobytes())
+    return digest.hexdigest()
+
+
+def rolling_cutoffs(grid, first=FIRST_CUTOFF, step=STEP):
+    #----- Every `step` months from `first` up to the last month, so each fold has something to score
+    months = grid['months']
+    return list(months[months >= pd.Timestamp(first)][::step])
+
+
+def poisson_model(grid, rides, train):
+    #----- The production model: Poisson GLM on date_num + C(month), all stations in one batched IRLS
+    X3 = np.broadcast_to(grid['X_fit'], (len(rides),) + grid['X_fit'].shape)
+    y2 = np.where(train, rides, 0.0)
+    coefs, _, _, _ = glm.poisson_irls(X3, y2, train, forecast.dropped_columns(X3, train))
+    return glm.poisson_mean(np.broadcast_to(grid['X_forecast'], X3.shape), coefs)
+
+
+def seasonal_naive_model(grid, rides, train):
+    #----- Same calendar month in the last training year it was seen
+    rides = np.where(train, rides, np.nan)
+    predictions = np.full(rides.shape, np.nan)
+    last = np.flatnonzero(train.any(axis=0)).max() if train.any() else -1
+    for j in range(last + 1, rides.shape[1]):
+        back = j - 12 * ((j - last - 1) // 12 + 1)
+        if back >= 0:
+            predictions[:, j] = rides[:, back]
+    return predictions
+
+
+MODELS = {
+    'poisson': poisson_model,
+    'seasonal_naive': seasonal_naive_model
+}
+
+
+def init_worker(grid):
+    global _grid
+    _grid = grid
+
+
+def run_fold(task):
+    """Forecasts and actuals (stations x horizon) for one model and cutoff."""
+    model, cutoff, horizon = task
+    grid = _grid
+    months = grid['months']
+    observed = ~np.isnan(grid['rides'])
+    train = observed & np.asarray(months < cutoff)[None, :]
+    #----- Stations short of MIN_TRAIN_MONTHS are left out before fitting: one singular station would fail the whole batched solve
+    enough = train.sum(axis=1) >= MIN_TRAIN_MONTHS
+
+    predictions = np.full(train.shape, np.nan)
+    if enough.any():
+        predictions[enough] = MODELS[model](grid, grid['rides'][enough], train[enough])
+    first = int(np.searchsorted(months.to_numpy(), np.datetime64(cutoff)))
+    window = slice(first, first + horizon)
+    actuals = np.where(observed[:, window], grid['rides'][:, window], np.nan)
+    predicted = predictions[:, window]
+
+    #----- Pad short windows at the end of the data out to the full horizon
+    pad = horizon - actuals.shape[1]
+    if pad:
+        actuals = np.pad(actuals, ((0, 0), (0, pad)), constant_values=np.nan)
+        predicted = np.pad(predicted, ((0, 0), (0, pad)), constant_values=np.nan)
+    return predicted, actuals
+
+
+class FoldCache:
+    """Fold results on disk under <sha256 of data, model, cutoff, horizon>.npz."""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, data_digest, model, cutoff, horizon):
+        key = hashlib.sha256(f'{data_digest}|{model}|{pd.Timestamp(cutoff).date()}|{horizon}'.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def get(self, *key):
+        try:
+            with np.load(self.path(*key)) as fold:
+                return fold['predicted'], fold['actuals']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, predicted, actuals):
+        #----- Write then rename so a crash never leaves a truncated fold behind
+        with artifacts.atomic_write(self.path(*key), 'wb') as f:
+            np.savez(f, predicted=predicted, actuals=actuals)
+
+
+def fold_metrics(predicted, actuals):
+    #----- Absolute percentage error and Poisson deviance per station and horizon step; NaN where unscored
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ape = np.where(actuals > 0, np.abs(actuals - predicted) / actuals, np.nan)
+        deviance = 2 * (xlogy(actuals, actuals / predicted) - (actuals - predicted))
+    return ape, deviance
+
+
+def backtest(amtrak_df, first_cutoff=FIRST_CUTOFF, step=STEP, horizon=HORIZON, models=tuple(MODELS), workers=None,
+             cache_dir=CACHE_DIR, cutoffs=None):
+    """Score every model over rolling-origin folds; fold results are cached on disk.
+
+    Cutoffs run every `step` months from `first_cutoff` (or are given as
+    `cutoffs`); each fold trains on every month before its cutoff and
+    forecasts the `horizon` months from it on. Folds the cache doesn't have
+    run on a process pool (`workers=0` runs them in-process), every worker
+    getting the shared grid once. Returns (metrics, report): metrics has one row per
+    model, station and horizon step with the folds scored, MAPE (%) and mean
+    Poisson deviance; the report counts folds computed and read from cache.
+    """
+    grid = month_grid(amtrak_df)
+    cutoffs = rolling_cutoffs(grid, first_cutoff, step) if cutoffs is None else [pd.Timestamp(cutoff) for cutoff in cutoffs]
+    cache = FoldCache(cache_dir) if cache_dir else None
+    data_digest = grid_digest(grid)
+
+    tasks = [(model, cutoff, horizon) for model in models for cutoff in cutoffs]
+    results = {task: cache.get(data_digest, *task) if cache else None for task in tasks}
+    todo = [task for task in tasks if results[task] is None]
+
+    if todo and workers == 0:
+        init_worker(grid)
+        computed = [run_fold(task) for task in todo]
+    elif todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(grid,)) as pool:
+            computed = list(pool.map(run_fold, todo))
+    else:
+        computed = []
+    for task, fold in zip(todo, computed):
+        results[task] = fold
+        if cache:
+            cache.put((data_digest,) + task, *fold)
+
+    frames = []
+    for model in models:
+        ape, deviance = zip(*(fold_metrics(*results[(model, cutoff, horizon)]) for cutoff in cutoffs))
+        ape, deviance = np.stack(ape), np.stack(deviance)
+        scored = ~np.isnan(ape) & ~np.isnan(deviance)
+        folds = scored.sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            mape = 100 * np.where(scored, ape, 0).sum(axis=0) / folds
+            mean_deviance = np.where(scored, deviance, 0).sum(axis=0) / folds
+        frames.append(pd.DataFrame({
+            'model': model,
+            'station_name': np.repeat(grid['names'], horizon),
+            'horizon': np.tile(np.arange(1, horizon + 1), len(grid['names'])),
+            'folds': folds.ravel(),
+            'mape': mape.ravel(),
+            'deviance': mean_deviance.ravel()
+        }, columns=METRIC_COLUMNS))
+
+    metrics = pd.concat(frames, ignore_index=True)
+    metrics = metrics[metrics['folds'] > 0].reset_index(drop=True)
+    return metrics, {'folds': len(tasks), 'computed': len(todo), 'cached': len(tasks) - len(todo)}
+
+
+def summary(metrics):
+    #----- Model x horizon: median station MAPE and mean deviance
+    return metrics.groupby(['model', 'horizon']).agg(
+        stations=('station_name', 'nunique'),
+        median_mape=('mape', 'median'),
+        mean_deviance=('deviance', 'mean')
+    ).reset_index()
+
+
+if __name__ == '__main__':
+    #----- python -m pipeline.backtest amtrak_df_v2.csv backtest.csv [--first-cutoff 2019-01-01 --step 3]  (from scripts/)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('src')
+    parser.add_argument('out')
+    parser.add_argument('--first-cutoff', default=FIRST_CUTOFF)
+    parser.add_argument('--step', type=int, default=STEP)
+    parser.add_argument('--horizon', type=int, default=HORIZON)
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--workers', type=int, default=None, help='0 runs folds in-process')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+
+    metrics, report = backtest(pd.read_csv(args.src), args.first_cutoff, args.step, args.horizon, args.models, args.workers, args.cache_dir)
+    metrics.to_csv(args.out, index=False)
+    print(f"{report['folds']} folds: {report['computed']} computed, {report['cached']} from cache")
+    print(summary(metrics).to_string(index=False))
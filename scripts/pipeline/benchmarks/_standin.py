@@ -0,0 +1,116 @@
+"""Local HTTP stand-in for railpassengers.org, serving generated fixture fact sheets.
+
+The index page has the same <option> layout the scraper filters (including a
+route sheet and the thruway sheet it must skip). Every PDF carries an ETag and
+Last-Modified and answers conditional requests with 304, and `latency` adds a
+per-request delay so concurrency shows up like it would over the network.
+"""
+import email.utils
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pymupdf
+
+YEARS = list(range(2016, 2023))
+
+
+def fixture_pdf(station_name, abbrev, address, rides):
+    document = pymupdf.open()
+    page = document.new_page()
+    lines = [f'{station_name} ({abbrev})', address, 'Amtrak ridership by fiscal year']
+    lines += [f'FY{year}  {value:,}' for year, value in zip(YEARS, rides)]
+    page.insert_text((72, 72), '\n'.join(lines), fontsize=11)
+    content = document.tobytes()
+    document.close()
+    return content
+
+
+def fixture_sheets(num_stations=60):
+    #----- {path: pdf bytes}, ridership deterministic per station, all in the 10,000-99,999 range the regex expects
+    sheets = {}
+    for i in range(num_stations):
+        abbrev = f'{chr(65 + i // 26 % 26)}{chr(65 + i % 26)}S'
+        seed = int(hashlib.sha1(abbrev.encode()).hexdigest()[:6], 16)
+        rides = [10000 + (seed * (year - 2010)) % 89000 for year in YEARS]
+        path = f'/site/assets/files/{1000 + i}/{abbrev.lower()}.pdf'
+        sheets[path] = fixture_pdf(f'Station {abbrev}, ST', abbrev, f'{i + 1} Main St Town, ST 0{i:04d}', rides)
+    return sheets
+
+
+class StandIn:
+    """Threaded server; `sheets` can be edited between crawls to simulate a changed sheet."""
+
+    def __init__(self, sheets, latency=0.0):
+        self.sheets = dict(sheets)
+        self.latency = latency
+        self.modified = {path: time.time() - 86400 for path in self.sheets}
+        self.hits = {200: 0, 304: 0, 404: 0}
+        self._lock = threading.Lock()
+
+        options = ['<option value="">Select a station</option>']
+        options += [f'<option value="{path}">{path}</option>' for path in self.sheets]
+        options += [
+            '<option value="/site/assets/files/9001/ca01.pdf">Route sheet</option>',
+            '<option value="/site/assets/files/6872/thruway.pdf">Thruway</option>'
+        ]
+        self.index_html = f"<html><body><select>{''.join(options)}</select></body></html>".encode()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def update(self, path, content):
+        self.sheets[path] = content
+        self.modified[path] = time.time()
+
+    def _count(self, status):
+        with self._lock:
+            self.hits[status] += 1
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                time.sleep(standin.latency)
+                if self.path == '/resources/ridership-statistics/':
+                    return self._send(200, standin.index_html, {'Content-Type': 'text/html'})
+
+                content = standin.sheets.get(self.path)
+                if content is None:
+                    standin._count(404)
+                    return self._send(404)
+
+                etag = '"' + hashlib.md5(content).hexdigest() + '"'
+                last_modified = email.utils.formatdate(standin.modified[self.path], usegmt=True)
+                if self.headers.get('If-None-Match') == etag:
+                    standin._count(304)
+                    return self._send(304, headers={'ETag': etag, 'Last-Modified': last_modified})
+
+                standin._count(200)
+                self._send(200, content, {'Content-Type': 'application/pdf', 'ETag': etag, 'Last-Modified': last_modified})
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
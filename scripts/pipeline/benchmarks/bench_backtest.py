@@ -0,0 +1,89 @@
+"""Serial per-fold refitting vs. the rolling-origin backtest harness.
+
+The serial version is what evaluating one more cutoff looks like today:
+slice the training months, rebuild the designs and refit every station with
+statsmodels. Checks the harness forecasts the notebook's 2021-07-01 split
+the same way forecast.fit_stations does, then times serial refits, the
+harness cold (in-process and on a pool) and warm from its fold cache.
+Exits non-zero on any mismatch.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_backtest.py [--workers 2]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import numpy as np
+import pandas as pd
+
+from pipeline import backtest, forecast
+from pipeline.benchmarks.bench_forecast import imputed_input, timed
+
+
+def serial_folds(amtrak_df, cutoffs, horizon):
+    #----- One full statsmodels refit per cutoff, designs rebuilt every time
+    month = forecast.month_starts(amtrak_df)
+    origin = forecast.date_origin(amtrak_df)
+    return [
+        forecast.fit_stations(amtrak_df[(month < cutoff).to_numpy()], horizon, workers=0, origin=origin)[2]
+        for cutoff in cutoffs
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--serial-folds', type=int, default=4, help='cutoffs to time the serial refits on')
+    args = parser.parse_args()
+
+    amtrak_df = imputed_input()
+    failures = []
+
+    #----- The notebook's split: its 18 months of forecasts, straight from forecast.fit_stations
+    cutoff, horizon = pd.Timestamp(forecast.CUTOFF_DATE), 18
+    with tempfile.TemporaryDirectory() as cache_dir:
+        backtest.backtest(amtrak_df, models=['poisson'], horizon=horizon, workers=0, cache_dir=cache_dir, cutoffs=[cutoff])
+        fold = backtest.FoldCache(cache_dir).get(backtest.grid_digest(backtest.month_grid(amtrak_df)), 'poisson', cutoff, horizon)
+    expected = serial_folds(amtrak_df, [cutoff], horizon)[0]
+    if fold is None or not np.allclose(fold[0], expected, rtol=1e-7):
+        failures.append(f'{cutoff.date()} fold forecasts differ from forecast.fit_stations')
+
+    grid = backtest.month_grid(amtrak_df)
+    cutoffs = backtest.rolling_cutoffs(grid)
+    n_tasks = len(cutoffs) * len(backtest.MODELS)
+    print(f"{'version':<40}{'folds':>7}{'seconds':>10}{'s/fold':>9}")
+    _, serial_s = timed(lambda: serial_folds(amtrak_df, cutoffs[:args.serial_folds], backtest.HORIZON))
+    print(f"{'serial statsmodels refits (poisson)':<40}{args.serial_folds:>7}{serial_s:>10.3f}{serial_s / args.serial_folds:>9.3f}")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        (metrics, report), inprocess_s = timed(lambda: backtest.backtest(amtrak_df, workers=0, cache_dir=cache_dir))
+        print(f"{'harness, in-process, cold':<40}{report['computed']:>7}{inprocess_s:>10.3f}{inprocess_s / n_tasks:>9.3f}")
+        (warm_metrics, report), warm_s = timed(lambda: backtest.backtest(amtrak_df, workers=0, cache_dir=cache_dir))
+        print(f"{'harness, warm cache':<40}{report['cached']:>7}{warm_s:>10.3f}{warm_s / n_tasks:>9.3f}")
+        if report['computed']:
+            failures.append(f"warm run recomputed {report['computed']} folds")
+        if not warm_metrics.equals(metrics):
+            failures.append('cached metrics differ from computed ones')
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        (pool_metrics, report), pool_s = timed(lambda: backtest.backtest(amtrak_df, workers=args.workers, cache_dir=cache_dir))
+        print(f"{'harness, pool, cold':<40}{report['computed']:>7}{pool_s:>10.3f}{pool_s / n_tasks:>9.3f}")
+        if not np.allclose(pool_metrics[['mape', 'deviance']].to_numpy(), metrics[['mape', 'deviance']].to_numpy(), equal_nan=True):
+            failures.append('pool metrics differ from in-process ones')
+    print(f'({os.cpu_count()} cores here)')
+    print()
+    print(backtest.summary(metrics).to_string(index=False))
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
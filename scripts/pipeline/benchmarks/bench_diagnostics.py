@@ -0,0 +1,125 @@
+"""Per-model get_influence() diagnostics vs. one vectorized closed-form pass.
+
+Fits every station with statsmodels once, then builds the notebook's
+diagnostics table two ways: get_influence() per model plus separate
+residual expressions, and diagnostics.fitted_diagnostics over all stations
+at once. Checks the tables agree, checks the calibration leverage against
+statsmodels' prediction variance, and reports time and peak memory of both.
+Exits non-zero on any mismatch.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_diagnostics.py [--station-copies 1 4]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+
+from pipeline import diagnostics, forecast, glm
+from pipeline.benchmarks.bench_forecast import imputed_input, more_stations, timed
+
+
+def fit_all(X, y, bounds):
+    #----- One statsmodels result per station, fitted once and shared by both diagnostics versions
+    warnings.simplefilter('ignore')
+    return [sm.Poisson(y[lo:hi], X[lo:hi]).fit(disp=False) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def per_model_diagnostics(names, results):
+    #----- The notebook's loop body, minus the fit
+    rows = []
+    for name, model in zip(names, results):
+        y_true = model.model.endog
+        y_pred = model.predict()
+        deviance_residuals = np.sign(y_true - y_pred) * np.sqrt(2 * (y_true * np.log(y_true / y_pred) - (y_true - y_pred)))
+        pearson_residuals = (y_true - y_pred) / np.sqrt(y_pred)
+        influence = model.get_influence()
+        leverage = influence.hat_matrix_diag
+        cooks_distance = influence.cooks_distance[0]
+        rows.append([
+            name,
+            np.mean(deviance_residuals), np.std(deviance_residuals),
+            np.mean(pearson_residuals), np.std(pearson_residuals),
+            np.mean(leverage), np.std(leverage),
+            np.mean(cooks_distance), np.std(cooks_distance)
+        ])
+    return pd.DataFrame(rows, columns=diagnostics.DIAGNOSTIC_COLUMNS)
+
+
+def vectorized_diagnostics(names, X, y, bounds, results):
+    X3, y2, mask = glm.pad_blocks(X, y, bounds)
+    mu = glm.pad_rows(np.concatenate([model.predict() for model in results]), bounds)
+    return diagnostics.fitted_diagnostics(names, X3, y2, mask, mu, forecast.dropped_columns(X3, mask))
+
+
+def measured(func):
+    #----- (result, seconds, peak MB allocated while it ran)
+    tracemalloc.start()
+    result, seconds = timed(func)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+
+def check_calibration_leverage(amtrak_df, comparison, failures):
+    #----- Held-out leverage is mu * Var(x'b); statsmodels' get_prediction gives that variance
+    in_train = forecast.month_starts(amtrak_df) < pd.Timestamp(forecast.CUTOFF_DATE)
+    train, calib = amtrak_df[in_train.to_numpy()], amtrak_df[~in_train.to_numpy()]
+    origin = forecast.date_origin(train)
+    names, X, y, bounds, _, _ = forecast.station_blocks(train, 1, origin)
+    _, X_new, y_new, bounds_new, _, _ = forecast.station_blocks(calib, 1, origin)
+
+    expected = []
+    for model, lo, hi in zip(fit_all(X, y, bounds), bounds_new[:-1], bounds_new[1:]):
+        prediction = model.get_prediction(X_new[lo:hi], which='linear')
+        expected.append(np.mean(np.exp(prediction.predicted) * prediction.se ** 2))
+    ours = comparison.set_index('station_name').loc[names, 'mean_leverage_calib'].to_numpy()
+    if not np.allclose(ours, expected, rtol=1e-6):
+        failures.append('calibration leverage differs from statsmodels prediction variance')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--station-copies', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+
+    amtrak_df = imputed_input()
+    failures = []
+
+    print(f"{'stations':>9}{'get_influence s':>17}{'peak MB':>9}{'vectorized s':>14}{'peak MB':>9}")
+    for copies in args.station_copies:
+        scaled = more_stations(amtrak_df, copies)
+        names, X, y, bounds, _, _ = forecast.station_blocks(scaled)
+        results = fit_all(X, y, bounds)
+        expected, loop_s, loop_mb = measured(lambda: per_model_diagnostics(names, results))
+        ours, vector_s, vector_mb = measured(lambda: vectorized_diagnostics(names, X, y, bounds, results))
+        print(f'{len(names):>9}{loop_s:>17.3f}{loop_mb:>9.1f}{vector_s:>14.3f}{vector_mb:>9.1f}')
+
+        stats = diagnostics.DIAGNOSTIC_COLUMNS[1:]
+        if not ours['station_name'].equals(expected['station_name']):
+            failures.append(f'{copies}x: station order differs')
+        if not np.allclose(ours[stats].to_numpy(), expected[stats].to_numpy(), rtol=1e-6, atol=1e-9):
+            failures.append(f'{copies}x: diagnostics differ from get_influence()')
+
+    comparison = forecast.calibration_diagnostics(amtrak_df, workers=0)
+    check_calibration_leverage(amtrak_df, comparison, failures)
+    print()
+    print(comparison[['station_name', 'mean_leverage_train', 'mean_leverage_calib',
+                      'mean_deviance_residuals_train', 'mean_deviance_residuals_calib']].head().to_string(index=False))
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Notebook iterrows disaggregation vs. the broadcast version, scaled up to 100x the station count.
+
+Checks the broadcast output against the notebook function (and the committed
+data/amtrak_df.csv), then times both and tracks peak memory of the in-memory
+and chunked paths as stations are replicated synthetically. Exits non-zero if
+the outputs differ.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_disaggregate.py [--scales 1 10 100]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import pandas as pd
+
+from pipeline import disaggregate
+from pipeline.benchmarks.bench_geocode import REPO_DATA_DIR, cleaned_pcrd
+
+
+def yearly_to_monthly_seasonal(df, proportions):
+    #----- Verbatim from the cleanup notebook
+    monthly_data = []
+    for _, row in df.iterrows():
+        year = row['year']
+        total = row['rides']
+        for month, proportion in enumerate(proportions, start=1):
+            monthly_value = total * proportion
+            monthly_row = {
+                'Year': year,
+                'Month': month,
+                'Rides': monthly_value,
+                'address': row['address'],
+                'state': row['state'],
+                'station_name': row['station_name'],
+                'abbrev': row['abbrev'],
+                'lat': row['lat'],
+                'lon': row['lon']
+            }
+            monthly_data.append(monthly_row)
+    return pd.DataFrame(monthly_data)
+
+
+def yearly_input():
+    #----- Cleaned pcrd.csv with the coordinates amtrak_df.csv ended up with
+    coords = pd.read_csv(os.path.join(REPO_DATA_DIR, 'amtrak_df.csv'))[['station_name', 'lat', 'lon']].drop_duplicates(subset='station_name')
+    return cleaned_pcrd().merge(coords, on='station_name', how='left')
+
+
+def replicate(yearly_df, scale):
+    #----- `scale` copies of every station under new names
+    copies = []
+    for i in range(scale):
+        copy = yearly_df.copy()
+        if i:
+            copy['station_name'] = copy['station_name'] + f' #{i}'
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--chunk-rows', type=int, default=disaggregate.CHUNK_ROWS)
+    args = parser.parse_args()
+
+    yearly_df = yearly_input()
+    failures = []
+
+    notebook = yearly_to_monthly_seasonal(yearly_df, disaggregate.SEASONAL_PROPORTIONS)
+    broadcast = disaggregate.yearly_to_monthly(yearly_df)
+    try:
+        pd.testing.assert_frame_equal(broadcast, notebook, check_dtype=False)
+    except AssertionError as e:
+        failures.append(f'broadcast output differs from the notebook function: {e}')
+    committed = pd.read_csv(os.path.join(REPO_DATA_DIR, 'amtrak_df.csv'), index_col=0)
+    try:
+        pd.testing.assert_frame_equal(broadcast, committed, check_dtype=False)
+    except AssertionError as e:
+        failures.append(f'broadcast output differs from data/amtrak_df.csv: {e}')
+    chunked = pd.concat(disaggregate.iter_yearly_to_monthly(yearly_df, chunk_rows=500))
+    if not chunked.equals(broadcast):
+        failures.append('chunked output differs from the in-memory output')
+
+    notebook_s, notebook_peak = measure(lambda: yearly_to_monthly_seasonal(yearly_df, disaggregate.SEASONAL_PROPORTIONS))
+
+    print(f"{'version':<26}{'stations':>10}{'monthly rows':>14}{'seconds':>10}{'ns/row':>9}{'peak MB':>10}")
+    print(f"{'notebook iterrows':<26}{yearly_df['station_name'].nunique():>10}{len(notebook):>14}{notebook_s:>10.3f}"
+          f"{notebook_s / len(notebook) * 1e9:>9.0f}{notebook_peak / 2 ** 20:>10.1f}")
+    for scale in args.scales:
+        scaled = replicate(yearly_df, scale)
+        rows = len(scaled) * 12
+        in_memory_s, in_memory_peak = measure(lambda: disaggregate.yearly_to_monthly(scaled))
+        chunked_s, chunked_peak = measure(lambda: sum(len(c) for c in disaggregate.iter_yearly_to_monthly(scaled, chunk_rows=args.chunk_rows)))
+        stations = scaled['station_name'].nunique()
+        for name, seconds, peak in (('broadcast, in memory', in_memory_s, in_memory_peak), ('broadcast, chunked', chunked_s, chunked_peak)):
+            print(f"{name:<26}{stations:>10}{rows:>14}{seconds:>10.3f}{seconds / rows * 1e9:>9.0f}{peak / 2 ** 20:>10.1f}")
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
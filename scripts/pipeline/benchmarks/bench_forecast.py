@@ -0,0 +1,146 @@
+"""Forecasting notebook's serial smf.poisson loop vs. the sharded process pool version.
+
+Replays the notebook cell (formula parsed per station, model.predict on a
+future frame, get_influence() diagnostics), checks the pooled version gets
+the same coefficients, forecasts and diagnostics and writes the layout of
+data/amtrak_preds_df.csv, then times the pool across worker counts.
+Exits non-zero on any mismatch.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_forecast.py [--workers 0 1 2 4] [--station-copies 2]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import numpy as np
+import pandas as pd
+import statsmodels.formula.api as smf
+
+from pipeline import forecast, impute, routes
+from pipeline.benchmarks.bench_geocode import REPO_DATA_DIR
+from pipeline.benchmarks.bench_impute import prepped_input
+from pipeline.diagnostics import DIAGNOSTIC_COLUMNS
+
+
+def notebook_forecast(amtrak_df, forecast_horizon=forecast.HORIZON):
+    #----- The notebook cell, minus the plots; returns coefficients, forecasts and diagnostics per station
+    warnings.simplefilter('ignore')
+    amtrak_df = amtrak_df.copy()
+    amtrak_df['year_month'] = forecast.month_starts(amtrak_df)
+    amtrak_df['date_num'] = (amtrak_df['year_month'] - amtrak_df['year_month'].min()).dt.days
+    amtrak_df['month'] = amtrak_df['year_month'].dt.month
+    formula = 'Rides ~ date_num + C(month)'
+
+    params, future_predictions, diagnostic_stats = {}, {}, []
+    for group_name, group_data in amtrak_df.groupby('station_name'):
+        model = smf.poisson(formula=formula, data=group_data).fit(disp=False)
+        params[group_name] = model.params[forecast.DESIGN_COLUMNS].to_numpy()
+
+        future_dates = pd.date_range(start=group_data['year_month'].max() + pd.DateOffset(months=1), periods=forecast_horizon, freq='M')
+        future_data = pd.DataFrame({
+            'date_num': (future_dates - amtrak_df['year_month'].min()).days,
+            'month': future_dates.month
+        })
+        future_predictions[group_name] = model.predict(future_data).to_numpy()
+
+        y_true = group_data['Rides']
+        y_pred = model.predict(group_data)
+        deviance_residuals = np.sign(y_true - y_pred) * np.sqrt(2 * (y_true * np.log(y_true / y_pred) - (y_true - y_pred)))
+        pearson_residuals = (y_true - y_pred) / np.sqrt(y_pred)
+        influence = model.get_influence()
+        leverage = influence.hat_matrix_diag
+        cooks_distance = influence.cooks_distance[0]
+        diagnostic_stats.append({
+            'station_name': group_name,
+            'mean_deviance_residuals': np.mean(deviance_residuals),
+            'std_deviance_residuals': np.std(deviance_residuals),
+            'mean_pearson_residuals': np.mean(pearson_residuals),
+            'std_pearson_residuals': np.std(pearson_residuals),
+            'mean_leverage': np.mean(leverage),
+            'std_leverage': np.std(leverage),
+            'mean_cooks_distance': np.mean(cooks_distance),
+            'std_cooks_distance': np.std(cooks_distance)
+        })
+    return params, future_predictions, pd.DataFrame(diagnostic_stats)
+
+
+def imputed_input():
+    #----- amtrak_df_v2: routes assigned, gaps filled
+    filled, _ = impute.impute_missing(routes.assign_routes(prepped_input()))
+    return filled
+
+
+def more_stations(amtrak_df, copies):
+    #----- Every station again under a new name, so there is more fitting to spread over the pool
+    return pd.concat(
+        [amtrak_df] + [amtrak_df.assign(station_name=amtrak_df['station_name'] + f' #{i}') for i in range(1, copies)],
+        ignore_index=True
+    )
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--station-copies', type=int, default=2)
+    args = parser.parse_args()
+
+    amtrak_df = imputed_input()
+    failures = []
+
+    (params, future_predictions, notebook_diagnostics), notebook_s = timed(lambda: notebook_forecast(amtrak_df))
+    names, coefs, forecasts, _, diagnostics = forecast.fit_stations(amtrak_df, workers=2)
+
+    if list(names) != list(params):
+        failures.append('stations differ from the notebook')
+    else:
+        expected_coefs = np.array([params[name] for name in names])
+        expected_forecasts = np.array([future_predictions[name] for name in names])
+        if not np.allclose(coefs, expected_coefs, rtol=1e-8, atol=1e-12):
+            failures.append('coefficients differ from the notebook')
+        if not np.allclose(forecasts, expected_forecasts, rtol=1e-8):
+            failures.append('forecasts differ from the notebook')
+        stats = DIAGNOSTIC_COLUMNS[1:]
+        if not np.allclose(diagnostics[stats].to_numpy(), notebook_diagnostics[stats].to_numpy(), rtol=1e-6, atol=1e-9, equal_nan=True):
+            failures.append('diagnostics differ from the notebook')
+
+    #----- Same layout, stations and months as the shipped file (its GLM values came from a different fit)
+    preds, _ = forecast.forecast(amtrak_df, workers=0)
+    shipped = pd.read_csv(os.path.join(REPO_DATA_DIR, 'amtrak_preds_df.csv'))
+    if list(preds.columns) != list(shipped.columns):
+        failures.append(f'columns {list(preds.columns)} != {list(shipped.columns)}')
+    ours_keys = preds.assign(**{'.index': preds['.index'].dt.strftime('%Y-%m-%d')})[['.key', '.index', 'station_name']]
+    shipped_keys = shipped[['.key', '.index', 'station_name']]
+    if not ours_keys.sort_values(list(ours_keys.columns)).reset_index(drop=True).equals(shipped_keys.sort_values(list(shipped_keys.columns)).reset_index(drop=True)):
+        failures.append('station/month rows differ from amtrak_preds_df.csv')
+
+    print(f"{'version':<40}{'stations':>9}{'seconds':>10}")
+    print(f"{'notebook, serial smf.poisson':<40}{len(params):>9}{notebook_s:>10.3f}")
+    scaled = more_stations(amtrak_df, args.station_copies)
+    for stations_df in (amtrak_df, scaled):
+        n_stations = stations_df['station_name'].nunique()
+        for workers in args.workers:
+            _, seconds = timed(lambda: forecast.fit_stations(stations_df, workers=workers))
+            label = 'in-process' if workers == 0 else f'{workers} worker' + ('s' if workers > 1 else '')
+            print(f"{f'pooled, {label}':<40}{n_stations:>9}{seconds:>10.3f}")
+    print(f'({os.cpu_count()} cores here)')
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Full forecast rebuild vs. an incremental refresh of the forecast store.
+
+Builds a store from amtrak_df_v2, then appends a month of rides for a
+growing number of stations and refreshes. Checks each refresh refits exactly
+the stations that changed and that the assembled rows match a from-scratch
+forecast of the same data, and that switching the fitting engine refits
+every station. Exits non-zero on any mismatch.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_forecast_store.py [--changed 1 10 100]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import numpy as np
+import pandas as pd
+
+from pipeline import forecast, forecast_store
+from pipeline.benchmarks.bench_forecast import imputed_input, timed
+
+
+def with_new_month(amtrak_df, stations):
+    #----- The month after the last one, for `stations` only, at last year's level plus 5%
+    last = amtrak_df[(amtrak_df['Year'] == amtrak_df['Year'].max()) & (amtrak_df['Month'] == 1)]
+    new_rows = last[last['station_name'].isin(stations)].assign(Year=lambda df: df['Year'] + 1, Rides=lambda df: df['Rides'] * 1.05)
+    return pd.concat([amtrak_df, new_rows], ignore_index=True)
+
+
+def same_rows(ours, expected):
+    keys = ['station_name', '.key', '.index']
+    ours = ours.sort_values(keys, ignore_index=True)
+    expected = expected.sort_values(keys, ignore_index=True)
+    if not ours.drop(columns='.value').astype(str).equals(expected.drop(columns='.value').astype(str)):
+        return False
+    return np.allclose(ours['.value'].to_numpy(), expected['.value'].to_numpy(), rtol=1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--changed', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--engine', choices=forecast.ENGINES, default=forecast.DEFAULT_ENGINE)
+    parser.add_argument('--workers', type=int, default=0)
+    args = parser.parse_args()
+
+    amtrak_df = imputed_input()
+    stations = sorted(amtrak_df['station_name'].unique())
+    failures = []
+
+    print(f"{'run':<34}{'refit':>7}{'seconds':>10}")
+    _, full_s = timed(lambda: forecast.forecast(amtrak_df, workers=args.workers, engine=args.engine))
+    print(f"{'full rebuild':<34}{len(stations):>7}{full_s:>10.3f}")
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = forecast_store.ForecastStore(store_dir)
+        report, cold_s = timed(lambda: forecast_store.refresh(amtrak_df, store, workers=args.workers, engine=args.engine))
+        print(f"{'store, cold':<34}{report['refit']:>7}{cold_s:>10.3f}")
+
+        report, warm_s = timed(lambda: forecast_store.refresh(amtrak_df, forecast_store.ForecastStore(store_dir), workers=args.workers, engine=args.engine))
+        print(f"{'store, nothing changed':<34}{report['refit']:>7}{warm_s:>10.3f}")
+        if report['refit']:
+            failures.append(f"unchanged data refit {report['refit']} stations")
+
+        #----- Each round starts from the cold store, so only that round's stations differ
+        for n_changed in args.changed:
+            changed = stations[:n_changed]
+            updated = with_new_month(amtrak_df, changed)
+            store = forecast_store.ForecastStore(store_dir)
+            report, refresh_s = timed(lambda: forecast_store.refresh(updated, store, workers=args.workers, engine=args.engine))
+            print(f"{f'store, new month at {n_changed} stations':<34}{report['refit']:>7}{refresh_s:>10.3f}")
+            if report['refit'] != n_changed:
+                failures.append(f"{n_changed} changed stations, {report['refit']} refit")
+
+            expected, _ = forecast.forecast(updated, workers=args.workers, engine=args.engine)
+            if not same_rows(store.preds(), expected):
+                failures.append(f'store rows after changing {n_changed} stations differ from a full forecast')
+
+            #----- Put the original data back for the next round
+            forecast_store.refresh(amtrak_df, store, workers=args.workers, engine=args.engine)
+
+        #----- Rows fitted by one engine must not be reused for another
+        other_engine = next(engine for engine in forecast.ENGINES if engine != args.engine)
+        report, other_s = timed(lambda: forecast_store.refresh(amtrak_df, forecast_store.ForecastStore(store_dir), workers=args.workers, engine=other_engine))
+        print(f"{'store, ' + other_engine + ' engine':<34}{report['refit']:>7}{other_s:>10.3f}")
+        if report['refit'] != len(stations):
+            failures.append(f"switching to the {other_engine} engine refit {report['refit']} of {len(stations)} stations")
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Per-row geocoding (the notebook's .apply) vs. the deduplicated, cached stage, with a stub geocoder.
+
+The stub answers from the coordinates already in data/amtrak_df.csv after a
+fixed delay, and misses the addresses the notebook had to patch by hand, so the
+cached stage plus overrides has to reproduce amtrak_df.csv exactly. Exits
+non-zero if it doesn't, if the warm re-run calls the geocoder at all, or if
+an override outside the continental US/Canada loads without an error.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_geocode.py [--latency 0.002] [--rate 0]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import pandas as pd
+
+from pipeline import geocode
+
+REPO_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, os.pardir, 'data')
+
+
+class StubGeocoder:
+    def __init__(self, known, latency):
+        self.known = known
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, address):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return self.known.get(address)
+
+
+def cleaned_pcrd():
+    #----- First cells of the cleanup notebook
+    amtrak_df = pd.read_csv(os.path.join(REPO_DATA_DIR, 'pcrd.csv'))
+    amtrak_df = amtrak_df.drop(columns=['URL', 'Station', 'Check'])
+    return amtrak_df.rename(columns={
+        'Ridership Numbers': 'rides',
+        'Year': 'year',
+        'Address': 'address',
+        'Station Name': 'station_name',
+        'Abbreviation': 'abbrev',
+        'State': 'state'
+    })
+
+
+def bad_override_rejected():
+    #----- The two typos the notebook shipped: a dropped sign digit and the latitude pasted as longitude
+    for row in ('"Alderson, WV",40.408700,-6.244720', '"Gallup, NM",35.5305724,35.5305724'):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            f.write(f'station_name,lat,lon\n{row}\n')
+        try:
+            geocode.GeocodeCache(':memory:', overrides_csv=path)
+        except ValueError:
+            continue
+        finally:
+            os.remove(path)
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.002, help='seconds per stub geocoder call')
+    parser.add_argument('--rate', type=float, default=0, help='calls per second for the cached stage, 0 = unlimited')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    amtrak_df = cleaned_pcrd()
+    expected = pd.read_csv(os.path.join(REPO_DATA_DIR, 'amtrak_df.csv'))
+    expected = expected.drop_duplicates(subset='station_name').set_index('station_name')[['lat', 'lon']]
+
+    #----- The stub knows every address except the ones the notebook overrode
+    overridden = set(pd.read_csv(geocode.OVERRIDES_CSV)['station_name'])
+    stations = amtrak_df.drop_duplicates(subset='address').set_index('address')['station_name']
+    known = {
+        address: tuple(expected.loc[station])
+        for address, station in stations.items()
+        if station in expected.index and station not in overridden
+    }
+
+    #----- Notebook: one call per row
+    stub = StubGeocoder(known, args.latency)
+    start = time.perf_counter()
+    amtrak_df['address'].apply(lambda address: stub(address))
+    per_row_s, per_row_calls = time.perf_counter() - start, stub.calls
+
+    cache = geocode.GeocodeCache(':memory:')
+    timings = {}
+    for run in ('cold', 'warm'):
+        stub = StubGeocoder(known, args.latency)
+        start = time.perf_counter()
+        result, report = geocode.add_coordinates(amtrak_df, stub, cache, workers=args.workers, rate=args.rate)
+        timings[run] = (time.perf_counter() - start, stub.calls, report)
+
+    failures = []
+    got = result.drop_duplicates(subset='station_name').set_index('station_name')[['lat', 'lon']]
+    mismatched = (got.loc[expected.index] - expected).abs().max(axis=1) > 1e-9
+    if mismatched.any():
+        failures.append(f'{mismatched.sum()} stations differ from amtrak_df.csv, e.g. {list(expected.index[mismatched][:3])}')
+    if timings['warm'][1]:
+        failures.append(f"warm run made {timings['warm'][1]} geocoder calls")
+    if not bad_override_rejected():
+        failures.append('an override outside the continental US/Canada was loaded')
+
+    print(f"{len(amtrak_df)} rows, {timings['cold'][2]['unique']} distinct addresses, {args.latency * 1e3:.0f} ms per call")
+    print(f"{'run':<32}{'geocoder calls':>16}{'seconds':>10}")
+    print(f"{'notebook .apply per row':<32}{per_row_calls:>16}{per_row_s:>10.3f}")
+    for run, (seconds, calls, report) in timings.items():
+        print(f"{'deduplicated + cache, ' + run:<32}{calls:>16}{seconds:>10.3f}")
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Batched IRLS vs. one statsmodels Poisson fit per station.
+
+Fits every station both ways and checks coefficients, fitted means,
+Pearson/deviance residuals, leverage, Cook's distance and forecasts agree
+row for row, including on stations with a shortened history or a month
+missing altogether (padding and dropped dummies). Then times both engines
+as the number of stations grows. Exits non-zero on any mismatch.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_glm.py [--station-copies 1 4]
+"""
+import argparse
+import os
+import sys
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import numpy as np
+import statsmodels.api as sm
+
+from pipeline import diagnostics, forecast, glm
+from pipeline.benchmarks.bench_forecast import imputed_input, more_stations, timed
+
+#----- Agreement required between the engines
+RTOL = 1e-7
+ATOL = 1e-9
+
+
+def ragged_input(amtrak_df):
+    #----- One station loses its first two years, others every June or every January (the reference month),
+    #----- so padding and dropped dummies get exercised
+    names = amtrak_df['station_name'].drop_duplicates().sort_values().tolist()
+    shortened = (amtrak_df['station_name'] == names[0]) & (amtrak_df['Year'] < amtrak_df['Year'].min() + 2)
+    no_june = (amtrak_df['station_name'] == names[1]) & (amtrak_df['Month'] == 6)
+    no_january = (amtrak_df['station_name'] == names[2]) & (amtrak_df['Month'] == 1)
+    return amtrak_df[~(shortened | no_june | no_january)]
+
+
+def per_station_rows(X, y, bounds):
+    #----- Row-level statsmodels results, station by station
+    rows = {'mu': [], 'leverage': [], 'cooks_distance': []}
+    coefs = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        keep = ~forecast.dropped_columns(X[None, lo:hi], np.ones((1, hi - lo), dtype=bool))[0]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            result = sm.Poisson(y[lo:hi], X[lo:hi, keep]).fit(disp=False)
+            influence = result.get_influence()
+            rows['leverage'].append(influence.hat_matrix_diag)
+            rows['cooks_distance'].append(influence.cooks_distance[0])
+        rows['mu'].append(result.predict())
+        coef = np.full(X.shape[1], np.nan)
+        coef[keep] = result.params
+        coefs.append(coef)
+    return np.array(coefs), {name: np.concatenate(values) for name, values in rows.items()}
+
+
+def residuals(y, mu):
+    deviance = np.sign(y - mu) * np.sqrt(2 * (y * np.log(y / mu) - (y - mu)))
+    pearson = (y - mu) / np.sqrt(mu)
+    return deviance, pearson
+
+
+def compare(amtrak_df, label, failures):
+    names, X, y, bounds, X_future, _ = forecast.station_blocks(amtrak_df)
+    expected_coefs, expected = per_station_rows(X, y, bounds)
+
+    X3, y2, mask = glm.pad_blocks(X, y, bounds)
+    dropped = forecast.dropped_columns(X3, mask)
+    coefs, mu, converged, iterations = glm.poisson_irls(X3, y2, mask, dropped)
+    leverage, cooks_distance = diagnostics.influence(X3, y2, mask, mu, dropped)
+    got = {'mu': mu[mask], 'leverage': leverage[mask], 'cooks_distance': cooks_distance[mask]}
+
+    if not converged.all():
+        failures.append(f'{label}: {(~converged).sum()} stations did not converge')
+    if not np.allclose(coefs, expected_coefs, rtol=RTOL, atol=ATOL, equal_nan=True):
+        failures.append(f'{label}: coefficients differ')
+    for name in got:
+        if not np.allclose(got[name], expected[name], rtol=RTOL, atol=ATOL):
+            failures.append(f'{label}: {name} differs')
+    for name, ours, theirs in zip(('deviance residuals', 'pearson residuals'), residuals(y, got['mu']), residuals(y, expected['mu'])):
+        if not np.allclose(ours, theirs, rtol=RTOL, atol=ATOL):
+            failures.append(f'{label}: {name} differ')
+
+    _, _, pooled_forecasts, _, pooled_diagnostics = forecast.fit_stations(amtrak_df, workers=0)
+    _, _, batched_forecasts, _, batched_diagnostics = forecast.fit_stations(amtrak_df, engine='batched')
+    if not np.allclose(batched_forecasts, pooled_forecasts, rtol=RTOL):
+        failures.append(f'{label}: forecasts differ')
+    stats = diagnostics.DIAGNOSTIC_COLUMNS[1:]
+    if not np.allclose(batched_diagnostics[stats].to_numpy(), pooled_diagnostics[stats].to_numpy(), rtol=1e-6, atol=ATOL):
+        failures.append(f'{label}: diagnostics differ')
+    print(f'{label}: {len(names)} stations, IRLS converged in {iterations} iterations')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--station-copies', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--workers', type=int, default=None, help='pool size for the statsmodels engine')
+    args = parser.parse_args()
+
+    amtrak_df = imputed_input()
+    failures = []
+    compare(amtrak_df, 'amtrak_df_v2', failures)
+    compare(ragged_input(amtrak_df), 'ragged', failures)
+
+    print()
+    print(f"{'stations':>9}{'statsmodels, serial s':>24}{'statsmodels, pool s':>22}{'batched s':>12}")
+    for copies in args.station_copies:
+        scaled = more_stations(amtrak_df, copies)
+        _, serial_s = timed(lambda: forecast.fit_stations(scaled, workers=0))
+        _, pool_s = timed(lambda: forecast.fit_stations(scaled, workers=args.workers))
+        _, batched_s = timed(lambda: forecast.fit_stations(scaled, engine='batched'))
+        print(f"{scaled['station_name'].nunique():>9}{serial_s:>24.3f}{pool_s:>22.3f}{batched_s:>12.3f}")
+    print(f'({os.cpu_count()} cores here)')
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
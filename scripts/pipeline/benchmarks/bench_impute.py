@@ -0,0 +1,124 @@
+"""Forecasting notebook's one-station-at-a-time imputation vs. the BallTree batch version.
+
+Replays the notebook cells once per station with gaps (stn_code = ..., full
+haversine scan, per-station mean filters, merge + combine_first), then checks
+the batch version picks the same donors and fills the same values, and that
+the result agrees with the actuals shipped in data/amtrak_preds_df.csv.
+Exits non-zero on any mismatch.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_impute.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import numpy as np
+import pandas as pd
+
+from pipeline import impute
+from pipeline.benchmarks.bench_geocode import REPO_DATA_DIR
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+    c = 2 * np.arcsin(np.sqrt(a))
+    return R * c
+
+
+def notebook_impute(amtrak_df):
+    #----- The notebook cells, run for each station code a developer used to type in by hand
+    missing = pd.DataFrame(amtrak_df.groupby('station_name')['Rides'].apply(lambda x: x.isna().sum())).reset_index()
+    missing_list = missing[missing['Rides'] > 0]['station_name'].unique().tolist()
+    more_info_about_missing_rides = amtrak_df[amtrak_df['station_name'].isin(missing_list)]
+    missing_inputs = more_info_about_missing_rides[['station_name', 'abbrev', 'lat', 'lon']].drop_duplicates()
+
+    donors = {}
+    for stn_code in missing_inputs['abbrev']:
+        missing_years = pd.DataFrame(more_info_about_missing_rides[more_info_about_missing_rides['abbrev'] == stn_code].groupby('Year')['Rides'].sum()).reset_index()
+        years_list = missing_years[missing_years['Rides'] == 0]['Year'].unique().tolist()
+
+        given_lat = missing_inputs[missing_inputs['abbrev'] == stn_code]['lat'].values[0]
+        given_lon = missing_inputs[missing_inputs['abbrev'] == stn_code]['lon'].values[0]
+        amtrak_df_test = amtrak_df[amtrak_df['abbrev'] != stn_code]
+        amtrak_df_test = amtrak_df_test[~amtrak_df_test['abbrev'].isin(missing_inputs['abbrev'].unique().tolist())].copy()
+        amtrak_df_test['Distance'] = amtrak_df_test.apply(lambda row: haversine(given_lat, given_lon, row['lat'], row['lon']), axis=1)
+        closest_row = amtrak_df_test.loc[amtrak_df_test['Distance'].idxmin()]
+
+        imp_stn_code = closest_row['abbrev']
+        denominator = amtrak_df[amtrak_df['abbrev'] == imp_stn_code]['Rides'].mean()
+        numerator = amtrak_df[amtrak_df['abbrev'] == stn_code]['Rides'].mean()
+        factor = numerator / denominator
+
+        imputed_values = amtrak_df[amtrak_df['abbrev'] == imp_stn_code][['Year', 'Month', 'Rides']]
+        imputed_values = imputed_values[imputed_values['Year'].isin(years_list)]
+        imputed_values['Rides'] = imputed_values['Rides'] * factor
+        imputed_values['abbrev'] = stn_code
+
+        amtrak_df = pd.merge(amtrak_df, imputed_values, on=['Year', 'Month', 'abbrev'], how='left', suffixes=('', '_imputed'))
+        amtrak_df['Rides'] = amtrak_df['Rides'].combine_first(amtrak_df['Rides_imputed'])
+        amtrak_df = amtrak_df.drop(columns=['Rides_imputed'])
+        donors[stn_code] = imp_stn_code
+    return amtrak_df, donors
+
+
+def prepped_input():
+    #----- amtrak_df.csv plus the TOH coordinate fix the route notebook applies before imputation
+    amtrak_df = pd.read_csv(os.path.join(REPO_DATA_DIR, 'amtrak_df.csv'), index_col=0)
+    amtrak_df.loc[amtrak_df['abbrev'] == 'TOH', ['lat', 'lon']] = [43.985912, -90.506204]
+    return amtrak_df
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    amtrak_df = prepped_input()
+    failures = []
+
+    (notebook, notebook_donors), notebook_s = timed(lambda: notebook_impute(amtrak_df))
+    (batch, report), batch_s = timed(lambda: impute.impute_missing(amtrak_df))
+
+    batch_donors = report.set_index('abbrev')['donor_abbrev'].to_dict()
+    if batch_donors != notebook_donors:
+        failures.append(f'donors differ: notebook {notebook_donors}, batch {batch_donors}')
+    if not np.allclose(batch['Rides'].to_numpy(), notebook['Rides'].to_numpy(), rtol=1e-12, equal_nan=True):
+        failures.append('filled rides differ from the notebook')
+    if batch['Rides'].isna().any():
+        failures.append(f"{batch['Rides'].isna().sum()} months still missing")
+
+    #----- Actuals in the shipped forecast file are the imputed rides, rounded
+    preds = pd.read_csv(os.path.join(REPO_DATA_DIR, 'amtrak_preds_df.csv'))
+    actuals = preds[preds['.key'] == 'actual'].assign(month_date=lambda df: pd.to_datetime(df['.index']))
+    actuals = actuals.set_index(['station_name', actuals['month_date'].dt.year, actuals['month_date'].dt.month])['.value']
+    imputed_rows = amtrak_df['Rides'].isna()
+    ours = batch[imputed_rows].set_index(['station_name', 'Year', 'Month'])['Rides']
+    shipped = actuals.reindex(ours.index)
+    off = (ours.round() - shipped).abs() > 1
+    if off.any():
+        failures.append(f'{off.sum()} imputed months disagree with amtrak_preds_df.csv actuals')
+
+    print(report.to_string(index=False))
+    print()
+    print(f"{'version':<40}{'seconds':>10}")
+    print(f"{'notebook, one station at a time':<40}{notebook_s:>10.3f}")
+    print(f"{'BallTree batch':<40}{batch_s:>10.3f}")
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Route notebook (0/1 columns, melt, three apply passes) vs. the sparse membership version.
+
+Checks num_routes, parent_route and business_line match the notebook logic
+row for row and match the station -> route mapping in data/amtrak_preds_df.csv,
+then times both as the data grows (more years) and as routes are added.
+Exits non-zero on any mismatch.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_routes.py [--year-scales 1 2]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import numpy as np
+import pandas as pd
+
+from pipeline import routes
+from pipeline.benchmarks.bench_geocode import REPO_DATA_DIR
+
+
+def notebook_assign_routes(amtrak_df, route_patterns, business_line_table, year=routes.PARENT_ROUTE_YEAR):
+    #----- The notebook's cells, looped over the same route lists instead of pasted per route
+    warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+    amtrak_df = amtrak_df.copy()
+    for route, patterns in route_patterns.items():
+        amtrak_df[f'{route}_route'] = np.where(amtrak_df['station_name'].str.contains('|'.join(patterns), case=False, na=False), 1, 0)
+    route_columns = [f'{route}_route' for route in route_patterns]
+    amtrak_df['num_routes'] = sum(amtrak_df[col] for col in route_columns)
+
+    sum_ridership_by_route = amtrak_df[amtrak_df['Year'] == year]
+    matrix_of_rides = sum_ridership_by_route.groupby(['Year', 'station_name'] + route_columns)['Rides'].agg('sum').reset_index()
+    melted_df = matrix_of_rides.melt(id_vars=['station_name', 'Rides'], value_vars=route_columns, var_name='route', value_name='value')
+    master_route_table = melted_df[melted_df['value'] == 1].groupby('route')['Rides'].sum().reset_index()
+
+    def find_routes(row):
+        return [route for route in route_columns if row[route] == 1]
+    amtrak_df['active_routes'] = amtrak_df.apply(find_routes, axis=1)
+
+    rides_dict = master_route_table.set_index('route')['Rides'].to_dict()
+
+    def find_rides(row):
+        return [rides_dict[route] for route in row['active_routes']]
+    amtrak_df['active_rides'] = amtrak_df.apply(find_rides, axis=1)
+
+    def find_parent_route(row):
+        if not row['active_rides']:
+            return None
+        max_idx = row['active_rides'].index(max(row['active_rides']))
+        return row['active_routes'][max_idx]
+    amtrak_df['parent_route'] = amtrak_df.apply(find_parent_route, axis=1)
+    amtrak_df['parent_route'] = amtrak_df['parent_route'].str.replace('_route', '', regex=False)
+
+    lines = business_line_table.to_dict()
+    amtrak_df['business_line'] = amtrak_df['parent_route'].apply(lambda route: lines.get(route, 'NA'))
+    amtrak_df = amtrak_df.drop(columns=route_columns)
+    amtrak_df['parent_route'] = amtrak_df['parent_route'].str.replace('_', ' ').str.title()
+    return amtrak_df
+
+
+def more_years(amtrak_df, scale):
+    #----- Same stations, `scale` times as many years
+    span = amtrak_df['Year'].max() - amtrak_df['Year'].min() + 1
+    return pd.concat([amtrak_df.assign(Year=amtrak_df['Year'] - i * span) for i in range(scale)], ignore_index=True)
+
+
+def more_routes(route_patterns, copies):
+    #----- Every route again under new names, so the membership matrix gets wider
+    extended = dict(route_patterns)
+    for i in range(1, copies):
+        extended.update({f'{route}_{i}': patterns for route, patterns in route_patterns.items()})
+    return extended
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--year-scales', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--route-copies', type=int, default=3)
+    args = parser.parse_args()
+
+    amtrak_df = pd.read_csv(os.path.join(REPO_DATA_DIR, 'amtrak_df.csv'), index_col=0)
+    route_patterns = routes.load_route_patterns()
+    business_line_table = routes.load_business_lines()
+    failures = []
+
+    notebook = notebook_assign_routes(amtrak_df, route_patterns, business_line_table)
+    sparse_version = routes.assign_routes(amtrak_df, route_patterns, business_line_table)
+    for col in ('num_routes', 'parent_route', 'business_line'):
+        if not notebook[col].fillna('<none>').astype(str).equals(sparse_version[col].fillna('<none>').astype(str)):
+            failures.append(f'{col} differs from the notebook logic')
+
+    #----- What the app ended up with, after the forecasting notebook filled missing values with 'Other'
+    preds = pd.read_csv(os.path.join(REPO_DATA_DIR, 'amtrak_preds_df.csv'))
+    shipped = preds[['station_name', 'parent_route', 'business_line']].drop_duplicates(subset='station_name').set_index('station_name')
+    ours = sparse_version[['station_name', 'parent_route', 'business_line']].drop_duplicates(subset='station_name').set_index('station_name')
+    ours = ours.replace({'NA': np.nan}).fillna('Other').loc[shipped.index]
+    for col in ('parent_route', 'business_line'):
+        mismatched = ours[col] != shipped[col].fillna('Other')
+        if mismatched.any():
+            failures.append(f'{mismatched.sum()} stations have a different {col} than amtrak_preds_df.csv')
+
+    print(f"{'input':<30}{'rows':>9}{'routes':>8}{'notebook s':>12}{'sparse s':>10}")
+    for scale in args.year_scales:
+        scaled = more_years(amtrak_df, scale)
+        _, notebook_s = timed(lambda: notebook_assign_routes(scaled, route_patterns, business_line_table))
+        _, sparse_s = timed(lambda: routes.assign_routes(scaled, route_patterns, business_line_table))
+        print(f"{f'{scale}x years':<30}{len(scaled):>9}{len(route_patterns):>8}{notebook_s:>12.3f}{sparse_s:>10.3f}")
+
+    extended = more_routes(route_patterns, args.route_copies)
+    _, notebook_s = timed(lambda: notebook_assign_routes(amtrak_df, extended, business_line_table))
+    _, sparse_s = timed(lambda: routes.assign_routes(amtrak_df, extended, business_line_table))
+    print(f"{f'{args.route_copies}x routes':<30}{len(amtrak_df):>9}{len(extended):>8}{notebook_s:>12.3f}{sparse_s:>10.3f}")
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""The notebooks' CSV hand-offs vs. the cached DAG runner, cold, no-op and after one param change.
+
+The CSV chain runs every stage one after the other and round-trips each
+output through CSV, like the notebooks did. The runner builds the same DAG
+into a fresh work dir, then rebuilds with nothing changed and with a new
+forecast horizon. The geocode cache is pre-filled from data/amtrak_df.csv so
+no geocoder is called. Checks the exported CSVs match the committed
+amtrak_df.csv and the per-stage modules' own output, that the no-op rebuild
+runs nothing, that the horizon change reruns only the forecast and that a
+new entry in the geocode cache changes the geocode stage's key. Exits
+non-zero on any mismatch.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_run.py [--jobs 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import numpy as np
+import pandas as pd
+
+from pipeline import artifacts, forecast, geocode, run
+from pipeline.benchmarks.bench_forecast import imputed_input, timed
+from pipeline.benchmarks.bench_geocode import REPO_DATA_DIR, cleaned_pcrd
+
+
+def filled_geocode_cache(path):
+    #----- Every address answered from amtrak_df.csv, overridden stations as misses, as a finished geocode run leaves it
+    expected = pd.read_csv(os.path.join(REPO_DATA_DIR, 'amtrak_df.csv')).drop_duplicates(subset='station_name').set_index('station_name')
+    overridden = set(pd.read_csv(geocode.OVERRIDES_CSV)['station_name'])
+    cache = geocode.GeocodeCache(path)
+    for address, station in cleaned_pcrd().drop_duplicates(subset='address').set_index('address')['station_name'].items():
+        known = station in expected.index and station not in overridden
+        cache.store(address, tuple(expected.loc[station, ['lat', 'lon']]) if known else None)
+    cache.close()
+
+
+def csv_chain(params, csv_dir):
+    #----- Each stage reads the CSVs the previous ones wrote, nothing skipped
+    outputs = {}
+    for name, stage in run.STAGES.items():
+        inputs = {dep: {output: pd.read_csv(path) for output, path in outputs[dep].items()} for dep in stage['deps']}
+        outputs[name] = {}
+        for output, frame in stage['run'](inputs, params).items():
+            path = os.path.join(csv_dir, f'{name}_{output}.csv')
+            frame.to_csv(path, index=False)
+            outputs[name][output] = path
+
+
+def check_exports(out_dir, failures):
+    amtrak_df = pd.read_csv(os.path.join(out_dir, 'amtrak_df.csv'), index_col=0)
+    expected = pd.read_csv(os.path.join(REPO_DATA_DIR, 'amtrak_df.csv'), index_col=0)
+    if not amtrak_df[['Year', 'Month', 'station_name', 'abbrev']].equals(expected[['Year', 'Month', 'station_name', 'abbrev']]):
+        failures.append('amtrak_df.csv rows differ from data/amtrak_df.csv')
+    elif not np.allclose(amtrak_df[['Rides', 'lat', 'lon']], expected[['Rides', 'lat', 'lon']], equal_nan=True):
+        failures.append('amtrak_df.csv rides or coordinates differ from data/amtrak_df.csv')
+
+    filled = imputed_input()
+    amtrak_df_v2 = pd.read_csv(os.path.join(out_dir, 'amtrak_df_v2.csv'))
+    if not np.allclose(amtrak_df_v2['Rides'], filled['Rides'].to_numpy(), equal_nan=True):
+        failures.append('amtrak_df_v2.csv differs from routes + impute on amtrak_df.csv')
+
+    preds, _ = forecast.forecast(filled, workers=0)
+    ours = pd.read_csv(os.path.join(out_dir, 'amtrak_preds_df.csv'), parse_dates=['.index'])
+    if not ours[['.key', '.index', 'station_name']].equals(preds[['.key', '.index', 'station_name']]):
+        failures.append('amtrak_preds_df.csv rows differ from forecast.forecast')
+    elif not np.allclose(ours['.value'], preds['.value'], rtol=1e-7):
+        failures.append('amtrak_preds_df.csv values differ from forecast.forecast')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=None)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        params = {'geocode_cache': os.path.join(tmp, 'geocode.sqlite')}
+        filled_geocode_cache(params['geocode_cache'])
+        work_dir = os.path.join(tmp, 'work')
+        os.makedirs(os.path.join(tmp, 'csv'))
+
+        print(f"{'version':<36}{'stages run':>11}{'seconds':>10}")
+        #----- numpy 1.24 warns formatting NaN rides in to_csv; harmless
+        np.seterr(invalid='ignore')
+        _, chain_s = timed(lambda: csv_chain({**run.DEFAULTS, **params}, os.path.join(tmp, 'csv')))
+        print(f"{'CSV chain, every stage':<36}{len(run.STAGES):>11}{chain_s:>10.3f}")
+
+        builds = [
+            ('runner, cold', params, len(run.STAGES)),
+            ('runner, nothing changed', params, 0),
+            ('runner, new forecast horizon', {**params, 'horizon': 12}, 1)
+        ]
+        for label, build_params, expected_runs in builds:
+            done, seconds = timed(lambda: run.build(params=build_params, work_dir=work_dir, jobs=args.jobs, log=False))
+            ran = [name for name, stage in done.items() if not stage['cached']]
+            print(f'{label:<36}{len(ran):>11}{seconds:>10.3f}')
+            if len(ran) != expected_runs:
+                failures.append(f'{label}: {len(ran)} stages ran ({ran}), expected {expected_runs}')
+            if label == 'runner, cold':
+                stages = done
+
+        print()
+        print(f"{'stage (cold)':<14}{'seconds':>9}{'peak RSS MB':>13}")
+        for name, stage in stages.items():
+            print(f"{name:<14}{stage['seconds']:>9.3f}{stage['peak_rss_mb']:>13.0f}")
+
+        out_dir = os.path.join(tmp, 'out')
+        run.export(run.build(params=params, work_dir=work_dir, jobs=0, log=False), out_dir)
+        check_exports(out_dir, failures)
+
+        #----- The geocode stage reads the cache, so what is in it has to be part of the key
+        geocode_key = lambda: run.stage_key('geocode', {**run.DEFAULTS, **params}, stages)
+        before = geocode_key()
+        cache = geocode.GeocodeCache(params['geocode_cache'])
+        cache.store('1 Example St, Nowhere, KS 67000', (38.5, -98.0))
+        cache.close()
+        if geocode_key() == before:
+            failures.append('a new geocode cache entry left the geocode stage key unchanged')
+
+        #----- Reading amtrak_df_v2 back: typed artifact vs. CSV; the artifact has to write back to the same digest
+        artifact_path = os.path.join(stages['impute']['path'], 'filled')
+        from_artifact, artifact_s = timed(lambda: artifacts.read_frame(artifact_path))
+        _, csv_s = timed(lambda: pd.read_csv(os.path.join(out_dir, 'amtrak_df_v2.csv')))
+        print()
+        print(f'reading amtrak_df_v2: artifact {artifact_s:.4f}s, CSV {csv_s:.4f}s')
+        if artifacts.write_frame(from_artifact, os.path.join(tmp, 'rewritten')) != artifacts.read_meta(artifact_path)['digest']:
+            failures.append('amtrak_df_v2 artifact does not round-trip')
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
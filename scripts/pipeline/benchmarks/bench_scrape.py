@@ -0,0 +1,113 @@
+"""Notebook-style serial scrape vs. the pooled, cached scraper, against a local stand-in.
+
+Checks along the way that both produce the same frame, that a re-crawl only
+revalidates (all 304s, nothing parsed again) and that changing one sheet
+re-downloads exactly that sheet. Exits non-zero if any check fails.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_scrape.py [--stations 120] [--latency 0.05]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+import pymupdf
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup
+
+from pipeline import scrape
+from pipeline.benchmarks._standin import StandIn, fixture_pdf, fixture_sheets
+
+
+def notebook_scrape(base_url, work_dir):
+    #----- The notebook loop: blocking get, temp .pdf on disk, fitz one sheet at a time
+    response = requests.get(base_url + scrape.INDEX_PATH)
+    soup = BeautifulSoup(response.content, 'html.parser')
+    pattern = re.compile(r'[A-Za-z]{2}\d{2}\.pdf$')
+    option_values = []
+    for option in soup.find_all('option'):
+        if 'value' in option.attrs:
+            value = option['value']
+            if len(value.split('/')[-1].split('.')[0]) > 2 and value.endswith('.pdf') and not pattern.search(value):
+                option_values.append(value)
+    option_values.remove('/site/assets/files/6872/thruway.pdf')
+
+    ridership_data = []
+    for i in option_values:
+        page = requests.get(base_url + i)
+        pdf_path = os.path.join(work_dir, i.rsplit('/', 1)[1])
+        with open(pdf_path, 'wb') as file:
+            file.write(page.content)
+        document = pymupdf.open(pdf_path)
+        text = ''
+        for page_num in range(len(document)):
+            text += document.load_page(page_num).get_text()
+        df = pd.DataFrame(re.compile(r'\b\d{2},\d{3}\b').findall(text), columns=['Ridership Numbers'])
+        df['Station'] = i
+        ridership_data.append(df)
+    return pd.concat(ridership_data)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stations', type=int, default=120)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every stand-in response')
+    parser.add_argument('--fetch-workers', type=int, default=16)
+    parser.add_argument('--parse-workers', type=int, default=None)
+    args = parser.parse_args()
+
+    failures = []
+    sheets = fixture_sheets(args.stations)
+    with StandIn(sheets, latency=args.latency) as standin, tempfile.TemporaryDirectory() as tmp:
+        expected, serial_s = timed(lambda: notebook_scrape(standin.base_url, tmp))
+
+        cache_dir = os.path.join(tmp, 'cache')
+        run = lambda: scrape.scrape(standin.base_url, cache_dir, args.fetch_workers, args.parse_workers)
+        (cold, cold_report), cold_s = timed(run)
+        (warm, warm_report), warm_s = timed(run)
+
+        changed_path = next(iter(sheets))
+        standin.update(changed_path, fixture_pdf('Changed, ST', 'CHG', '1 New St', [55555] * 7))
+        (changed, changed_report), changed_s = timed(run)
+
+    if not cold.reset_index(drop=True).equals(expected.reset_index(drop=True)):
+        failures.append('cold crawl frame differs from the notebook loop')
+    if not warm.equals(cold):
+        failures.append('warm crawl frame differs from the cold crawl')
+    if warm_report['not_modified'] != args.stations or warm_report['downloaded']:
+        failures.append(f'warm crawl should only revalidate: {warm_report}')
+    if changed_report['downloaded'] != 1:
+        failures.append(f'changed one sheet, expected one download: {changed_report}')
+    if (changed[changed['Station'] == changed_path]['Ridership Numbers'] != '55,555').any():
+        failures.append('changed sheet was not re-parsed')
+    if standin.hits[404]:
+        failures.append(f'{standin.hits[404]} requests for sheets the filters should have skipped')
+
+    print(f'{args.stations} sheets, {args.latency * 1e3:.0f} ms stand-in latency')
+    print(f"{'crawl':<34}{'seconds':>10}{'downloads':>11}{'304s':>7}")
+    print(f"{'notebook loop (serial, temp files)':<34}{serial_s:>10.2f}{args.stations:>11}{0:>7}")
+    print(f"{'scraper, cold cache':<34}{cold_s:>10.2f}{cold_report['downloaded']:>11}{cold_report['not_modified']:>7}")
+    print(f"{'scraper, warm cache':<34}{warm_s:>10.2f}{warm_report['downloaded']:>11}{warm_report['not_modified']:>7}")
+    print(f"{'scraper, one sheet changed':<34}{changed_s:>10.2f}{changed_report['downloaded']:>11}{changed_report['not_modified']:>7}")
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""amtrak_preds_df.csv vs. the app's dictionary-encoded columnar snapshot: size, write and load time.
+
+Writes the shipped forecast rows with snapshot.write_snapshot, and checks the
+result is byte for byte what the app's own data_loader.build_snapshot writes
+from the same CSVs. It then times writing, and loading the app's frame from
+the CSVs and from the snapshot, whole and pushed down to one business line
+and year. The pushed-down load has to match the same filter applied to a
+full load. Exits non-zero on any mismatch.
+
+Run from scripts/:
+
+    python pipeline/benchmarks/bench_snapshot.py [--repeats 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, 'python-app-github'))
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+from pipeline import snapshot
+from pipeline.benchmarks.bench_geocode import REPO_DATA_DIR
+from pipeline.benchmarks.bench_impute import prepped_input
+
+
+def median_ms(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings) * 1e3
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def same_snapshot(path, other):
+    #----- Same files, same bytes in every array, same metadata
+    if sorted(os.listdir(path)) != sorted(os.listdir(other)):
+        return False
+    for name in os.listdir(path):
+        if name.endswith('.npy') and not np.array_equal(np.load(os.path.join(path, name)), np.load(os.path.join(other, name)), equal_nan=True):
+            return False
+    with open(os.path.join(path, 'meta.json')) as f, open(os.path.join(other, 'meta.json')) as g:
+        return json.load(f) == json.load(g)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--business-line', default='Long Distance')
+    parser.add_argument('--year', type=int, default=2023)
+    args = parser.parse_args()
+
+    preds_csv = os.path.join(REPO_DATA_DIR, 'amtrak_preds_df.csv')
+    preds = pd.read_csv(preds_csv, parse_dates=['.index'])
+    coords = prepped_input()
+    failures = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ours, app_built = os.path.join(tmp, 'pipeline'), os.path.join(tmp, 'app')
+        _, write_ms = median_ms(lambda: snapshot.write_snapshot(preds, coords, ours), args.repeats)
+        _, csv_write_ms = median_ms(lambda: preds.to_csv(os.path.join(tmp, 'preds.csv'), index=False, date_format='%Y-%m-%d'), args.repeats)
+        data_loader.build_snapshot(data_loader.read_local_csvs(), app_built)
+        if not same_snapshot(ours, app_built):
+            failures.append('pipeline snapshot differs from data_loader.build_snapshot')
+
+        csv_bytes = os.path.getsize(preds_csv) + os.path.getsize(os.path.join(REPO_DATA_DIR, 'amtrak_df.csv'))
+        print(f"{'format':<40}{'KB':>9}{'write ms':>10}")
+        print(f"{'amtrak_preds_df.csv':<40}{os.path.getsize(preds_csv) / 1e3:>9.0f}{csv_write_ms:>10.1f}")
+        print(f"{'  + amtrak_df.csv for coordinates':<40}{csv_bytes / 1e3:>9.0f}")
+        print(f"{'snapshot':<40}{dir_size(ours) / 1e3:>9.0f}{write_ms:>10.1f}")
+
+        full, csv_ms = median_ms(data_loader.read_local_csvs, args.repeats)
+        loaded, load_ms = median_ms(lambda: data_loader.load_snapshot(ours), args.repeats)
+        pushed, pushed_ms = median_ms(
+            lambda: data_loader.load_snapshot(ours, business_lines=[args.business_line], years=[args.year]), args.repeats
+        )
+        print()
+        print(f"{'load the app frame':<40}{'rows':>9}{'ms':>10}")
+        print(f"{'CSVs, parse + merge + retype':<40}{len(full):>9}{csv_ms:>10.1f}")
+        print(f"{'snapshot':<40}{len(loaded):>9}{load_ms:>10.1f}")
+        print(f"{f'snapshot, {args.business_line} {args.year}':<40}{len(pushed):>9}{pushed_ms:>10.1f}")
+
+        if len(loaded) != len(full):
+            failures.append(f'snapshot has {len(loaded)} rows, CSVs {len(full)}')
+        expected = loaded[(loaded['business_line'] == args.business_line).to_numpy() & (loaded['year'] == args.year).to_numpy()]
+        if not pushed.equals(expected.reset_index(drop=True)):
+            failures.append('pushed-down load differs from filtering a full load')
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
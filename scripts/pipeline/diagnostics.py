@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from scipy.special import xlogy
+
+from pipeline.glm import weighted_gram
+
+STATISTICS = ['deviance_residuals', 'pearson_residuals', 'leverage', 'cooks_distance']
+DIAGNOSTIC_COLUMNS = ['station_name'] + [f'{agg}_{stat}' for stat in STATISTICS for agg in ('mean', 'std')]
+
+#----- Stations per vectorized pass; keeps peak memory flat however many stations there are
+STATION_BLOCK = 256
+
+#----- Suffixes the notebook's train vs. calibration comparison used
+SPLIT_SUFFIXES = ('_train', '_calib')
+
+
+def deviance_residuals(y, mu):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sign(y - mu) * np.sqrt(2 * (xlogy(y, y / mu) - (y - mu)))
+
+
+def pearson_residuals(y, mu):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (y - mu) / np.sqrt(mu)
+
+
+def inverse_gram(X3, mask, mu, dropped):
+    #----- (X'WX)^-1 at the fit, one per station; dropped columns are zeroed out of X3 first
+    X3 = np.where(dropped[:, None, :], 0.0, X3)
+    return X3, np.linalg.inv(weighted_gram(X3, mu * mask, dropped))
+
+
+def influence(X3, y2, mask, mu, dropped):
+    """Leverage and Cook's distance of every fitted row, as statsmodels' MLEInfluence gives for Poisson.
+
+    With A = X'WX at the fit, leverage is mu * x'A^-1 x and Cook's distance
+    is the one-step change in coefficients from dropping the row,
+    d = -A^-1 (S - s_i) / (1 - h), measured in A and divided by the number of
+    coefficients (S is the total score, s_i the row's). Padding rows are 0.
+    """
+    X3, inv_gram = inverse_gram(X3, mask, mu, dropped)
+    quad = np.einsum('snk,skl,snl->sn', X3, inv_gram, X3, optimize=True)
+    leverage = np.where(mask, mu * quad, 0.0)
+
+    resid = np.where(mask, y2 - mu, 0.0)
+    total_score = np.einsum('snk,sn->sk', X3, resid, optimize=True)
+    total_quad = np.einsum('sk,skl,sl->s', total_score, inv_gram, total_score, optimize=True)
+    cross = np.einsum('snk,skl,sl->sn', X3, inv_gram, total_score, optimize=True)
+    n_params = (~dropped).sum(axis=1)
+
+    dropped_score = total_quad[:, None] - 2 * resid * cross + resid ** 2 * quad
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cooks_distance = dropped_score / (1 - leverage) ** 2 / n_params[:, None]
+    return leverage, np.where(mask, cooks_distance, 0.0)
+
+
+def holdout_influence(X3, mask, mu, X3_new, y_new, mask_new, mu_new, dropped):
+    """Leverage and Cook's distance of rows the model was not fit on.
+
+    Leverage is mu * x'A^-1 x with A from the fitted rows, and Cook's distance
+    is the one-step change in coefficients from adding the row,
+    d = A^-1 x (y - mu) / (1 + h), measured the same way as for fitted rows.
+    """
+    _, inv_gram = inverse_gram(X3, mask, mu, dropped)
+    X3_new = np.where(dropped[:, None, :], 0.0, X3_new)
+    quad = np.einsum('snk,skl,snl->sn', X3_new, inv_gram, X3_new, optimize=True)
+    leverage = np.where(mask_new, mu_new * quad, 0.0)
+    resid = np.where(mask_new, y_new - mu_new, 0.0)
+    n_params = (~dropped).sum(axis=1)
+    cooks_distance = resid ** 2 * quad / (1 + leverage) ** 2 / n_params[:, None]
+    return leverage, np.where(mask_new, cooks_distance, 0.0)
+
+
+def summarize(values, mask):
+    #----- Per-station mean and std over real rows only, like np.mean/np.std on each station's slice
+    count = mask.sum(axis=1)
+    values = np.where(mask, values, 0.0)
+    mean = values.sum(axis=1) / count
+    std = np.sqrt(np.where(mask, (values - mean[:, None]) ** 2, 0.0).sum(axis=1) / count)
+    return mean, std
+
+
+def summary_frame(names, y2, mask, mu, leverage, cooks_distance):
+    #----- The notebook's per-station table: mean and std of each statistic
+    values = {
+        'deviance_residuals': deviance_residuals(y2, mu),
+        'pearson_residuals': pearson_residuals(y2, mu),
+        'leverage': leverage,
+        'cooks_distance': cooks_distance
+    }
+    frame = {'station_name': np.asarray(names, dtype=object)}
+    for stat in STATISTICS:
+        frame[f'mean_{stat}'], frame[f'std_{stat}'] = summarize(values[stat], mask)
+    return pd.DataFrame(frame, columns=DIAGNOSTIC_COLUMNS)
+
+
+def station_slices(n_stations, block=STATION_BLOCK):
+    return [slice(start, start + block) for start in range(0, n_stations, block)] or [slice(0, 0)]
+
+
+def fitted_diagnostics(names, X3, y2, mask, mu, dropped, block=STATION_BLOCK):
+    """Diagnostics of every station's fit, vectorized over blocks of stations, no influence objects."""
+    names = np.asarray(names, dtype=object)
+    frames = []
+    for part in station_slices(len(names), block):
+        leverage, cooks_distance = influence(X3[part], y2[part], mask[part], mu[part], dropped[part])
+        frames.append(summary_frame(names[part], y2[part], mask[part], mu[part], leverage, cooks_distance))
+    return pd.concat(frames, ignore_index=True)
+
+
+def holdout_diagnostics(names, X3, mask, mu, X3_new, y_new, mask_new, mu_new, dropped, block=STATION_BLOCK):
+    """Same table for held-out rows, scored against each station's fit on its training rows."""
+    names = np.asarray(names, dtype=object)
+    frames = []
+    for part in station_slices(len(names), block):
+        leverage, cooks_distance = holdout_influence(
+            X3[part], mask[part], mu[part], X3_new[part], y_new[part], mask_new[part], mu_new[part], dropped[part]
+        )
+        frames.append(summary_frame(names[part], y_new[part], mask_new[part], mu_new[part], leverage, cooks_distance))
+    return pd.concat(frames, ignore_index=True)
+
+
+def compare(train, calib):
+    #----- One row per station, every statistic twice, like the notebook's comparison_df
+    return train.merge(calib, on='station_name', suffixes=SPLIT_SUFFIXES)
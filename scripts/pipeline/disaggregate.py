@@ -0,0 +1,112 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+#----- Where things live
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILES_CSV = os.path.join(PIPELINE_DIR, 'data', 'seasonal_profiles.csv')
+
+#----- The cleanup notebook's national profile, January..December
+SEASONAL_PROPORTIONS = [0.04, 0.06, 0.07, 0.09, 0.11, 0.11, 0.12, 0.10, 0.07, 0.06, 0.08, 0.09]
+DEFAULT_PROFILE = 'national'
+
+MONTHS = np.arange(1, 13, dtype=np.int64)
+
+#----- Columns the notebook carried from each yearly row onto its 12 monthly rows
+CARRIED_COLUMNS = ['address', 'state', 'station_name', 'abbrev', 'lat', 'lon']
+
+#----- Yearly rows per chunk when streaming; 10k yearly rows -> 120k monthly rows, ~30 MB peak
+CHUNK_ROWS = 10000
+
+
+def check_profile(name, proportions):
+    proportions = np.asarray(proportions, dtype=np.float64)
+    if proportions.shape != (12,):
+        raise ValueError(f'Seasonal profile {name!r} needs 12 monthly proportions, got {proportions.shape[0]}')
+    if not np.isclose(proportions.sum(), 1.0):
+        raise ValueError(f'Seasonal profile {name!r} must sum to 1, sums to {proportions.sum():.6f}')
+    return proportions
+
+
+def load_profiles(csv_path=PROFILES_CSV):
+    #----- One row per profile: profile, 1, 2, ..., 12
+    profiles = pd.read_csv(csv_path, index_col='profile')
+    return {name: check_profile(name, row.to_numpy()) for name, row in profiles.iterrows()}
+
+
+def proportion_matrix(profiles, keys=None, default=DEFAULT_PROFILE):
+    """(rows, 12) proportions, one profile row per key; keys without a profile get `default`.
+
+    With no keys, returns the default profile as a single (1, 12) row, which
+    broadcasts against every yearly total.
+    """
+    names = list(profiles)
+    table = np.vstack([check_profile(name, profiles[name]) for name in names])
+    if keys is None:
+        return table[[names.index(default)]]
+    codes = pd.Categorical(keys, categories=names).codes
+    codes = np.where(codes < 0, names.index(default), codes)
+    return table[codes]
+
+
+def _expand(yearly_df, profiles, profile_key, carried, default):
+    #----- Yearly totals (n, 1) x proportions (n or 1, 12) -> (n, 12), raveled month-major per row
+    totals = yearly_df['rides'].to_numpy(dtype=np.float64)
+    keys = yearly_df[profile_key].to_numpy() if profile_key else None
+    proportions = proportion_matrix(profiles, keys, default)
+    num_rows = len(totals)
+
+    monthly = {
+        'Year': np.repeat(yearly_df['year'].to_numpy(), 12),
+        'Month': np.tile(MONTHS, num_rows),
+        'Rides': (totals[:, None] * proportions).ravel()
+    }
+    for col in carried:
+        monthly[col] = np.repeat(yearly_df[col].to_numpy(), 12)
+    return pd.DataFrame(monthly)
+
+
+def yearly_to_monthly(yearly_df, profiles=None, profile_key=None, carried=None, default=DEFAULT_PROFILE):
+    """Vectorized yearly_to_monthly_seasonal: 12 monthly rows per yearly row, in the same order.
+
+    `profiles` maps profile name -> 12 proportions (default: the notebook's
+    national profile). With `profile_key` set (e.g. 'parent_route' or 'state'),
+    each row uses the profile named by that column, falling back to `default`.
+    """
+    profiles = profiles or {DEFAULT_PROFILE: SEASONAL_PROPORTIONS}
+    carried = CARRIED_COLUMNS if carried is None else carried
+    return _expand(yearly_df, profiles, profile_key, carried, default)
+
+
+def iter_yearly_to_monthly(yearly_df, profiles=None, profile_key=None, carried=None, default=DEFAULT_PROFILE, chunk_rows=CHUNK_ROWS):
+    #----- Same output as yearly_to_monthly, a chunk at a time, with a continuous RangeIndex
+    for start in range(0, len(yearly_df), chunk_rows):
+        chunk = yearly_to_monthly(yearly_df.iloc[start:start + chunk_rows], profiles, profile_key, carried, default)
+        chunk.index = pd.RangeIndex(start * 12, start * 12 + len(chunk))
+        yield chunk
+
+
+def write_monthly_csv(yearly_df, out_path, profiles=None, profile_key=None, chunk_rows=CHUNK_ROWS):
+    #----- Stream to CSV without holding the monthly frame; same layout as the notebook's monthly_df.to_csv
+    rows = 0
+    with open(out_path, 'w', newline='') as f:
+        for i, chunk in enumerate(iter_yearly_to_monthly(yearly_df, profiles, profile_key, chunk_rows=chunk_rows)):
+            chunk.to_csv(f, header=i == 0)
+            rows += len(chunk)
+    return rows
+
+
+if __name__ == '__main__':
+    #----- python -m pipeline.disaggregate yearly.csv amtrak_df.csv [--profile-key state]  (from scripts/)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('src')
+    parser.add_argument('out')
+    parser.add_argument('--profiles', default=PROFILES_CSV)
+    parser.add_argument('--profile-key', default=None, help='column naming each row\'s seasonal profile')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    rows = write_monthly_csv(pd.read_csv(args.src), args.out, load_profiles(args.profiles), args.profile_key, args.chunk_rows)
+    print(f'Wrote {rows} monthly rows to {args.out}')
@@ -0,0 +1,278 @@
+import argparse
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+
+from pipeline import diagnostics, glm, snapshot
+from pipeline.routes import UNKNOWN_BUSINESS_LINE
+
+#----- Months forecast past each station's last actual; amtrak_preds_df.csv runs 2023-01 to 2024-12
+HORIZON = 24
+
+#----- 'statsmodels' fits station by station on a process pool; 'batched' runs IRLS for all stations as one NumPy problem
+ENGINES = ('statsmodels', 'batched')
+DEFAULT_ENGINE = 'statsmodels'
+
+#----- Stations handed to each worker at a time, in units of the worker count
+CHUNKS_PER_WORKER = 4
+
+#----- Columns of 'Rides ~ date_num + C(month)' in patsy's order: Intercept, C(month)[T.2..12], date_num
+DESIGN_COLUMNS = ['Intercept'] + [f'C(month)[T.{month}]' for month in range(2, 13)] + ['date_num']
+
+#----- The forecasting notebook's train/calibration split
+CUTOFF_DATE = '2021-07-01'
+
+PREDS_COLUMNS = ['.model_desc', '.key', '.index', '.value', 'station_name', 'parent_route', 'business_line']
+OTHER = 'Other'
+
+
+def month_starts(amtrak_df):
+    return pd.to_datetime(pd.DataFrame({'year': amtrak_df['Year'], 'month': amtrak_df['Month'], 'day': 1}))
+
+
+def design_matrix(date_num, month):
+    #----- Same columns patsy builds for 'date_num + C(month)', month 1 as the reference level
+    date_num = np.asarray(date_num, dtype=np.float64)
+    month = np.asarray(month)
+    X = np.zeros((len(date_num), len(DESIGN_COLUMNS)))
+    X[:, 0] = 1.0
+    X[:, 1:12] = month[:, None] == np.arange(2, 13)
+    X[:, 12] = date_num
+    return X
+
+
+def date_origin(amtrak_df):
+    #----- date_num counts days from here: the first month with rides
+    return month_starts(amtrak_df[amtrak_df['Rides'].notna()]).min()
+
+
+def dropped_columns(X3, mask):
+    """(stations x 13) columns patsy would leave out of each station's design.
+
+    Months a station has no rows for drop out of C(month); if that includes
+    January, the first month it does have becomes the reference level, so
+    that month's dummy goes too.
+    """
+    dropped = ~((X3 != 0) & mask[..., None]).any(axis=1)
+    has_reference = ((X3[..., 1:12] == 0).all(axis=2) & mask).any(axis=1)
+    new_reference = 1 + np.argmax(~dropped[:, 1:12], axis=1)
+    stations = np.flatnonzero(~has_reference)
+    dropped[stations, new_reference[stations]] = True
+    return dropped
+
+
+def station_blocks(amtrak_df, horizon=HORIZON, origin=None):
+    """Stack every station's training rows and forecast rows into two designs, built once.
+
+    Rows are sorted by station then month, so station i owns rows
+    bounds[i]:bounds[i + 1] of X and y, and rows i * horizon:(i + 1) * horizon
+    of X_future. Months without rides are left out, as the formula API did.
+    Like the notebook, date_num counts days from the first month in the data
+    (or `origin`, when fitting a subset of stations), and the forecast months
+    are dated at month end (pd.date_range(freq='M')) when computing date_num.
+    """
+    amtrak_df = amtrak_df[amtrak_df['Rides'].notna()]
+    year_month = month_starts(amtrak_df)
+    codes, names = pd.factorize(amtrak_df['station_name'], sort=True)
+    order = np.lexsort((year_month.to_numpy(), codes))
+    codes, year_month = codes[order], year_month.to_numpy()[order]
+
+    start = year_month.min() if origin is None else np.datetime64(origin, 'ns')
+    date_num = (year_month - start) // np.timedelta64(1, 'D')
+    X = design_matrix(date_num, pd.DatetimeIndex(year_month).month)
+    y = amtrak_df['Rides'].to_numpy(dtype=np.float64)[order]
+    bounds = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(names)))]
+
+    #----- Month starts after each station's last month; date_num from the month ends, as the notebook did
+    last = pd.DatetimeIndex(year_month[bounds[1:] - 1])
+    steps = np.arange(1, horizon + 1)
+    future_starts = (last.to_period('M').to_numpy()[:, None] + steps).ravel()
+    future_starts = pd.PeriodIndex(future_starts, freq='M')
+    future_ends = future_starts.to_timestamp(how='end').normalize()
+    X_future = design_matrix((future_ends - start).days, future_starts.month)
+    return names, X, y, bounds, X_future, future_starts.to_timestamp()
+
+
+def fit_station(X, y, X_future):
+    """Poisson fit for one station: (coefficients, fitted means, forecast).
+
+    The same Newton fit smf.poisson(...).fit(disp=False) runs, on the prebuilt
+    design. Columns patsy would have dropped for this station come back as
+    NaN coefficients. Diagnostics are left to one vectorized pass over all
+    stations afterwards, so no influence object is built here.
+    """
+    keep = ~dropped_columns(X[None], np.ones((1, len(X)), dtype=bool))[0]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        result = sm.Poisson(y, X[:, keep]).fit(disp=False)
+
+    coef = np.full(X.shape[1], np.nan)
+    coef[keep] = result.params
+    return coef, result.predict(), result.predict(X_future[:, keep])
+
+
+def fit_chunk(chunk):
+    #----- Runs in a worker: a run of consecutive stations, with its own slices of the designs
+    X, y, bounds, X_future = chunk
+    horizon = len(X_future) // (len(bounds) - 1)
+    return [
+        fit_station(X[lo:hi], y[lo:hi], X_future[i * horizon:(i + 1) * horizon])
+        for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+
+def shard(X, y, bounds, X_future, n_chunks):
+    #----- Split the stacked designs into contiguous runs of stations, slicing rather than rebuilding
+    n_stations = len(bounds) - 1
+    horizon = len(X_future) // max(n_stations, 1)
+    edges = np.linspace(0, n_stations, min(n_chunks, n_stations) + 1).astype(int)
+    for a, b in zip(edges[:-1], edges[1:]):
+        lo, hi = bounds[a], bounds[b]
+        yield X[lo:hi], y[lo:hi], bounds[a:b + 1] - lo, X_future[a * horizon:b * horizon]
+
+
+def fit_pooled(X, y, bounds, X_future, workers=None):
+    #----- statsmodels engine: (coefficients, stacked fitted means, forecasts)
+    if workers == 0:
+        fitted = fit_chunk((X, y, bounds, X_future))
+    else:
+        workers = workers or os.cpu_count()
+        chunks = shard(X, y, bounds, X_future, workers * CHUNKS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fitted = [fit for chunk_fits in pool.map(fit_chunk, chunks) for fit in chunk_fits]
+
+    n_stations = len(bounds) - 1
+    coefs = np.array([fit[0] for fit in fitted]).reshape(n_stations, len(DESIGN_COLUMNS))
+    mu = np.concatenate([fit[1] for fit in fitted]) if fitted else np.empty(0)
+    forecasts = np.array([fit[2] for fit in fitted]).reshape(n_stations, len(X_future) // max(n_stations, 1))
+    return coefs, mu, forecasts
+
+
+def fit_stations(amtrak_df, horizon=HORIZON, workers=None, engine=DEFAULT_ENGINE, origin=None):
+    """Fit every station's Poisson model with the chosen engine.
+
+    engine='statsmodels' shards stations across a ProcessPoolExecutor in
+    contiguous chunks (`workers=0` fits in-process); engine='batched' runs
+    IRLS for all stations at once and ignores `workers`. Either way the
+    diagnostics come from one vectorized pass over all stations. Returns
+    (names, coefficients (stations x 13), forecasts (stations x horizon),
+    forecast month starts, diagnostics frame).
+    """
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine {engine!r}, expected one of {ENGINES}')
+    names, X, y, bounds, X_future, future_months = station_blocks(amtrak_df, horizon, origin)
+    X3, y2, mask = glm.pad_blocks(X, y, bounds)
+    dropped = dropped_columns(X3, mask)
+
+    if engine == 'batched':
+        coefs, mu, _, _ = glm.poisson_irls(X3, y2, mask, dropped)
+        forecasts = glm.poisson_mean(X_future.reshape(len(names), horizon, -1), coefs)
+    else:
+        coefs, mu, forecasts = fit_pooled(X, y, bounds, X_future, workers)
+        mu = glm.pad_rows(mu, bounds)
+
+    station_diagnostics = diagnostics.fitted_diagnostics(names, X3, y2, mask, mu, dropped)
+    return names, coefs, forecasts, future_months, station_diagnostics
+
+
+def calibration_diagnostics(amtrak_df, cutoff=CUTOFF_DATE, workers=None, engine=DEFAULT_ENGINE):
+    """The notebook's train vs. calibration comparison: fit before `cutoff`, score after it.
+
+    Returns one row per station with every diagnostic for the training fit
+    (_train) and for the months from `cutoff` on (_calib), scored against
+    that same fit. date_num for the calibration months keeps counting from
+    the training data's first month.
+    """
+    in_train = (month_starts(amtrak_df) < pd.Timestamp(cutoff)).to_numpy()
+    train = amtrak_df[in_train]
+    calib = amtrak_df[~in_train & amtrak_df['station_name'].isin(train['station_name']).to_numpy()]
+    origin = date_origin(train)
+
+    names, coefs, _, _, train_diagnostics = fit_stations(train, 1, workers, engine, origin)
+    _, X, y, bounds, _, _ = station_blocks(train, 1, origin)
+    X3, _, mask = glm.pad_blocks(X, y, bounds)
+    dropped = dropped_columns(X3, mask)
+    mu = np.where(mask, glm.poisson_mean(X3, coefs), 0.0)
+
+    #----- A station with no usable training rows has no fit to score; get_indexer would give it -1, i.e. the last station's coefficients
+    calib = calib[calib['station_name'].isin(names).to_numpy()]
+    calib_names, X_new, y_new, bounds_new, _, _ = station_blocks(calib, 1, origin)
+    position = pd.Index(names).get_indexer(calib_names)
+    X3_new, y2_new, mask_new = glm.pad_blocks(X_new, y_new, bounds_new)
+    mu_new = np.where(mask_new, glm.poisson_mean(X3_new, coefs[position]), 0.0)
+
+    calib_diagnostics = diagnostics.holdout_diagnostics(
+        calib_names, X3[position], mask[position], mu[position], X3_new, y2_new, mask_new, mu_new, dropped[position]
+    )
+    return diagnostics.compare(train_diagnostics, calib_diagnostics)
+
+
+def station_lines(amtrak_df):
+    #----- One parent_route/business_line per station, blanks as 'Other' like the forecasting notebook
+    lines = amtrak_df[['station_name', 'parent_route', 'business_line']].drop_duplicates(subset='station_name')
+    lines = lines.replace({'business_line': {UNKNOWN_BUSINESS_LINE: np.nan}}).fillna(OTHER)
+    return lines.set_index('station_name')
+
+
+def preds_frame(amtrak_df, names, forecasts, future_months):
+    #----- Actual rows for every station-month, then `horizon` GLM rows per fitted station
+    horizon = forecasts.shape[1]
+    actuals = pd.DataFrame({
+        '.model_desc': 'ACTUAL',
+        '.key': 'actual',
+        '.index': month_starts(amtrak_df).to_numpy(),
+        '.value': amtrak_df['Rides'].to_numpy(),
+        'station_name': amtrak_df['station_name'].to_numpy()
+    }).sort_values(['station_name', '.index'], kind='stable')
+    predictions = pd.DataFrame({
+        '.model_desc': 'GLM',
+        '.key': 'prediction',
+        '.index': future_months,
+        '.value': forecasts.ravel(),
+        'station_name': np.repeat(np.asarray(names, dtype=object), horizon)
+    })
+
+    preds = pd.concat([actuals, predictions], ignore_index=True)
+    preds = preds.join(station_lines(amtrak_df), on='station_name')
+    return preds[PREDS_COLUMNS]
+
+
+def forecast(amtrak_df, horizon=HORIZON, workers=None, engine=DEFAULT_ENGINE):
+    """Actuals plus GLM forecasts in the layout of data/amtrak_preds_df.csv.
+
+    Takes the imputed monthly frame (amtrak_df_v2) and returns (preds,
+    diagnostics): preds has one ACTUAL row per station-month and `horizon`
+    GLM rows per station; diagnostics has the notebook's per-station residual,
+    leverage and Cook's distance summaries.
+    """
+    names, _, forecasts, future_months, diagnostics = fit_stations(amtrak_df, horizon, workers, engine)
+    return preds_frame(amtrak_df, names, forecasts, future_months), diagnostics
+
+
+if __name__ == '__main__':
+    #----- python -m pipeline.forecast amtrak_df_v2.csv amtrak_preds_df.csv [--diagnostics diag.csv]  (from scripts/)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('src')
+    parser.add_argument('out')
+    parser.add_argument('--diagnostics', default=None, help='write the per-station diagnostics here')
+    parser.add_argument('--snapshot', default=None, help='also write the app\'s columnar snapshot to this directory')
+    parser.add_argument('--calibration', default=None, help=f'write the train vs. calibration diagnostics (cutoff {CUTOFF_DATE}) here')
+    parser.add_argument('--horizon', type=int, default=HORIZON)
+    parser.add_argument('--workers', type=int, default=None, help='0 fits in-process')
+    parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE)
+    args = parser.parse_args()
+
+    amtrak_df = pd.read_csv(args.src)
+    preds, station_diagnostics = forecast(amtrak_df, args.horizon, args.workers, args.engine)
+    preds.to_csv(args.out, index=False, date_format='%Y-%m-%d')
+    if args.diagnostics:
+        station_diagnostics.to_csv(args.diagnostics, index=False)
+    if args.snapshot:
+        snapshot.write_snapshot(preds, amtrak_df, args.snapshot)
+    if args.calibration:
+        calibration_diagnostics(amtrak_df, workers=args.workers, engine=args.engine).to_csv(args.calibration, index=False)
+    print(f"Wrote {len(preds)} rows for {len(station_diagnostics)} stations to {args.out}")
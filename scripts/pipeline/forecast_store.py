@@ -0,0 +1,179 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from pipeline import artifacts, forecast, snapshot
+from pipeline.diagnostics import DIAGNOSTIC_COLUMNS
+
+STORE_DIR = os.environ.get('AMTRAK_FORECAST_STORE', os.path.join(os.path.expanduser('~'), '.cache', 'amtrak_forecast'))
+
+#----- Bump this whenever the model or the partition layout changes; every station is refit
+STORE_FORMAT = 1
+
+
+def station_hashes(amtrak_df, origin, horizon, engine=forecast.DEFAULT_ENGINE):
+    """sha256 of everything that goes into one station's rows, per station.
+
+    Covers the station's (Year, Month, Rides) history, its parent route and
+    business line, the date_num origin, the horizon, the fitting engine and
+    the model's columns, so a hash only matches when refitting would give the
+    same rows.
+    """
+    lines = forecast.station_lines(amtrak_df)
+    labels = dict(zip(lines.index, lines['parent_route'] + '\0' + lines['business_line']))
+    salt = json.dumps([STORE_FORMAT, forecast.DESIGN_COLUMNS, str(pd.Timestamp(origin).date()), horizon, engine]).encode()
+
+    codes, names = pd.factorize(amtrak_df['station_name'], sort=True)
+    month_number = amtrak_df['Year'].to_numpy(dtype=np.int64) * 12 + amtrak_df['Month'].to_numpy(dtype=np.int64)
+    order = np.lexsort((month_number, codes))
+    month_number = month_number[order]
+    rides = amtrak_df['Rides'].to_numpy(dtype=np.float64)[order]
+    bounds = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(names)))]
+
+    hashes = {}
+    for name, lo, hi in zip(names, bounds[:-1], bounds[1:]):
+        digest = hashlib.sha256(salt)
+        digest.update(month_number[lo:hi].tobytes())
+        digest.update(rides[lo:hi].tobytes())
+        digest.update(labels[name].encode())
+        hashes[name] = digest.hexdigest()
+    return hashes
+
+
+class ForecastStore:
+    """Per-station forecast rows on disk, keyed by a hash of the inputs behind them.
+
+    Each station's rows (actuals and forecasts, amtrak_preds_df.csv layout)
+    live in partitions/<sha256 of the name>.csv; index.json maps the station
+    to its input hash, coefficients and diagnostics.
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.partitions_dir = os.path.join(store_dir, 'partitions')
+        self.index_path = os.path.join(store_dir, 'index.json')
+        os.makedirs(self.partitions_dir, exist_ok=True)
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+        if self.index.get('format') != STORE_FORMAT:
+            self.index = {'format': STORE_FORMAT, 'stations': {}}
+
+    def _write(self, path, text):
+        #----- Write then rename so a crash never leaves a truncated partition behind
+        with artifacts.atomic_write(path) as f:
+            f.write(text)
+
+    def partition_path(self, station_name):
+        digest = hashlib.sha256(station_name.encode()).hexdigest()
+        return os.path.join(self.partitions_dir, f'{digest}.csv')
+
+    def stations(self):
+        return sorted(self.index['stations'])
+
+    def entry(self, station_name):
+        entry = self.index['stations'].get(station_name)
+        if entry and os.path.exists(self.partition_path(station_name)):
+            return entry
+        return None
+
+    def put(self, station_name, digest, rows, coefficients, diagnostics):
+        self._write(self.partition_path(station_name), rows.to_csv(index=False, date_format='%Y-%m-%d'))
+        self.index['stations'][station_name] = {
+            'hash': digest,
+            'coefficients': [float(c) for c in coefficients],
+            'diagnostics': {k: float(v) for k, v in diagnostics.items()}
+        }
+
+    def remove(self, station_name):
+        self.index['stations'].pop(station_name, None)
+        try:
+            os.remove(self.partition_path(station_name))
+        except FileNotFoundError:
+            pass
+
+    def save(self):
+        self._write(self.index_path, json.dumps(self.index, indent=1, sort_keys=True))
+
+    def preds(self):
+        #----- Every partition, in the order forecast.forecast() writes rows: all actuals, then all forecasts
+        frames = [pd.read_csv(self.partition_path(name), parse_dates=['.index']) for name in self.stations()]
+        if not frames:
+            return pd.DataFrame(columns=forecast.PREDS_COLUMNS)
+        preds = pd.concat(frames, ignore_index=True)
+        return preds.sort_values('.key', kind='stable', ignore_index=True)
+
+    def diagnostics(self):
+        return pd.DataFrame(
+            [{'station_name': name, **self.index['stations'][name]['diagnostics']} for name in self.stations()],
+            columns=DIAGNOSTIC_COLUMNS
+        )
+
+    def coefficients(self):
+        return pd.DataFrame(
+            [self.index['stations'][name]['coefficients'] for name in self.stations()],
+            index=pd.Index(self.stations(), name='station_name'),
+            columns=forecast.DESIGN_COLUMNS
+        )
+
+
+def refresh(amtrak_df, store, horizon=forecast.HORIZON, workers=None, engine=forecast.DEFAULT_ENGINE):
+    """Bring `store` up to date with amtrak_df, refitting only stations whose inputs changed.
+
+    Stations whose hash matches the store keep their partition untouched;
+    the rest are fit together in one fit_stations call and their partitions
+    replaced; stations no longer in the data are dropped. Returns a report
+    with the station count and how many were refit, reused and removed.
+    """
+    origin = forecast.date_origin(amtrak_df)
+    hashes = station_hashes(amtrak_df, origin, horizon, engine)
+    changed = [name for name, digest in hashes.items() if (store.entry(name) or {}).get('hash') != digest]
+    removed = [name for name in store.stations() if name not in hashes]
+
+    if changed:
+        subset = amtrak_df[amtrak_df['station_name'].isin(changed)]
+        names, coefs, forecasts, future_months, diagnostics = forecast.fit_stations(subset, horizon, workers, engine, origin)
+        rows = forecast.preds_frame(subset, names, forecasts, future_months)
+        fitted = {name: i for i, name in enumerate(names)}
+        stats = diagnostics.set_index('station_name')
+        no_fit = pd.Series(np.nan, index=DIAGNOSTIC_COLUMNS[1:])
+        for name, station_rows in rows.groupby('station_name', sort=False):
+            i = fitted.get(name)
+            coefficients = coefs[i] if i is not None else np.full(len(forecast.DESIGN_COLUMNS), np.nan)
+            store.put(name, hashes[name], station_rows, coefficients, stats.loc[name] if i is not None else no_fit)
+
+    for name in removed:
+        store.remove(name)
+    store.save()
+    return {'stations': len(hashes), 'refit': len(changed), 'reused': len(hashes) - len(changed), 'removed': len(removed)}
+
+
+if __name__ == '__main__':
+    #----- python -m pipeline.forecast_store amtrak_df_v2.csv [--out amtrak_preds_df.csv]  (from scripts/)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('src')
+    parser.add_argument('--store', default=STORE_DIR)
+    parser.add_argument('--out', default=None, help='write the assembled amtrak_preds_df.csv here')
+    parser.add_argument('--diagnostics', default=None, help='write the per-station diagnostics here')
+    parser.add_argument('--snapshot', default=None, help='write the app\'s columnar snapshot to this directory')
+    parser.add_argument('--horizon', type=int, default=forecast.HORIZON)
+    parser.add_argument('--workers', type=int, default=None, help='0 fits in-process')
+    parser.add_argument('--engine', choices=forecast.ENGINES, default=forecast.DEFAULT_ENGINE)
+    args = parser.parse_args()
+
+    store = ForecastStore(args.store)
+    amtrak_df = pd.read_csv(args.src)
+    report = refresh(amtrak_df, store, args.horizon, args.workers, args.engine)
+    print(f"{report['stations']} stations: {report['refit']} refit, {report['reused']} reused, {report['removed']} removed")
+    if args.out:
+        store.preds().to_csv(args.out, index=False, date_format='%Y-%m-%d')
+    if args.diagnostics:
+        store.diagnostics().to_csv(args.diagnostics, index=False)
+    if args.snapshot:
+        snapshot.write_snapshot(store.preds(), amtrak_df, args.snapshot)
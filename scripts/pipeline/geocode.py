@@ -0,0 +1,245 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+#----- Where things live
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+OVERRIDES_CSV = os.path.join(PIPELINE_DIR, 'data', 'coordinate_overrides.csv')
+CACHE_PATH = os.environ.get('AMTRAK_GEOCODE_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'amtrak_geocode.sqlite'))
+
+#----- Every station is in the continental US or Canada; an override outside this is a typo (swapped or dropped sign, lat pasted as lon)
+STATION_BOUNDS = {'lat': (24.0, 84.0), 'lon': (-141.0, -52.0)}
+
+#----- Photon is a free public service, stay polite
+DEFAULT_RATE = 1.0
+DEFAULT_WORKERS = 2
+
+
+class GeocodeCache:
+    """SQLite-backed address -> (lat, lon) store, plus the manual per-station overrides.
+
+    Addresses the geocoder could not resolve are stored with NULL coordinates
+    so a re-run doesn't ask again. Overrides are loaded from
+    data/coordinate_overrides.csv on open, replacing the notebook's hand-written
+    np.where patches.
+    """
+
+    def __init__(self, path=CACHE_PATH, overrides_csv=OVERRIDES_CSV):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS geocodes (
+                address TEXT PRIMARY KEY,
+                lat REAL,
+                lon REAL,
+                fetched_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS overrides (
+                station_name TEXT PRIMARY KEY,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL
+            );
+        ''')
+        if overrides_csv:
+            self.load_overrides(overrides_csv)
+
+    def lookup(self, addresses):
+        #----- {address: (lat, lon) or (None, None)} for every address already resolved
+        found = {}
+        addresses = list(addresses)
+        for start in range(0, len(addresses), 500):
+            chunk = addresses[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT address, lat, lon FROM geocodes WHERE address IN ({','.join('?' * len(chunk))})", chunk
+            )
+            found.update({address: (lat, lon) for address, lat, lon in rows})
+        return found
+
+    def store(self, address, coords):
+        lat, lon = coords if coords else (None, None)
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO geocodes (address, lat, lon, fetched_at) VALUES (?, ?, ?, ?)',
+                (address, lat, lon, time.time())
+            )
+
+    def load_overrides(self, csv_path):
+        #----- The CSV is the whole set: a row deleted from it must stop being applied, so replace the table in one transaction
+        overrides = pd.read_csv(csv_path)
+        check_bounds(overrides, csv_path)
+        with self.conn:
+            self.conn.execute('DELETE FROM overrides')
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO overrides (station_name, lat, lon) VALUES (?, ?, ?)',
+                overrides[['station_name', 'lat', 'lon']].itertuples(index=False, name=None)
+            )
+
+    def set_override(self, station_name, lat, lon):
+        #----- Lasts until the next open reloads the CSV; add the row there to keep it
+        check_bounds(pd.DataFrame({'station_name': [station_name], 'lat': [lat], 'lon': [lon]}), 'set_override')
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO overrides (station_name, lat, lon) VALUES (?, ?, ?)', (station_name, lat, lon))
+
+    def overrides(self):
+        return pd.read_sql_query('SELECT station_name, lat, lon FROM overrides', self.conn)
+
+    def close(self):
+        self.conn.close()
+
+
+def cache_digest(path):
+    """sha256 of the resolved addresses in the cache at `path`, None if there is no cache yet.
+
+    Only the (address, lat, lon) rows count: fetch times and the overrides
+    table (reloaded from the CSV on every open) change without changing what
+    a geocode run returns.
+    """
+    if path == ':memory:' or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        for row in conn.execute('SELECT address, lat, lon FROM geocodes ORDER BY address'):
+            digest.update(repr(row).encode())
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return digest.hexdigest()
+
+
+def check_bounds(overrides, source):
+    #----- Raise on any override row outside STATION_BOUNDS (or missing a coordinate), naming the stations
+    inside = pd.Series(True, index=overrides.index)
+    for col, (low, high) in STATION_BOUNDS.items():
+        inside &= overrides[col].between(low, high)
+    if not inside.all():
+        bad = overrides.loc[~inside, ['station_name', 'lat', 'lon']].itertuples(index=False, name=None)
+        raise ValueError(f'{source}: overrides outside the continental US/Canada: {list(bad)}')
+
+
+class RateLimiter:
+    #----- At most `rate` calls per second across every worker thread
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def photon_geocoder(user_agent='measurements', timeout=None):
+    """The notebook's geocoder: geopy Photon, English results. Returns address -> (lat, lon) or None."""
+    geolocator = None
+
+    def geocode(address):
+        #----- Built on first use, so a run the cache answers in full doesn't need geopy installed
+        nonlocal geolocator
+        if geolocator is None:
+            from geopy.geocoders import Photon
+            geolocator = Photon(user_agent=user_agent, timeout=timeout)
+        result = geolocator.geocode(address, language='en')
+        if result is None:
+            return None
+        return result.latitude, result.longitude
+    return geocode
+
+
+def geocode_addresses(addresses, geocoder, cache, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """Resolve every distinct address once, asking `geocoder` only for ones the cache lacks.
+
+    Lookups run on a small thread pool behind a shared rate limit. Results are
+    written to the cache as they arrive, so an interrupted run keeps what it
+    resolved. A geocoder exception leaves that address uncached for the next
+    run. Returns ({address: (lat, lon)}, report).
+    """
+    unique = pd.unique(pd.Series(list(addresses), dtype=object).dropna())
+    resolved = cache.lookup(unique)
+    todo = [address for address in unique if address not in resolved]
+
+    failed = {}
+    if todo:
+        limiter = RateLimiter(rate)
+
+        def call(address):
+            limiter.wait()
+            return geocoder(address)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(call, address): address for address in todo}
+            for future in as_completed(futures):
+                address = futures[future]
+                try:
+                    coords = future.result()
+                except Exception as e:
+                    failed[address] = e
+                    continue
+                cache.store(address, coords)
+                resolved[address] = coords if coords else (None, None)
+
+    report = {
+        'rows': len(addresses),
+        'unique': len(unique),
+        'cached': len(unique) - len(todo),
+        'requested': len(todo),
+        'not_found': sum(lat is None for lat, _ in resolved.values()),
+        'failed': failed
+    }
+    return resolved, report
+
+
+def add_coordinates(amtrak_df, geocoder=None, cache=None, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """Add lat/lon to the cleaned pcrd frame: geocode by address, then apply the station overrides.
+
+    Same result as the notebook's per-row `.apply(extract_coordinates)` plus
+    its np.where patches. Returns (frame, report).
+    """
+    cache = cache or GeocodeCache()
+    geocoder = geocoder or photon_geocoder()
+    resolved, report = geocode_addresses(amtrak_df['address'], geocoder, cache, workers, rate)
+
+    coords = pd.DataFrame.from_dict(resolved, orient='index', columns=['lat', 'lon'])
+    amtrak_df = amtrak_df.drop(columns=['lat', 'lon'], errors='ignore')
+    amtrak_df = amtrak_df.join(coords, on='address')
+
+    overrides = cache.overrides().set_index('station_name')
+    has_override = amtrak_df['station_name'].isin(overrides.index)
+    amtrak_df.loc[has_override, ['lat', 'lon']] = overrides.loc[amtrak_df.loc[has_override, 'station_name'], ['lat', 'lon']].to_numpy()
+    amtrak_df[['lat', 'lon']] = amtrak_df[['lat', 'lon']].astype(float)
+
+    report['overridden'] = int(amtrak_df.loc[has_override, 'station_name'].nunique())
+    report['missing_stations'] = int(amtrak_df.loc[amtrak_df['lat'].isna(), 'station_name'].nunique())
+    return amtrak_df, report
+
+
+if __name__ == '__main__':
+    #----- python -m pipeline.geocode pcrd_clean.csv out.csv  (from scripts/); input needs address and station_name
+    parser = argparse.ArgumentParser()
+    parser.add_argument('src')
+    parser.add_argument('out')
+    parser.add_argument('--cache', default=CACHE_PATH)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='geocoder calls per second')
+    args = parser.parse_args()
+
+    amtrak_df, report = add_coordinates(pd.read_csv(args.src), cache=GeocodeCache(args.cache), workers=args.workers, rate=args.rate)
+    amtrak_df.to_csv(args.out, index=False)
+    print(
+        f"{report['rows']} rows, {report['unique']} addresses: {report['cached']} cached, {report['requested']} requested, "
+        f"{report['not_found']} not found, {len(report['failed'])} failed; "
+        f"{report['overridden']} stations overridden, {report['missing_stations']} still missing"
+    )
@@ -0,0 +1,88 @@
+import numpy as np
+
+#----- IRLS stops once no coefficient moves by more than TOL relative to its size
+MAX_ITER = 100
+TOL = 1e-10
+
+
+def row_positions(bounds):
+    #----- (station, row within station) of every stacked row, and the longest station
+    counts = np.diff(bounds)
+    station = np.repeat(np.arange(len(counts)), counts)
+    row = np.arange(bounds[-1]) - np.repeat(bounds[:-1], counts)
+    return station, row, int(counts.max()) if len(counts) else 0
+
+
+def pad_rows(values, bounds):
+    #----- Stacked per-station values -> (stations x max_rows), zero padded
+    station, row, n_rows = row_positions(bounds)
+    padded = np.zeros((len(bounds) - 1, n_rows) + values.shape[1:])
+    padded[station, row] = values
+    return padded
+
+
+def pad_blocks(X, y, bounds):
+    """Stacked per-station rows -> (stations x max_rows x features) arrays plus a row mask.
+
+    Station i's rows bounds[i]:bounds[i + 1] land at the start of slab i;
+    padding rows are zero and masked out of every sum.
+    """
+    station, row, n_rows = row_positions(bounds)
+    mask = np.zeros((len(bounds) - 1, n_rows), dtype=bool)
+    mask[station, row] = True
+    return pad_rows(X, bounds), pad_rows(y, bounds), mask
+
+
+def unused_features(X3):
+    return ~(X3 != 0).any(axis=1)
+
+
+def weighted_gram(X3, weights, absent):
+    #----- X'WX per station; dropped features get a 1 on the diagonal and nothing else so the solve stays defined
+    gram = np.einsum('snk,sn,snl->skl', X3, weights, X3, optimize=True)
+    gram[absent[:, :, None] | absent[:, None, :]] = 0
+    k = gram.shape[1]
+    gram[:, np.arange(k), np.arange(k)] += absent
+    return gram
+
+
+def poisson_irls(X3, y2, mask, absent=None, max_iter=MAX_ITER, tol=TOL):
+    """Poisson log-link IRLS for every station at once.
+
+    Each iteration is one batched X'WX (einsum) and one batched solve over
+    stations x features x features. `absent` (stations x features) marks
+    features left out of a station's model; they get a NaN coefficient.
+    By default that is the features a station has no nonzero rows for.
+    Returns (coefficients, fitted means, converged flags, iterations run).
+    """
+    absent = unused_features(X3) if absent is None else absent
+    X3 = np.where(absent[:, None, :], 0.0, X3)
+    weights_mask = mask.astype(np.float64)
+
+    #----- Standard GLM start: mu from the data, nudged off zero
+    mu = np.where(mask, y2 + 0.1, 1.0)
+    eta = np.log(mu)
+    coef = np.zeros(absent.shape)
+    converged = np.zeros(len(X3), dtype=bool)
+    for iteration in range(1, max_iter + 1):
+        weights = mu * weights_mask
+        z = eta + (y2 - mu) / mu
+        gram = weighted_gram(X3, weights, absent)
+        rhs = np.einsum('snk,sn->sk', X3, weights * z, optimize=True)
+        new_coef = np.linalg.solve(gram, rhs[..., None])[..., 0]
+
+        step = np.abs(new_coef - coef).max(axis=1)
+        converged = step <= tol * (1 + np.abs(new_coef).max(axis=1))
+        coef = new_coef
+        eta = np.einsum('snk,sk->sn', X3, coef, optimize=True)
+        mu = np.exp(eta)
+        if converged.all():
+            break
+
+    coef[absent] = np.nan
+    return coef, np.where(mask, mu, 0.0), converged, iteration
+
+
+def poisson_mean(X3, coef):
+    #----- exp(X b) per station; NaN (dropped) coefficients contribute nothing
+    return np.exp(np.einsum('snk,sk->sn', X3, np.nan_to_num(coef), optimize=True))
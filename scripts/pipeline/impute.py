@@ -0,0 +1,125 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371
+
+#----- Neighbours fetched per station; more than one so a donor lacking some of the missing months can be skipped
+DEFAULT_NEIGHBOURS = 4
+
+REPORT_COLUMNS = ['abbrev', 'station_name', 'donor_abbrev', 'donor_station', 'distance_km', 'factor', 'months_filled']
+
+
+def station_codes(amtrak_df):
+    #----- Stations are (abbrev, station_name) pairs: WIN is both Wilson, NC and Winona, MN
+    return pd.MultiIndex.from_frame(amtrak_df[['abbrev', 'station_name']]).factorize()[0]
+
+
+def station_summary(amtrak_df, codes):
+    #----- One row per station code, in first-appearance order: coordinates, mean monthly rides, missing months
+    grouped = amtrak_df.groupby(codes, sort=True)
+    return pd.DataFrame({
+        'abbrev': grouped['abbrev'].first(),
+        'station_name': grouped['station_name'].first(),
+        'lat': grouped['lat'].first(),
+        'lon': grouped['lon'].first(),
+        'mean_rides': grouped['Rides'].mean(),
+        'missing_months': grouped.size() - grouped['Rides'].count()
+    })
+
+
+def nearest_donors(targets, donors, k=DEFAULT_NEIGHBOURS):
+    """k nearest donor stations for every target, from one haversine BallTree query.
+
+    Returns (positions into `donors`, distances in km), each (targets x k).
+    Equally distant donors are ordered by their position in `donors`, like
+    the notebook's idxmin over rows.
+    """
+    k = min(k, len(donors))
+    tree = BallTree(np.radians(donors[['lat', 'lon']].to_numpy()), metric='haversine')
+    distances, positions = tree.query(np.radians(targets[['lat', 'lon']].to_numpy()), k=k)
+    order = np.lexsort((positions, distances), axis=1)
+    positions = np.take_along_axis(positions, order, axis=1)
+    distances = np.take_along_axis(distances, order, axis=1)
+    return positions, distances * EARTH_RADIUS_KM
+
+
+def impute_missing(amtrak_df, k=DEFAULT_NEIGHBOURS):
+    """Fill every missing month from the nearest station with complete data, scaled by the ratio of means.
+
+    The forecasting notebook's per-station recipe, done for all stations at once:
+    the donor is the closest station with no gaps, and the filled value is the
+    donor's rides for that month times mean(station) / mean(donor). Returns
+    (filled frame, report) where the report has one row per imputed station
+    with the donor used, its distance, the factor and the months filled.
+    """
+    codes = station_codes(amtrak_df)
+    summary = station_summary(amtrak_df, codes)
+    has_gaps = summary['missing_months'].to_numpy() > 0
+    targets, donors = summary[has_gaps], summary[~has_gaps]
+    if targets.empty or donors.empty:
+        return amtrak_df.copy(), pd.DataFrame(columns=REPORT_COLUMNS)
+
+    positions, distances = nearest_donors(targets, donors, k)
+    donor_codes = donors.index.to_numpy()
+
+    #----- Rides by (station code, year, month), looked up for every gap row at once
+    rides_by_month = pd.Series(
+        amtrak_df['Rides'].to_numpy(),
+        index=pd.MultiIndex.from_arrays([codes, amtrak_df['Year'].to_numpy(), amtrak_df['Month'].to_numpy()])
+    )
+    is_gap = amtrak_df['Rides'].isna().to_numpy()
+    gap_years, gap_months = amtrak_df['Year'].to_numpy()[is_gap], amtrak_df['Month'].to_numpy()[is_gap]
+    target_row = pd.Series(np.arange(len(targets)), index=targets.index)[codes[is_gap]].to_numpy()
+
+    def donor_rides(donor):
+        return rides_by_month.reindex(pd.MultiIndex.from_arrays([donor, gap_years, gap_months])).to_numpy()
+
+    #----- First neighbour covering all of the station's missing months wins
+    donor_pick = np.full(len(targets), -1)
+    for j in range(positions.shape[1]):
+        covered = ~np.isnan(donor_rides(donor_codes[positions[target_row, j]]))
+        all_covered = pd.Series(covered).groupby(target_row).all()
+        undecided = (donor_pick[all_covered.index] < 0) & all_covered.to_numpy()
+        donor_pick[all_covered.index[undecided]] = j
+
+    picked = donor_pick >= 0
+    rank = np.maximum(donor_pick, 0)
+    donor_pos = positions[np.arange(len(targets)), rank]
+    factor = targets['mean_rides'].to_numpy() / donors['mean_rides'].to_numpy()[donor_pos]
+
+    gap_values = donor_rides(donor_codes[donor_pos][target_row]) * factor[target_row]
+    gap_values = np.where(picked[target_row], gap_values, np.nan)
+
+    filled = amtrak_df.copy()
+    filled.loc[is_gap, 'Rides'] = gap_values
+
+    report = pd.DataFrame({
+        'abbrev': targets['abbrev'].to_numpy(),
+        'station_name': targets['station_name'].to_numpy(),
+        'donor_abbrev': np.where(picked, donors['abbrev'].to_numpy()[donor_pos], None),
+        'donor_station': np.where(picked, donors['station_name'].to_numpy()[donor_pos], None),
+        'distance_km': np.where(picked, distances[np.arange(len(targets)), rank], np.nan),
+        'factor': np.where(picked, factor, np.nan),
+        'months_filled': np.bincount(target_row, weights=~np.isnan(gap_values), minlength=len(targets)).astype(int)
+    }, columns=REPORT_COLUMNS)
+    return filled, report
+
+
+if __name__ == '__main__':
+    #----- python -m pipeline.impute amtrak_prepped_df.csv amtrak_df_v2.csv [--report donors.csv]  (from scripts/)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('src')
+    parser.add_argument('out')
+    parser.add_argument('--report', default=None, help='write the donor used for each station here')
+    parser.add_argument('--neighbours', type=int, default=DEFAULT_NEIGHBOURS)
+    args = parser.parse_args()
+
+    filled, report = impute_missing(pd.read_csv(args.src), args.neighbours)
+    filled.to_csv(args.out, index=False)
+    if args.report:
+        report.to_csv(args.report, index=False)
+    print(report.to_string(index=False))
+    print(f"{int(filled['Rides'].isna().sum())} months still missing")
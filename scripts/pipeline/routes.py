@@ -0,0 +1,122 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+#----- Where things live
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROUTE_STATIONS_CSV = os.path.join(PIPELINE_DIR, 'data', 'route_stations.csv')
+BUSINESS_LINES_CSV = os.path.join(PIPELINE_DIR, 'data', 'business_lines.csv')
+
+#----- Parent routes are decided on this year's ridership, like the route notebook
+PARENT_ROUTE_YEAR = 2022
+UNKNOWN_BUSINESS_LINE = 'NA'
+
+#----- Coordinates the route notebook patched by station code before assigning routes (the app's data_loader applies the same fix)
+COORD_OVERRIDES = {
+    'TOH': (43.985912, -90.506204)
+}
+
+
+def load_route_patterns(csv_path=ROUTE_STATIONS_CSV):
+    #----- {route: [station patterns]} in file order; the order breaks ties between equally busy routes
+    route_stations = pd.read_csv(csv_path)
+    return {route: group['station_pattern'].tolist() for route, group in route_stations.groupby('route', sort=False)}
+
+
+def load_business_lines(csv_path=BUSINESS_LINES_CSV):
+    return pd.read_csv(csv_path).drop_duplicates(subset='route').set_index('route')['business_line']
+
+
+def membership_matrix(station_names, route_patterns):
+    """Sparse (stations x routes) 0/1 matrix.
+
+    A station is on a route when its name matches any of the route's patterns,
+    case-insensitively, the same `str.contains('|'.join(...))` test the notebook
+    ran, but once per distinct station instead of once per row.
+    """
+    station_names = pd.Series(station_names, dtype=object)
+    rows, cols = [], []
+    for j, patterns in enumerate(route_patterns.values()):
+        members = np.flatnonzero(station_names.str.contains('|'.join(patterns), case=False, na=False).to_numpy())
+        rows.append(members)
+        cols.append(np.full(len(members), j))
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+    data = np.ones(len(rows), dtype=np.int8)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(station_names), len(route_patterns)))
+
+
+def route_totals(membership, station_rides):
+    #----- Ridership of every route: one sparse mat-vec over its member stations
+    return membership.T.astype(np.float64) @ np.asarray(station_rides, dtype=np.float64)
+
+
+def parent_route_index(membership, totals):
+    """Column of each station's busiest route, -1 for stations on no route.
+
+    Ties go to the earlier route, which is what the notebook's
+    `list.index(max(...))` over its route columns did.
+    """
+    membership = membership.tocoo()
+    rows, cols = membership.row, membership.col
+    parent = np.full(membership.shape[0], -1, dtype=np.int64)
+    if not len(rows):
+        return parent
+    order = np.lexsort((cols, -totals[cols], rows))
+    rows, cols = rows[order], cols[order]
+    first = np.r_[True, rows[1:] != rows[:-1]]
+    parent[rows[first]] = cols[first]
+    return parent
+
+
+def route_label(route):
+    #----- 'lake_shore' -> 'Lake Shore', how the notebook titled parent_route
+    return route.replace('_', ' ').title()
+
+
+def assign_routes(amtrak_df, route_patterns=None, business_line_table=None, year=PARENT_ROUTE_YEAR):
+    """Add num_routes, parent_route and business_line to the monthly amtrak_df.
+
+    Everything is computed per distinct station and broadcast back to rows.
+    Stations on no route get a missing parent_route, and parent routes missing
+    from the business line table get 'NA', both as in the notebook.
+    """
+    route_patterns = route_patterns or load_route_patterns()
+    business_line_table = load_business_lines() if business_line_table is None else business_line_table
+    routes = list(route_patterns)
+
+    station_codes, station_names = pd.factorize(amtrak_df['station_name'])
+    membership = membership_matrix(station_names, route_patterns)
+
+    in_year = (amtrak_df['Year'] == year).to_numpy() & (station_codes >= 0)
+    station_rides = np.bincount(station_codes[in_year], weights=amtrak_df['Rides'].to_numpy()[in_year], minlength=len(station_names))
+    totals = route_totals(membership, station_rides)
+    parent = parent_route_index(membership, totals)
+
+    parent_keys = pd.Series(np.array(routes + [None], dtype=object)[parent])
+    business_lines = parent_keys.map(business_line_table).fillna(UNKNOWN_BUSINESS_LINE).to_numpy(dtype=object)
+    parent_labels = np.array([route_label(route) for route in routes] + [None], dtype=object)[parent]
+    num_routes = np.asarray(membership.sum(axis=1)).ravel().astype(np.int64)
+
+    #----- Per-station results out to rows; a missing station name (code -1) lands on the trailing sentinel
+    return amtrak_df.assign(
+        num_routes=np.r_[num_routes, 0][station_codes],
+        parent_route=np.r_[parent_labels, np.array([None], dtype=object)][station_codes],
+        business_line=np.r_[business_lines, np.array([UNKNOWN_BUSINESS_LINE], dtype=object)][station_codes]
+    )
+
+
+if __name__ == '__main__':
+    #----- python -m pipeline.routes amtrak_df.csv amtrak_prepped_df.csv  (from scripts/)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('src')
+    parser.add_argument('out')
+    parser.add_argument('--year', type=int, default=PARENT_ROUTE_YEAR)
+    args = parser.parse_args()
+
+    amtrak_df = assign_routes(pd.read_csv(args.src), year=args.year)
+    amtrak_df.to_csv(args.out, index=False)
+    print(f"Wrote {len(amtrak_df)} rows, {amtrak_df['parent_route'].nunique()} parent routes, to {args.out}")
@@ -0,0 +1,361 @@
+import argparse
+import hashlib
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from pipeline import artifacts, backtest, diagnostics, disaggregate, forecast, geocode, glm, impute, routes, snapshot
+
+#----- Where things live
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+PCRD_CSV = os.path.join(PIPELINE_DIR, os.pardir, os.pardir, 'data', 'pcrd.csv')
+WORK_DIR = os.environ.get('AMTRAK_PIPELINE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'amtrak_pipeline'))
+
+#----- Bump this whenever a stage's outputs change shape; every stage reruns
+RUN_FORMAT = 1
+
+MANIFEST_FILE = 'manifest.json'
+
+#----- Cleanup notebook: pcrd.csv columns it dropped, and the names it gave the rest
+PCRD_DROPPED = ['URL', 'Station', 'Check']
+PCRD_COLUMNS = {
+    'Ridership Numbers': 'rides',
+    'Year': 'year',
+    'Address': 'address',
+    'Station Name': 'station_name',
+    'Abbreviation': 'abbrev',
+    'State': 'state'
+}
+
+DEFAULTS = {
+    'pcrd': PCRD_CSV,
+    'geocode_cache': geocode.CACHE_PATH,
+    'neighbours': impute.DEFAULT_NEIGHBOURS,
+    'horizon': forecast.HORIZON,
+    'engine': forecast.DEFAULT_ENGINE,
+    'cutoff': forecast.CUTOFF_DATE,
+    'first_cutoff': backtest.FIRST_CUTOFF,
+    'step': backtest.STEP,
+    'backtest_horizon': backtest.HORIZON,
+    'workers': None
+}
+
+
+def clean_stage(inputs, params):
+    pcrd = pd.read_csv(params['pcrd'])
+    return {'yearly': pcrd.drop(columns=PCRD_DROPPED).rename(columns=PCRD_COLUMNS)}
+
+
+def geocode_stage(inputs, params):
+    cache = geocode.GeocodeCache(params['geocode_cache'])
+    try:
+        yearly, _ = geocode.add_coordinates(inputs['clean']['yearly'], cache=cache)
+    finally:
+        cache.close()
+    return {'yearly': yearly}
+
+
+def disaggregate_stage(inputs, params):
+    return {'monthly': disaggregate.yearly_to_monthly(inputs['geocode']['yearly'])}
+
+
+def routes_stage(inputs, params):
+    amtrak_df = inputs['disaggregate']['monthly'].copy()
+    #----- Route notebook: coordinates it patched by station code before assigning routes
+    for abbrev, coords in routes.COORD_OVERRIDES.items():
+        amtrak_df.loc[amtrak_df['abbrev'] == abbrev, ['lat', 'lon']] = coords
+    return {'prepped': routes.assign_routes(amtrak_df)}
+
+
+def impute_stage(inputs, params):
+    filled, donors = impute.impute_missing(inputs['routes']['prepped'], params['neighbours'])
+    return {'filled': filled, 'donors': donors}
+
+
+def forecast_stage(inputs, params):
+    preds, station_diagnostics = forecast.forecast(inputs['impute']['filled'], params['horizon'], params['workers'], params['engine'])
+    return {'preds': preds, 'diagnostics': station_diagnostics}
+
+
+def backtest_stage(inputs, params):
+    #----- No fold cache: the stage's own artifact is the cache
+    metrics, _ = backtest.backtest(
+        inputs['impute']['filled'], params['first_cutoff'], params['step'], params['backtest_horizon'],
+        workers=params['workers'], cache_dir=None
+    )
+    return {'metrics': metrics}
+
+
+def calibration_stage(inputs, params):
+    comparison = forecast.calibration_diagnostics(inputs['impute']['filled'], params['cutoff'], params['workers'], params['engine'])
+    return {'comparison': comparison}
+
+
+#----- The DAG: upstream stages, the params and files that go into each stage's key, and the code it runs.
+#----- 'state' maps a param to a digest of what it points at, for inputs a file's bytes don't describe (the geocode cache)
+STAGES = {
+    'clean': {'deps': [], 'run': clean_stage, 'params': [], 'files': ['pcrd'], 'modules': []},
+    'geocode': {
+        'deps': ['clean'], 'run': geocode_stage, 'params': ['geocode_cache'], 'files': [geocode.OVERRIDES_CSV],
+        'modules': [geocode], 'state': {'geocode_cache': geocode.cache_digest}
+    },
+    'disaggregate': {'deps': ['geocode'], 'run': disaggregate_stage, 'params': [], 'files': [], 'modules': [disaggregate]},
+    'routes': {
+        'deps': ['disaggregate'], 'run': routes_stage, 'params': [],
+        'files': [routes.ROUTE_STATIONS_CSV, routes.BUSINESS_LINES_CSV], 'modules': [routes]
+    },
+    'impute': {'deps': ['routes'], 'run': impute_stage, 'params': ['neighbours'], 'files': [], 'modules': [impute]},
+    'forecast': {
+        'deps': ['impute'], 'run': forecast_stage, 'params': ['horizon', 'engine'], 'files': [],
+        'modules': [forecast, glm, diagnostics]
+    },
+    'backtest': {
+        'deps': ['impute'], 'run': backtest_stage, 'params': ['first_cutoff', 'step', 'backtest_horizon'], 'files': [],
+        'modules': [backtest, forecast, glm]
+    },
+    'calibration': {
+        'deps': ['impute'], 'run': calibration_stage, 'params': ['cutoff', 'engine'], 'files': [],
+        'modules': [forecast, glm, diagnostics]
+    }
+}
+
+#----- The notebooks' CSVs, from (stage, output); amtrak_df.csv kept the notebook's unnamed index column
+EXPORTS = {
+    'amtrak_df.csv': ('disaggregate', 'monthly'),
+    'amtrak_prepped_df.csv': ('routes', 'prepped'),
+    'amtrak_df_v2.csv': ('impute', 'filled'),
+    'donors.csv': ('impute', 'donors'),
+    'amtrak_preds_df.csv': ('forecast', 'preds'),
+    'diagnostics.csv': ('forecast', 'diagnostics'),
+    'backtest.csv': ('backtest', 'metrics'),
+    'comparison.csv': ('calibration', 'comparison')
+}
+INDEXED_EXPORTS = {'amtrak_df.csv'}
+
+#----- Every stage's key also covers the runner and the artifact format
+SHARED_FILES = [os.path.abspath(__file__), artifacts.__file__]
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_files(name, params):
+    stage = STAGES[name]
+    files = [params.get(path, path) for path in stage['files']]
+    return files + [module.__file__ for module in stage['modules']] + SHARED_FILES
+
+
+def stage_key(name, params, upstream):
+    """sha256 of everything that decides a stage's outputs.
+
+    Covers the stage's params, the content digests of its inputs' artifacts,
+    the state behind its 'state' params (e.g. the geocode cache's rows), and
+    the bytes of its input files and of the code it runs, so a key only
+    matches when rerunning would write the same artifacts.
+    """
+    digest = hashlib.sha256(json.dumps([
+        RUN_FORMAT,
+        name,
+        {param: params[param] for param in STAGES[name]['params']},
+        {param: state(params[param]) for param, state in STAGES[name].get('state', {}).items()},
+        {dep: upstream[dep]['outputs'] for dep in STAGES[name]['deps']}
+    ], sort_keys=True).encode())
+    for path in stage_files(name, params):
+        digest.update(file_digest(path).encode())
+    return digest.hexdigest()
+
+
+def stage_dir(work_dir, name, key):
+    return os.path.join(work_dir, f'{name}-{key[:16]}')
+
+
+def load_manifest(path, key):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('key') == key else None
+
+
+def reset_peak_rss():
+    #----- Linux lets a process reset its high-water mark; elsewhere the peak counts from process start
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    #----- ru_maxrss is bytes on macOS, kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == 'darwin' else 1024)
+
+
+def run_stage(task):
+    """Run one stage on its inputs' artifacts and write its own; returns the stage manifest.
+
+    Inputs are read from the upstream stage directories, so a worker process
+    only gets paths. Time and peak RSS cover reading, running and writing;
+    the RSS is this process's only, not any pool the stage starts itself. The
+    directory is built aside and renamed into place.
+    """
+    name, key, params, input_dirs, path = task
+    start = time.perf_counter()
+    reset_peak_rss()
+    inputs = {
+        dep: {output: artifacts.read_frame(os.path.join(dep_dir, output)) for output in os.listdir(dep_dir) if output != MANIFEST_FILE}
+        for dep, dep_dir in input_dirs.items()
+    }
+    outputs = STAGES[name]['run'](inputs, params)
+
+    with artifacts.atomic_dir(path) as tmp_path:
+        digests = {output: artifacts.write_frame(frame, os.path.join(tmp_path, output)) for output, frame in outputs.items()}
+
+        manifest = {
+            'stage': name,
+            'key': key,
+            'outputs': digests,
+            'rows': {output: len(frame) for output, frame in outputs.items()},
+            'seconds': time.perf_counter() - start,
+            'peak_rss_mb': peak_rss_mb()
+        }
+        with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def upstream_stages(targets):
+    #----- Targets plus everything they depend on, in STAGES order (which is topological)
+    needed = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo += STAGES[name]['deps']
+    return [name for name in STAGES if name in needed]
+
+
+def log_stage(name, manifest, cached):
+    if cached:
+        print(f'{name:<14}cached')
+    else:
+        print(f"{name:<14}ran in {manifest['seconds']:.2f}s, peak RSS {manifest['peak_rss_mb']:.0f} MB, rows {manifest['rows']}")
+
+
+def build(targets=None, params=None, work_dir=WORK_DIR, jobs=None, force=(), log=True):
+    """Bring `targets` (default: every stage) and their upstream stages up to date in `work_dir`.
+
+    A stage is skipped when its key (see stage_key) matches a finished
+    directory in `work_dir`; stages in `force` rerun anyway. Stages whose
+    inputs are ready run side by side on a process pool (`jobs=0` runs them
+    in-process, one at a time). Returns {stage: manifest} with 'cached' and
+    'path' added.
+    """
+    params = {**DEFAULTS, **(params or {})}
+    os.makedirs(work_dir, exist_ok=True)
+    pending = upstream_stages(targets or list(STAGES))
+    done = {}
+    running = {}
+
+    def finish(manifest, path, cached):
+        done[manifest['stage']] = {**manifest, 'cached': cached, 'path': path}
+        if log:
+            log_stage(manifest['stage'], manifest, cached)
+
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs != 0 else None
+    try:
+        while pending or running:
+            for name in [name for name in pending if all(dep in done for dep in STAGES[name]['deps'])]:
+                pending.remove(name)
+                key = stage_key(name, params, done)
+                path = stage_dir(work_dir, name, key)
+                manifest = None if name in force else load_manifest(path, key)
+                if manifest:
+                    finish(manifest, path, True)
+                    continue
+                task = (name, key, params, {dep: done[dep]['path'] for dep in STAGES[name]['deps']}, path)
+                if pool:
+                    running[pool.submit(run_stage, task)] = path
+                else:
+                    finish(run_stage(task), path, False)
+
+            if running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finish(future.result(), running.pop(future), False)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    return done
+
+
+def export(done, out_dir):
+    #----- Write the notebooks' CSVs for every built stage
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for filename, (name, output) in EXPORTS.items():
+        if name in done:
+            frame = artifacts.read_frame(os.path.join(done[name]['path'], output))
+            frame.to_csv(os.path.join(out_dir, filename), index=filename in INDEXED_EXPORTS, date_format='%Y-%m-%d')
+            written.append(filename)
+    return written
+
+
+def export_snapshot(done, out_dir):
+    #----- The app's columnar snapshot, from the forecast rows and the imputed frame's coordinates
+    preds = artifacts.read_frame(os.path.join(done['forecast']['path'], 'preds'))
+    amtrak_df = artifacts.read_frame(os.path.join(done['impute']['path'], 'filled'))
+    return snapshot.write_snapshot(preds, amtrak_df, out_dir)
+
+
+if __name__ == '__main__':
+    #----- python -m pipeline.run [forecast backtest ...] --out-dir ../data  (from scripts/)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('targets', nargs='*', help=f"stages to bring up to date, default all of {', '.join(STAGES)}")
+    parser.add_argument('--work-dir', default=WORK_DIR)
+    parser.add_argument('--out-dir', default=None, help='write the notebooks\' CSVs here')
+    parser.add_argument('--snapshot-dir', default=None, help='write the app\'s columnar snapshot here (needs forecast)')
+    parser.add_argument('--jobs', type=int, default=None, help='stages run side by side; 0 runs them in-process')
+    parser.add_argument('--force', nargs='+', choices=list(STAGES), default=[], help='rerun these even if cached')
+    parser.add_argument('--pcrd', default=PCRD_CSV)
+    parser.add_argument('--geocode-cache', default=geocode.CACHE_PATH)
+    parser.add_argument('--neighbours', type=int, default=impute.DEFAULT_NEIGHBOURS)
+    parser.add_argument('--horizon', type=int, default=forecast.HORIZON)
+    parser.add_argument('--engine', choices=forecast.ENGINES, default=forecast.DEFAULT_ENGINE)
+    parser.add_argument('--cutoff', default=forecast.CUTOFF_DATE, help='calibration split')
+    parser.add_argument('--first-cutoff', default=backtest.FIRST_CUTOFF)
+    parser.add_argument('--step', type=int, default=backtest.STEP)
+    parser.add_argument('--backtest-horizon', type=int, default=backtest.HORIZON)
+    parser.add_argument('--workers', type=int, default=None, help='per-stage process pools; 0 fits in-process')
+    args = parser.parse_args()
+    unknown = [name for name in args.targets if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages {', '.join(unknown)}")
+
+    params = {param: getattr(args, param) for param in DEFAULTS}
+    start = time.perf_counter()
+    done = build(args.targets, params, args.work_dir, args.jobs, args.force)
+    print(f"{sum(not stage['cached'] for stage in done.values())} of {len(done)} stages ran in {time.perf_counter() - start:.2f}s")
+    if args.out_dir:
+        print(f"Wrote {', '.join(export(done, args.out_dir))} to {args.out_dir}")
+    if args.snapshot_dir and 'forecast' in done:
+        print(f'Wrote {export_snapshot(done, args.snapshot_dir)} rows to {args.snapshot_dir}')
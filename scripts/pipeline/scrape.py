@@ -0,0 +1,260 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import pymupdf
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from pipeline import artifacts
+
+#----- Where the fact sheets live
+BASE_URL = 'https://www.railpassengers.org'
+INDEX_PATH = '/resources/ridership-statistics/'
+CACHE_DIR = os.environ.get('AMTRAK_SCRAPE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'amtrak_scrape'))
+
+#----- Same link filters the scrape notebook settled on
+ROUTE_SHEET_PATTERN = re.compile(r'[A-Za-z]{2}\d{2}\.pdf$')
+EXCLUDED_SHEETS = {'/site/assets/files/6872/thruway.pdf'}
+
+#----- Ridership figures on the sheets are formatted like "37,161"
+RIDERSHIP_PATTERN = re.compile(r'\b\d{2},\d{3}\b')
+
+#----- Flush the cache index every this many fetches so an interrupted crawl keeps its progress
+INDEX_FLUSH_EVERY = 25
+
+
+def sheet_links(index_html):
+    #----- Station sheet paths from the <option> values, minus route sheets (XX##.pdf) and thruway
+    soup = BeautifulSoup(index_html, 'html.parser')
+    links = []
+    for option in soup.find_all('option'):
+        value = option.get('value')
+        if not value or not value.endswith('.pdf'):
+            continue
+        if len(value.split('/')[-1].split('.')[0]) > 2 and not ROUTE_SHEET_PATTERN.search(value) and value not in EXCLUDED_SHEETS:
+            links.append(value)
+    return links
+
+
+def extract_text(pdf_bytes):
+    #----- Parse straight from memory, no temp file
+    with pymupdf.open(stream=pdf_bytes, filetype='pdf') as document:
+        return ''.join(page.get_text() for page in document)
+
+
+def ridership_numbers(text):
+    return RIDERSHIP_PATTERN.findall(text)
+
+
+def parse_sheet(pdf_bytes):
+    #----- Top-level so a process pool can pickle it
+    return ridership_numbers(extract_text(pdf_bytes))
+
+
+class SheetCache:
+    """Content-addressed store for downloaded fact sheets.
+
+    Sheet bytes live under objects/<sha256>.pdf and their parsed numbers under
+    objects/<sha256>.json; index.json maps each URL to its digest plus the
+    ETag/Last-Modified the server sent, which become the conditional headers
+    of the next crawl.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def _write(self, path, data, mode='wb'):
+        #----- Write then rename so a crash never leaves a truncated object behind
+        with artifacts.atomic_write(path, mode) as f:
+            f.write(data)
+
+    def entry(self, url):
+        with self._lock:
+            entry = self.index.get(url)
+        if entry and os.path.exists(self.object_path(entry['sha256'])):
+            return entry
+        return None
+
+    def conditional_headers(self, url):
+        entry = self.entry(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def object_path(self, digest, ext='pdf'):
+        return os.path.join(self.objects_dir, f'{digest}.{ext}')
+
+    def put(self, url, content, etag=None, last_modified=None):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            self._write(path, content)
+        with self._lock:
+            self.index[url] = {'sha256': digest, 'etag': etag, 'last_modified': last_modified}
+        return digest
+
+    def load(self, digest):
+        with open(self.object_path(digest), 'rb') as f:
+            return f.read()
+
+    def parsed(self, digest):
+        try:
+            with open(self.object_path(digest, 'json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_parsed(self, digest, numbers):
+        self._write(self.object_path(digest, 'json'), json.dumps(numbers), mode='w')
+
+    def save(self):
+        with self._lock:
+            index_json = json.dumps(self.index, indent=1, sort_keys=True)
+        self._write(self.index_path, index_json, mode='w')
+
+
+def make_session(pool_size=16, retries=3):
+    #----- One keep-alive pool per host, retried on throttling and server errors
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=('GET',))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_sheet(session, cache, url, timeout=30):
+    """Fetch one sheet, revalidating against the cache. Returns (digest, status)."""
+    response = session.get(url, headers=cache.conditional_headers(url), timeout=timeout)
+    if response.status_code == 304:
+        return cache.entry(url)['sha256'], 304
+    response.raise_for_status()
+    digest = cache.put(url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return digest, response.status_code
+
+
+def fetch_sheets(urls, cache, workers=16, session=None, timeout=30):
+    """Fetch every URL on a bounded thread pool sharing one pooled session.
+
+    Returns {url: (digest, status)}; failures come back as (None, exception)
+    so one bad sheet doesn't sink the crawl.
+    """
+    session = session or make_session(pool_size=workers)
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_sheet, session, cache, url, timeout): url for url in urls}
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                url = futures[future]
+                try:
+                    results[url] = future.result()
+                except (requests.RequestException, OSError) as e:
+                    results[url] = (None, e)
+                if done % INDEX_FLUSH_EVERY == 0:
+                    cache.save()
+        finally:
+            cache.save()
+    return results
+
+
+def parse_sheets(digests, cache, workers=None):
+    """Ridership numbers per digest, parsing only sheets the cache hasn't seen.
+
+    `workers=0` parses in-process; otherwise PyMuPDF runs in a process pool.
+    """
+    numbers = {}
+    todo = []
+    for digest in set(digests):
+        cached = cache.parsed(digest)
+        if cached is None:
+            todo.append(digest)
+        else:
+            numbers[digest] = cached
+
+    if todo and workers == 0:
+        parsed = [parse_sheet(cache.load(digest)) for digest in todo]
+    elif todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(parse_sheet, (cache.load(digest) for digest in todo), chunksize=8))
+    else:
+        parsed = []
+
+    for digest, sheet_numbers in zip(todo, parsed):
+        cache.put_parsed(digest, sheet_numbers)
+        numbers[digest] = sheet_numbers
+    return numbers
+
+
+def scrape(base_url=BASE_URL, cache_dir=CACHE_DIR, fetch_workers=16, parse_workers=None, session=None):
+    """Crawl the ridership statistics page into the notebook's pre-cleaned frame.
+
+    Returns (frame, report). The frame has one row per number found, with
+    'Ridership Numbers' and 'Station' (the sheet path) like pcrd.csv came out
+    of the notebook. The report counts fresh downloads, 304 revalidations and
+    failures.
+    """
+    session = session or make_session(pool_size=fetch_workers)
+    cache = SheetCache(cache_dir)
+
+    index = session.get(base_url + INDEX_PATH, timeout=30)
+    index.raise_for_status()
+    links = sheet_links(index.content)
+
+    fetched = fetch_sheets([base_url + link for link in links], cache, workers=fetch_workers, session=session)
+    failed = {url: result[1] for url, result in fetched.items() if result[0] is None}
+    numbers = parse_sheets([digest for digest, _ in fetched.values() if digest], cache, workers=parse_workers)
+
+    ridership_data = []
+    for link in links:
+        digest = fetched[base_url + link][0]
+        if digest is None:
+            continue
+        ridership_data.append(pd.DataFrame({'Ridership Numbers': numbers[digest], 'Station': link}, columns=['Ridership Numbers', 'Station']))
+
+    statuses = [status for digest, status in fetched.values() if digest]
+    report = {
+        'sheets': len(links),
+        'downloaded': sum(status == 200 for status in statuses),
+        'not_modified': sum(status == 304 for status in statuses),
+        'failed': failed
+    }
+    frame = pd.concat(ridership_data) if ridership_data else pd.DataFrame(columns=['Ridership Numbers', 'Station'])
+    return frame, report
+
+
+if __name__ == '__main__':
+    #----- python -m pipeline.scrape [--out pcrd.csv]  (from scripts/)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default='pcrd.csv')
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--fetch-workers', type=int, default=16)
+    parser.add_argument('--parse-workers', type=int, default=None)
+    args = parser.parse_args()
+
+    frame, report = scrape(args.base_url, args.cache_dir, args.fetch_workers, args.parse_workers)
+    frame.to_csv(args.out)
+    print(f"{report['sheets']} sheets: {report['downloaded']} downloaded, {report['not_modified']} unchanged, {len(report['failed'])} failed")
+    for url, error in report['failed'].items():
+        print(f'  {url}: {error}')
@@ -0,0 +1,43 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+#----- The app owns the snapshot layout; the pipeline hands it CSVs through data_loader.py's command line instead of importing app code
+APP_DIR = os.environ.get(
+    'AMTRAK_APP_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python-app-github')
+)
+
+
+def write_snapshot(preds, amtrak_df, out_dir, app_dir=APP_DIR):
+    """Write forecast rows (amtrak_preds_df layout) as the app's dictionary-encoded snapshot.
+
+    Coordinates come from amtrak_df. Both frames go to the app as CSVs, the
+    same hand-off as the exported amtrak_preds_df.csv, and
+    `data_loader.py --preds --coords` builds the snapshot, so the layout has
+    one owner. Returns the number of rows written.
+    """
+    with tempfile.TemporaryDirectory(prefix='amtrak_snapshot_') as tmp:
+        preds_csv, coords_csv = os.path.join(tmp, 'preds.csv'), os.path.join(tmp, 'coords.csv')
+        preds.to_csv(preds_csv, index=False, date_format='%Y-%m-%d')
+        amtrak_df[['station_name', 'lat', 'lon']].drop_duplicates(subset='station_name').to_csv(coords_csv, index=False)
+        subprocess.run(
+            [sys.executable, 'data_loader.py', '--preds', preds_csv, '--coords', coords_csv, os.path.abspath(out_dir)],
+            cwd=app_dir, check=True, stdout=subprocess.DEVNULL
+        )
+    return len(preds)
+
+
+if __name__ == '__main__':
+    #----- python -m pipeline.snapshot amtrak_preds_df.csv amtrak_df_v2.csv python-app-github/data/amtrak_snapshot  (from scripts/)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('preds')
+    parser.add_argument('coords', help='any frame with station_name, lat and lon, e.g. amtrak_df_v2.csv')
+    parser.add_argument('out_dir')
+    args = parser.parse_args()
+
+    rows = write_snapshot(pd.read_csv(args.preds, parse_dates=['.index']), pd.read_csv(args.coords), args.out_dir)
+    print(f'Wrote {rows} rows to {args.out_dir}')
@@ -0,0 +1,98 @@
+import pandas as pd
+
+from route_map_layer import build_route_geometry
+
+#----- Grain of the cube every callback query is answered from
+CUBE_KEYS = ['business_line', 'parent_route', 'station_name', 'year', 'month', 'key']
+
+
+def _split(df, by, columns):
+    #----- One small frame per key so a query is a dict lookup instead of a mask over the full data
+    keys = [df[col] for col in by] if isinstance(by, list) else df[by]
+    groups = {}
+    for name, group in df[columns].groupby(keys, observed=True, sort=False):
+        #----- Each group is already its own copy, relabel it rather than copying again
+        group.index = pd.RangeIndex(len(group))
+        groups[name] = group
+    return groups
+
+
+class AggregateCube:
+    """Rollups of `amtrak_df` built once at startup.
+
+    Each method answers one callback's query with a dict lookup. Frames
+    handed out are shared between requests, so callers must not modify them
+    in place.
+    """
+
+    def __init__(self, amtrak_df, top_n=5):
+        self.top_n = top_n
+
+        #----- Base rollup, sorted so every frame cut from it comes out in alphabetical order
+        self.cube = (
+            amtrak_df.groupby(CUBE_KEYS, observed=True)['rides'].sum()
+            .sort_index()
+            .reset_index()
+        )
+        coords = amtrak_df[['station_name', 'lat', 'lon']].drop_duplicates(subset='station_name')
+
+        #----- Top N parent routes per business line (only depends on the business line)
+        route_totals = self.cube.groupby(['business_line', 'parent_route'], observed=True)['rides'].sum().reset_index()
+        self.top_routes = {
+            bl: group.sort_values(by='rides', ascending=False).head(top_n)['parent_route'].tolist()
+            for bl, group in route_totals.groupby('business_line', observed=True)
+        }
+
+        #----- Tab 2: monthly rides per parent route, pre-cut to the top N routes of each business line
+        route_months = (
+            self.cube.groupby(['parent_route', 'year', 'month'], observed=True)['rides'].sum()
+            .sort_index()
+            .reset_index()
+        )
+        self.top_route_months = {}
+        for bl, routes in self.top_routes.items():
+            top_df = route_months[route_months['parent_route'].isin(routes)]
+            for year, group in _split(top_df, 'year', list(top_df.columns)).items():
+                self.top_route_months[(bl, year)] = group
+
+        #----- Tab 3: station time series per parent route
+        station_series = self.cube[['parent_route', 'station_name', 'year', 'month', 'key', 'rides']].copy()
+        station_series['month_date'] = pd.to_datetime(station_series[['year', 'month']].assign(day=1))
+        station_series = station_series[['parent_route', 'station_name', 'month_date', 'key', 'rides']]
+        self.station_series = _split(station_series, 'parent_route', ['station_name', 'month_date', 'key', 'rides'])
+
+        #----- Tab 4: yearly rides per station with coordinates, behind the route map geometry and the station table
+        station_years = (
+            self.cube.groupby(['business_line', 'parent_route', 'station_name', 'year'], observed=True)['rides'].sum()
+            .sort_index()
+            .reset_index()
+        )
+        station_years = pd.merge(station_years, coords, on='station_name', how='left')
+        station_years = station_years[['business_line', 'parent_route', 'station_name', 'year', 'lat', 'lon', 'rides']]
+        self.route_geometry = build_route_geometry(station_years)
+        station_rankings = station_years.sort_values(
+            by=['business_line', 'parent_route', 'year', 'rides'],
+            ascending=[True, True, True, False],
+            kind='mergesort'
+        )
+        self.station_rankings = _split(station_rankings, ['business_line', 'parent_route', 'year'], ['station_name', 'rides'])
+
+        self._empty_route_months = route_months.iloc[:0]
+        self._empty_station_series = station_series.iloc[:0].drop(columns='parent_route')
+        self._empty_station_table = station_years.iloc[:0][['station_name', 'rides']]
+
+    def parent_route_months(self, business_line, year):
+        #----- Monthly rides for the top N parent routes of a business line in one year
+        return self.top_route_months.get((business_line, year), self._empty_route_months)
+
+    def station_months(self, parent_route):
+        #----- (station_name, month_date, key, rides) for every station on a parent route
+        return self.station_series.get(parent_route, self._empty_station_series)
+
+    def map_geometry(self, business_line, parent_route):
+        #----- Station coordinates + station x year rides matrix for one route (None if unknown)
+        return self.route_geometry.get((business_line, parent_route))
+
+    def station_table(self, business_line, parent_route, year):
+        #----- (station_name, rides) sorted by rides, descending
+        return self.station_rankings.get((business_line, parent_route, year), self._empty_station_table)
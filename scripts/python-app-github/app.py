@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 import os
+import logging
+import uuid
 import plotly.express as px
 import dash
 from dash import dcc, html
@@ -10,57 +12,130 @@ from dash import dash_table
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import math
+from data_loader import load_amtrak_df, load_snapshot, data_version, SnapshotWatch
+from aggregates import AggregateCube
+from figure_cache import FigureCache
+from station_grid import build_station_grid, build_station_grid_legacy, grid_shape, num_pages, station_page
+from table_paging import page_of
+from route_map_layer import map_figure, map_year_patch, year_rides
+from dash.exceptions import MissingCallbackContextException
+from dash import Patch, no_update
+import instrumentation
+from instrumentation import phase, startup_step
+
+logger = logging.getLogger(__name__)
 
 #-----Read in and set up data
-amtrak_df = pd.read_csv('https://raw.githubusercontent.com/statzenthusiast921/amtrak_analysis/main/data/amtrak_preds_df.csv')
-amtrak_coords = pd.read_csv('https://raw.githubusercontent.com/statzenthusiast921/amtrak_analysis/main/data/amtrak_df_v2.csv')
-amtrak_coords = amtrak_coords[['station_name','lat','lon']].drop_duplicates()
-amtrak_df = pd.merge(amtrak_df, amtrak_coords, on='station_name', how='left')
-amtrak_df = amtrak_df.rename(
-    columns={
-        '.key': 'key', 
-        '.index': 'month_date', 
-        '.value': 'rides'
-    }
-).drop(columns='.model_desc')
-
-amtrak_df['month_date'] = pd.to_datetime(amtrak_df['month_date'])
-amtrak_df['year'] = amtrak_df['month_date'].dt.year
-amtrak_df['month'] = amtrak_df['month_date'].dt.month
+#----- AMTRAK_HOT_RELOAD=1 watches the snapshot for rebuilds (see swap_data); made before loading so a rebuild during startup is seen
+snapshot_watch = SnapshotWatch() if os.environ.get('AMTRAK_HOT_RELOAD') == '1' else None
+amtrak_df = load_amtrak_df()
+startup_step('load_amtrak_df')
 
 #-----Set up choices for dropdown menus
-bl_choices = sorted(amtrak_df['business_line'].unique())
-pr_choices = sorted(amtrak_df['business_line'].unique())
+def dropdown_choices(amtrak_df):
+    bl_choices = sorted(amtrak_df['business_line'].unique())
+    pr_choices = sorted(amtrak_df['business_line'].unique())
+    return bl_choices, pr_choices
+
+bl_choices, pr_choices = dropdown_choices(amtrak_df)
 
 
 #-----Business line table
-business_line_table = amtrak_df.groupby(['business_line', 'year'])['rides'].sum().reset_index()
-business_line_table = business_line_table.pivot(index='business_line', columns='year', values='rides')
-business_line_table = business_line_table.round().reset_index().rename(
-    columns = {
-        'business_line':'Business Line'
-    }
-)
+def build_business_line_table(amtrak_df):
+    business_line_table = amtrak_df.groupby(['business_line', 'year'], observed=True)['rides'].sum().reset_index()
+    business_line_table = business_line_table.pivot(index='business_line', columns='year', values='rides')
+    business_line_table = business_line_table.round().reset_index().rename(
+        columns = {
+            'business_line':'Business Line'
+        }
+    )
 
-for col in business_line_table.columns[1:]:
-    business_line_table[col] = pd.to_numeric(business_line_table[col], errors='coerce')
+    for col in business_line_table.columns[1:]:
+        business_line_table[col] = pd.to_numeric(business_line_table[col], errors='coerce')
+    return business_line_table
+
+business_line_table = build_business_line_table(amtrak_df)
 
 def format_millions(x):
     if pd.isna(x):
         return ''
     return f'{x / 1e6:.2f} M'
 
-#----- Apply formatting to all columns except the first
-for col in business_line_table.columns[1:]:
-    business_line_table[col] = business_line_table[col].apply(format_millions)
+#----- Table stays numeric so it can be sorted/filtered server-side, pages are formatted on the way out
+def format_business_line_page(page):
+    page = page.copy()
+    for col in page.columns[1:]:
+        page[col] = page[col].apply(format_millions)
+    return page
 
 #----- Business Line --> Parent Route Dictionary
-df_for_dict = amtrak_df[['business_line','parent_route']]
-df_for_dict = df_for_dict.drop_duplicates(subset='parent_route',keep='first')
-business_line_parent_route_dict = df_for_dict.groupby('business_line')['parent_route'].apply(list).to_dict()
+def build_parent_route_dict(amtrak_df):
+    df_for_dict = amtrak_df[['business_line','parent_route']]
+    df_for_dict = df_for_dict.drop_duplicates(subset='parent_route',keep='first')
+    return df_for_dict.groupby('business_line', observed=True)['parent_route'].apply(list).to_dict()
+
+business_line_parent_route_dict = build_parent_route_dict(amtrak_df)
+startup_step('business_line_tables')
+
+#----- Rollups behind the callbacks, built once instead of per request
+cube = AggregateCube(amtrak_df)
+startup_step('aggregate_cube')
 
-#----- Station Table
-station_table = amtrak_df[['station_name','rides']]
+#----- Server-side paging for the DataTables: only the visible page ever goes to the browser
+BL_TABLE_PAGE_SIZE = 10
+STATION_TABLE_PAGE_SIZE = 15
+
+@phase('pandas')
+def business_line_table_page(dd1, page_current=0, page_size=BL_TABLE_PAGE_SIZE, sort_by=None, filter_query=None):
+    bl_table_filtered = business_line_table[(business_line_table['Business Line']==dd1)]
+    display = {col: format_millions for col in business_line_table.columns[1:]}
+    page, page_count, page_current = page_of(bl_table_filtered, page_current, page_size, sort_by, filter_query, display)
+    return format_business_line_page(page).to_dict('records'), page_count, page_current
+
+def format_rides(value):
+    if value >= 1000:
+        return '{:,.0f}K'.format(value / 1000)
+    return '{:,.0f}'.format(value)
+
+@phase('pandas')
+def station_table_page(dd4, dd5, slider2, page_current=0, page_size=STATION_TABLE_PAGE_SIZE, sort_by=None, filter_query=None):
+    table_final = cube.station_table(dd4, dd5, slider2)
+    #----- Sort and compare on the numeric rides, 'contains' matches the K-formatted text; format only the page being sent
+    page, page_count, page_current = page_of(table_final, page_current, page_size, sort_by, filter_query, {'rides': format_rides})
+    page = page.assign(rides=pd.to_numeric(page['rides'], errors='coerce').apply(format_rides))
+    return page.to_dict('records'), page_count, page_current
+
+bl_table_data, bl_table_page_count, _ = business_line_table_page(bl_choices[0])
+station_table_data, station_table_page_count, _ = station_table_page(
+    bl_choices[0],
+    business_line_parent_route_dict[bl_choices[0]][0],
+    amtrak_df['year'].min()
+)
+startup_step('initial_table_pages')
+
+#----- Station grid renderer: 'vectorized' (default), 'scattergl' or the original per-trace 'legacy' loop
+STATION_GRID_MODE = os.environ.get('AMTRAK_STATION_GRID', 'vectorized')
+
+#----- Station grid paging: the first page of stations renders with the dropdown, the rest stream in one page per interval tick
+#----- AMTRAK_STATION_GRID_PAGE_SIZE=0 renders the whole route as one figure
+STATION_GRID_PAGE_SIZE = int(os.environ.get('AMTRAK_STATION_GRID_PAGE_SIZE', 12))
+STATION_GRID_STREAM_MS = int(os.environ.get('AMTRAK_STATION_GRID_STREAM_MS', 250))
+
+#----- Figure cache: in-process LRU plus an optional on-disk tier shared by gunicorn workers
+#----- The grid settings go in every key, so servers configured differently can share AMTRAK_FIGURE_CACHE_DIR
+figure_cache = FigureCache(
+    maxsize=int(os.environ.get('AMTRAK_FIGURE_CACHE_SIZE', 512)),
+    disk_dir=os.environ.get('AMTRAK_FIGURE_CACHE_DIR'),
+    version=data_version(amtrak_df),
+    settings=(('station_grid_mode', STATION_GRID_MODE), ('station_grid_page_size', STATION_GRID_PAGE_SIZE)),
+    disk_maxbytes=int(os.environ.get('AMTRAK_FIGURE_CACHE_DISK_MB', 256)) * 2 ** 20
+)
+startup_step('figure_cache')
+
+#----- Figure cache counters alongside the request metrics on /metrics
+instrumentation.METRICS.add_gauges(lambda: {
+    f'amtrak_figure_cache_{name}': value for name, value in figure_cache.stats().items() if isinstance(value, (int, float))
+})
 
 #----- Define style for different pages in app
 tabs_styles = {
@@ -87,6 +162,9 @@ tab_selected_style = {
 
 app = dash.Dash(__name__,assets_folder=os.path.join(os.curdir,"assets"))
 server = app.server
+
+#----- Per-callback timings on /metrics, and opt-in profiling (see instrumentation.py); must wrap app.callback before any callback is registered
+instrumentation.install(app)
 app.layout = html.Div([
     dcc.Tabs([
         dcc.Tab(label='Welcome',value='tab-1',style=tab_style, selected_style=tab_selected_style,
@@ -136,7 +214,16 @@ app.layout = html.Div([
                         dash_table.DataTable(
                             id='business_line_table',
                             columns=[{"name": i, "id": i} for i in business_line_table.columns],
-                            data=business_line_table.to_dict('records'),
+                            data=bl_table_data,
+                            page_action='custom',
+                            page_current=0,
+                            page_size=BL_TABLE_PAGE_SIZE,
+                            page_count=bl_table_page_count,
+                            sort_action='custom',
+                            sort_mode='single',
+                            sort_by=[],
+                            filter_action='custom',
+                            filter_query='',
                             style_table={
                                 'overflowX': 'auto',
                                 'backgroundColor': '#000000' 
@@ -204,7 +291,11 @@ app.layout = html.Div([
                         )
                     ], width = 6),
                     dbc.Col([
-                        dcc.Graph(id = 'stn_fc_charts')
+                        dcc.Graph(id = 'stn_fc_charts'),
+                        html.Div(id = 'stn_fc_more', children = []),
+                        dcc.Store(id = 'stn_fc_grid'),
+                        dcc.Store(id = 'stn_fc_streamed'),
+                        dcc.Interval(id = 'stn_fc_stream', interval = STATION_GRID_STREAM_MS, n_intervals = 0, max_intervals = 0)
                     ])
                 ])
             ]
@@ -262,7 +353,16 @@ app.layout = html.Div([
                                 {'name': 'Station Name', 'id': 'station_name'},
                                 {'name': 'Rides', 'id': 'rides'}
                              ],
-                            data=station_table.to_dict('records'),
+                            data=station_table_data,
+                            page_action='custom',
+                            page_current=0,
+                            page_size=STATION_TABLE_PAGE_SIZE,
+                            page_count=station_table_page_count,
+                            sort_action='custom',
+                            sort_mode='single',
+                            sort_by=[],
+                            filter_action='custom',
+                            filter_query='',
                             style_table={
                                 'overflowX': 'auto',
                                 'overflowY': 'auto',
@@ -282,19 +382,55 @@ app.layout = html.Div([
         )
     ])
 ])
+startup_step('layout')
+
+#----- Which input fired the callback; None when called outside a request (warm-up, benchmarks)
+def triggered_id():
+    try:
+        return dash.ctx.triggered_id
+    except MissingCallbackContextException:
+        return None
+
+#----- A filter or a new selection can leave the table on a page past the end; send the page actually shown, nothing if it didn't move
+def clamped_page(page_current, clamped):
+    return no_update if clamped == (page_current or 0) else clamped
 
 #----- Tab #1: FC Table --> Business Line
 @app.callback(
     Output('business_line_table','data'),
-    Input('dropdown1','value')
+    Output('business_line_table','page_count'),
+    Output('business_line_table','page_current'),
+    Input('dropdown1','value'),
+    Input('business_line_table','page_current'),
+    Input('business_line_table','page_size'),
+    Input('business_line_table','sort_by'),
+    Input('business_line_table','filter_query')
 )
-def bl_fc_table(dd1):
-    bl_table_filtered = business_line_table[(business_line_table['Business Line']==dd1)]
-
-    return bl_table_filtered.to_dict('records')
+def bl_fc_table(dd1, page_current=0, page_size=BL_TABLE_PAGE_SIZE, sort_by=None, filter_query=None):
+    data, page_count, clamped = business_line_table_page(dd1, page_current, page_size, sort_by, filter_query)
+    return data, page_count, clamped_page(page_current, clamped)
 
 
 #---- Tab #1: Top 5 Parent Routes Monthly Chart by Year 
+FORECAST_YEARS = [2023, 2024]
+
+def monthly_chart_title(val1, val2):
+    kind = 'Forecasts' if val2 in FORECAST_YEARS else 'Actuals'
+    return f'Monthly Ridership {kind} for Top 5 Parent Routes of the {val1} business line in {val2}'
+
+@phase('pandas')
+def monthly_chart_patch(parent_route_filtered_df, dd1, slider1):
+    #----- Same routes and months as the figure on screen, so only y-values, hover year, dash style and title change
+    patch = Patch()
+    dash_style = 'dash' if slider1 in FORECAST_YEARS else 'solid'
+    for i, (route, route_df) in enumerate(parent_route_filtered_df.groupby('parent_route', observed=True, sort=False)):
+        patch['data'][i]['y'] = route_df['rides'].to_numpy()
+        patch['data'][i]['customdata'] = [[route, slider1]] * len(route_df)
+        patch['data'][i]['line']['dash'] = dash_style
+    patch['layout']['title']['text'] = monthly_chart_title(dd1, slider1)
+    patch['layout']['annotations'][0]['y'] = parent_route_filtered_df['rides'].max()
+    return patch
+
 @app.callback(
     Output('parent_route_monthly_charts','figure'),
     Input('dropdown1','value'),
@@ -302,15 +438,21 @@ def bl_fc_table(dd1):
 
 )
 def monthly_chart_parent_routes(dd1, slider1):
-    parent_route = amtrak_df[amtrak_df['business_line']==dd1]
-    top5_parent_routes = parent_route.groupby(['parent_route'])['rides'].sum().reset_index()
-    top5_parent_routes = top5_parent_routes.sort_values(by = 'rides',ascending=False).head(5)
-    top5_parent_routes_list = top5_parent_routes['parent_route'].unique()
-    parent_route_df = amtrak_df[amtrak_df['parent_route'].isin(top5_parent_routes_list)]
-    parent_route_df = parent_route_df.groupby(['parent_route','year','month'])['rides'].sum().reset_index()
-    parent_route_filtered_df = parent_route_df[parent_route_df['year']==slider1]
+    parent_route_filtered_df = cube.parent_route_months(dd1, slider1)
+    num_routes = parent_route_filtered_df['parent_route'].nunique()
+    complete = num_routes == len(cube.top_routes.get(dd1, [])) and len(parent_route_filtered_df) == 12 * num_routes
+
+    #----- Only the year moved and every top route has all 12 months: same traces on screen, patch them in place
+    if triggered_id() == 'slider1' and num_routes and complete:
+        return monthly_chart_patch(parent_route_filtered_df, dd1, slider1)
+    return monthly_chart_figure(dd1, slider1)
+
+@figure_cache.memoize
+@phase('figure')
+def monthly_chart_figure(dd1, slider1):
+    parent_route_filtered_df = cube.parent_route_months(dd1, slider1)
     
-    val1 = parent_route['business_line'].unique()[0]
+    val1 = dd1
     val2 = slider1
 
     line_chart = px.line(
@@ -330,7 +472,7 @@ def monthly_chart_parent_routes(dd1, slider1):
             'parent_route':'Parent Route',
             'year':'Year'
         },
-        title = f'Monthly Ridership Actuals for Top 5 Parent Routes of the {val1} business line in {val2}'
+        title = monthly_chart_title(val1, val2)
 
     ).update_layout(
         xaxis_title='Month', 
@@ -341,11 +483,9 @@ def monthly_chart_parent_routes(dd1, slider1):
     )
 
     #-----Check if the selected year is 2023 or 2024
-    if slider1 in [2023, 2024]:
+    if slider1 in FORECAST_YEARS:
         #-----Update line style to dashed for the selected years
         line_chart.update_traces(line=dict(dash='dash'))
-        #-----Update title to 'Forecasts' for these years
-        line_chart.update_layout(title = f'Monthly Ridership Forecasts for Top 5 Parent Routes of the {val1} business line in {val2}')
 
     # Create a mapping of month numbers to month names
     month_names = {
@@ -401,90 +541,70 @@ def set_parent_route_ptions(selected_business_line):
     else:
         return [], None
 
-#----- Tab #3: Subplots of forecast vs. actuals
+#----- Tab #3: Subplots of forecast vs. actuals, first page now and the rest streamed in
+def station_grid_pages(dd3):
+    return num_pages(cube.station_months(dd3)['station_name'].nunique(), STATION_GRID_PAGE_SIZE)
+
+@figure_cache.memoize
+@phase('figure')
+def station_grid_page(dd3, page):
+    stn_rides_df = cube.station_months(dd3)
+    #----- Columns come from the whole route so the streamed pages line up under the first one
+    num_columns = grid_shape(stn_rides_df['station_name'].nunique())[1]
+    page_df = station_page(stn_rides_df, page, STATION_GRID_PAGE_SIZE)
+    title = f"Ridership Trends for {dd3} Parent Route" if page == 0 else ''
+
+    if STATION_GRID_MODE == 'legacy':
+        return build_station_grid_legacy(page_df, title, num_columns=num_columns)
+    return build_station_grid(page_df, title, trace_type='scattergl' if STATION_GRID_MODE == 'scattergl' else 'scatter', num_columns=num_columns)
+
 @app.callback(
-    Output('stn_fc_charts', 'figure'), 
-    Input('dropdown3', 'value') 
+    Output('stn_fc_charts', 'figure'),
+    Output('stn_fc_grid', 'data'),
+    Output('stn_fc_stream', 'n_intervals'),
+    Output('stn_fc_stream', 'max_intervals'),
+    Input('dropdown3', 'value')
 )
 def stn_fc_chart_many(dd3):
-    filtered_df = amtrak_df[amtrak_df['parent_route'] == dd3]
-    
-    stn_rides_df = filtered_df.groupby(['station_name', 'month_date', 'key'])['rides'].sum().reset_index()
-
-    #----- Number of unique station names
-    station_names = stn_rides_df['station_name'].unique()
-    num_stations = len(station_names)
-
-    #----- Create a color map for the keys
-    unique_keys = stn_rides_df['key'].unique()
-    colors = px.colors.qualitative.Plotly  
-    color_map = {key: colors[i % len(colors)] for i, key in enumerate(unique_keys)}
-
-    #----- Set a maximum number of columns and rows for subplots
-    max_columns = 4
-    num_columns = min(max_columns, int(num_stations ** 0.5))
-    num_rows = (num_stations + num_columns - 1) // num_columns  
-
-    #----- Set a fixed height for each subplot
-    subplot_height = 200 
-    total_height = subplot_height * num_rows
-
-    #----- Create a subplot figure
-    fig = make_subplots(rows=num_rows, cols=num_columns, subplot_titles=station_names, vertical_spacing=0.1)
-
-    #----- Create traces for each station
-    for i, station in enumerate(station_names):
-        station_data = stn_rides_df[stn_rides_df['station_name'] == station]
-        
-        #----- Get row and column for the subplot
-        row = i // num_columns + 1
-        col = i % num_columns + 1
-        
-        #----- Add a trace for each key within the station
-        for key in station_data['key'].unique():
-            key_data = station_data[station_data['key'] == key]
-            line_color = color_map[key]
-
-            #------ Determine the name based on whether it's actual or forecast
-            if key == 'actual_key_identifier':  
-                trace_name = 'Actual'
-            elif key == 'forecast_key_identifier':  
-                trace_name = 'Forecast'
-            else:
-                trace_name = ""  
-            
-            #----- Add trace
-            fig.add_trace(
-                go.Scatter(
-                    x=key_data['month_date'],
-                    y=key_data['rides'],
-                    mode='lines+markers',
-                    hovertemplate='Station: ' + station + '<br>Rides: %{y}<br>Mon-Yr: %{x}<br>Key: %{customdata}<extra></extra>',
-
-                    customdata=[key] * len(key_data), 
-                    name=trace_name,
-                    line=dict(color=line_color)
-                ),
-                row=row,
-                col=col
-            )
-
-    #----- Update layout and axes
-    fig.update_layout(
-        title_text=f"Ridership Trends for {dd3} Parent Route",
-        title_x=0.5,
-        height=total_height, 
-        showlegend=False,
-        plot_bgcolor='black', 
-        paper_bgcolor='black', 
-        font_color='white' 
-    )
-    fig.update_xaxes(title_text=None)
+    #----- Page n arrives on tick n of stn_fc_stream, restarted from 0 for every pick; the nonce tells two picks of one route apart
+    pages = station_grid_pages(dd3)
+    return station_grid_page(dd3, 0), {'route': dd3, 'nonce': uuid.uuid4().hex, 'pages': pages}, 0, pages - 1
 
-    return fig
+@app.callback(
+    Output('stn_fc_more', 'children'),
+    Output('stn_fc_streamed', 'data'),
+    Input('stn_fc_stream', 'n_intervals'),
+    Input('stn_fc_grid', 'data'),
+    State('dropdown3', 'value'),
+    State('stn_fc_streamed', 'data')
+)
+def stream_station_grid(n_intervals, grid, dd3, streamed):
+    #----- stn_fc_streamed records which pick the streamed pages belong to and how many are shown
+    if not grid:
+        return [], None
+    if grid['route'] != dd3:
+        #----- A tick sent after a new pick but before its grid arrived
+        return no_update, no_update
+    last = min(n_intervals or 0, grid['pages'] - 1)
+    if not streamed or streamed['nonce'] != grid['nonce']:
+        #----- New pick: replace whatever an earlier one streamed with this one's pages up to the current tick
+        pages = [dcc.Graph(figure=station_grid_page(grid['route'], page)) for page in range(1, last + 1)]
+        return pages, {'nonce': grid['nonce'], 'shown': last}
+    if last <= streamed['shown']:
+        return no_update, no_update
+    #----- Append every page since the last one shown, so a dropped tick doesn't leave a gap
+    patch = Patch()
+    for page in range(streamed['shown'] + 1, last + 1):
+        patch.append(dcc.Graph(figure=station_grid_page(grid['route'], page)))
+    return patch, {'nonce': grid['nonce'], 'shown': last}
 
 
 #----- Tab 4: Map of Routes
+@figure_cache.memoize
+@phase('figure')
+def route_map_figure(dd4, dd5, slider2):
+    return map_figure(cube.map_geometry(dd4, dd5), slider2)
+
 @app.callback(
     Output('route_map','figure'),
     Input('dropdown4','value'),
@@ -493,86 +613,45 @@ def stn_fc_chart_many(dd3):
 
 )
 def route_map(dd4, dd5, slider2):
+    geom = cube.map_geometry(dd4, dd5)
 
-    filtered1 = amtrak_df[amtrak_df['business_line']==dd4]
-    filtered2 = filtered1[filtered1['parent_route']==dd5]
-    filtered3 = filtered2[filtered2['year']==slider2]
-
-    df_for_plot = filtered3.groupby(['business_line','parent_route','station_name','year','lat','lon'])['rides'].sum().reset_index()
-
-    fig = px.scatter_mapbox(
-        df_for_plot, 
-        lat="lat", lon="lon", 
-        hover_name="station_name", 
-        color="rides",
-        size = "rides",
-        zoom=4,
-        mapbox_style ='carto-positron',
-        #color_continuous_scale="pinkyl",
-
-        hover_data={
-            'business_line': True,
-            'parent_route' : True,
-            'station_name' : True,
-            'year': True ,
-            'rides': ':,.0f', 
-            'lat': False,  
-            'lon': False
-        },
-        labels={
-            'business_line':'Business Line',
-            'parent_route':'Parent Route',
-            'station_name':'Station Name',
-            'year':'Year',
-            'rides':'Rides'
-        }
-    )
-    fig.update_layout(
-        margin=dict(l=0, r=0, t=0, b=0),
-        legend=dict(
-            bgcolor='rgba(0, 0, 0, 0)'
-        )
-    )
-    return fig
+    #----- Only the year moved: the stations on the map are the same, just resize/recolour them
+    if triggered_id() == 'slider2' and geom is not None and year_rides(geom, slider2) is not None:
+        return map_year_patch(geom, slider2)
+    return route_map_figure(dd4, dd5, slider2)
 
 #----- Tab #4: Station table per year per business line/parent route
 @app.callback(
     Output('station_table','data'),
+    Output('station_table','page_count'),
+    Output('station_table','page_current'),
     Input('dropdown4','value'),
     Input('dropdown5','value'),
-    Input('slider2', 'value')
+    Input('slider2', 'value'),
+    Input('station_table','page_current'),
+    Input('station_table','page_size'),
+    Input('station_table','sort_by'),
+    Input('station_table','filter_query')
 )
-def update_station_table(dd4, dd5, slider2):
-
-    filtered_df = amtrak_df[
-        (amtrak_df['business_line'] == dd4) &
-        (amtrak_df['parent_route'] == dd5) &
-        (amtrak_df['year'] == slider2)
-    ]
-
-    table_final = filtered_df[['station_name','rides']]
-    table_final = table_final.groupby(['station_name'])['rides'].sum().reset_index()
-    table_final = table_final.sort_values(by = 'rides', ascending = False)
-   
-    #----- Formatting function
-    def format_rides(value):
-        if value >= 1000:
-            return '{:,.0f}K'.format(value / 1000)
-        return '{:,.0f}'.format(value)
-
-    #----- Update data with formatted 'Rides' column
-    table_final['rides'] = pd.to_numeric(table_final['rides'], errors='coerce')
-    table_final['rides'] = table_final['rides'].apply(format_rides)
-
-    return table_final.to_dict('records')
+def update_station_table(dd4, dd5, slider2, page_current=0, page_size=STATION_TABLE_PAGE_SIZE, sort_by=None, filter_query=None):
+    data, page_count, clamped = station_table_page(dd4, dd5, slider2, page_current, page_size, sort_by, filter_query)
+    return data, page_count, clamped_page(page_current, clamped)
 
 #----- Tab #4: Make table either black or red depending on the year selected
 @app.callback(
     Output('station_table', 'style_data_conditional'),
-    Input('slider2', 'value')
+    Input('slider2', 'value'),
+    State('station_table', 'style_data_conditional')
 )
-def update_table_style(selected_year):
-    if selected_year in [2023, 2024]:
+def update_table_style(selected_year, current_style=None):
+    style = table_style(selected_year)
+    #----- Most year changes stay on the same side of actuals/forecasts, nothing to send then
+    if style == current_style:
+        return no_update
+    return style
+
+def table_style(selected_year):
+    if selected_year in FORECAST_YEARS:
         return [
             {
                 'if': {'row_index': 'odd'},
@@ -588,6 +667,104 @@ def update_table_style(selected_year):
     else:
         return []
 
+#----- Opt-in: render every figure up front so no user pays for a cache miss
+def warm_figure_cache():
+    years = range(amtrak_df['year'].min(), amtrak_df['year'].max() + 1)
+    calls = []
+    for bl in bl_choices:
+        calls += [(monthly_chart_figure, (bl, year)) for year in years]
+        for pr in business_line_parent_route_dict.get(bl, []):
+            if pd.isna(pr):
+                continue
+            calls += [(station_grid_page, (pr, page)) for page in range(station_grid_pages(pr))]
+            calls += [(route_map_figure, (bl, pr, year)) for year in years]
+
+    #----- A figure that fails to build fails the same way for users, don't let it stop the warm-up
+    failed = []
+    for func, args in calls:
+        try:
+            func(*args)
+        except Exception as e:
+            failed.append((func.__name__, args, repr(e)))
+    logger.info('Warmed figure cache: %d figures, %d failed', len(calls) - len(failed), len(failed))
+    for name, args, error in failed:
+        logger.warning('Figure %s%r failed to build: %s', name, args, error)
+    return failed
+
+if os.environ.get('AMTRAK_WARM_FIGURE_CACHE') == '1':
+    warm_figure_cache()
+    startup_step('warm_figure_cache')
+
+@server.route('/cache-stats')
+def cache_stats():
+    return figure_cache.stats()
+
+#----- Hot reload: with AMTRAK_HOT_RELOAD=1 a rebuilt snapshot (python data_loader.py) is swapped into each worker before its next request
+def data_layout_props():
+    #----- The layout props that come from the data, set on the startup layout when a new version is swapped in
+    bl_options = [{'label': i, 'value': i} for i in bl_choices]
+    pr_options = [{'label': i, 'value': i} for i in pr_choices]
+    years = {'min': amtrak_df['year'].min(), 'max': amtrak_df['year'].max(), 'value': amtrak_df['year'].min()}
+    bl_table_data, bl_table_page_count, _ = business_line_table_page(bl_choices[0])
+    station_table_data, station_table_page_count, _ = station_table_page(
+        bl_choices[0],
+        business_line_parent_route_dict[bl_choices[0]][0],
+        amtrak_df['year'].min()
+    )
+    return {
+        'dropdown1': {'options': bl_options, 'value': bl_choices[0]},
+        'dropdown2': {'options': bl_options, 'value': bl_choices[0]},
+        'dropdown4': {'options': bl_options, 'value': bl_choices[0]},
+        'dropdown3': {'options': pr_options, 'value': pr_choices[0]},
+        'dropdown5': {'options': pr_options, 'value': pr_choices[0]},
+        'slider1': years,
+        'slider2': years,
+        'business_line_table': {
+            'columns': [{"name": i, "id": i} for i in business_line_table.columns],
+            'data': bl_table_data,
+            'page_count': bl_table_page_count
+        },
+        'station_table': {'data': station_table_data, 'page_count': station_table_page_count}
+    }
+
+def swap_data(new_df):
+    """Rebuild everything derived from amtrak_df, rebind it and update the layout to match.
+
+    gunicorn's sync workers serve one request at a time, so no request sees
+    part of the old version and part of the new one. If any step fails the
+    old version is put back and the error raised.
+    """
+    global amtrak_df, bl_choices, pr_choices, business_line_table, business_line_parent_route_dict, cube
+    old = amtrak_df, bl_choices, pr_choices, business_line_table, business_line_parent_route_dict, cube
+    try:
+        amtrak_df = new_df
+        bl_choices, pr_choices = dropdown_choices(new_df)
+        business_line_table = build_business_line_table(new_df)
+        business_line_parent_route_dict = build_parent_route_dict(new_df)
+        cube = AggregateCube(new_df)
+        layout_props = data_layout_props()
+    except Exception:
+        amtrak_df, bl_choices, pr_choices, business_line_table, business_line_parent_route_dict, cube = old
+        raise
+    for component_id, props in layout_props.items():
+        for prop, value in props.items():
+            setattr(app.layout[component_id], prop, value)
+    figure_cache.set_version(data_version(amtrak_df))
+
+@server.before_request
+def follow_snapshot():
+    if snapshot_watch is None or not snapshot_watch.changed():
+        return
+    seen = snapshot_watch.current()
+    try:
+        swap_data(load_snapshot(snapshot_watch.path))
+    except Exception:
+        #----- Keep serving the data this worker has; the next rebuild is tried again
+        logger.exception('Could not swap in the rebuilt snapshot at %s', snapshot_watch.path)
+        snapshot_watch.reject(seen)
+        return
+    snapshot_watch.mark(seen)
+
 # if __name__=='__main__':
 # 	app.run_server()
 
@@ -0,0 +1,211 @@
+"""Tiny stand-in for the Dash renderer, enough to replay interactions against the Flask test client.
+
+The same session also runs against a live server through HttpClient. It keeps the current value of every (component id, property) pair, fires the
+callbacks an input change triggers (and the ones their outputs trigger in
+turn), applies full values and Patch deltas to that state, and records how
+many bytes and how much server time every request took.
+"""
+import http.client
+import json
+import time
+
+
+def find_component(component, component_id):
+    if getattr(component, 'id', None) == component_id:
+        return component
+    children = getattr(component, 'children', None)
+    if not isinstance(children, (list, tuple)):
+        children = [children]
+    for child in children:
+        if hasattr(child, 'to_plotly_json'):
+            found = find_component(child, component_id)
+            if found is not None:
+                return found
+    return None
+
+
+def layout_values(layout):
+    #----- {(id, prop): value} for every property set in the served layout JSON
+    values = {}
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            if 'props' in node and 'type' in node:
+                props = node['props']
+                if 'id' in props:
+                    for prop, value in props.items():
+                        values[(props['id'], prop)] = value
+                stack.append(props.get('children'))
+    return values
+
+
+def _output_key(outputs):
+    #----- Same 'output' string the renderer sends: 'id.prop' or '..a.b...c.d..' for several outputs
+    parts = [f"{output['id']}.{output['property']}" for output in outputs]
+    if len(parts) == 1:
+        return parts[0]
+    return '..' + '...'.join(parts) + '..'
+
+
+def apply_patch(value, patch):
+    #----- Only the operations app.py emits; anything else should fail loudly rather than drift
+    for op in patch['operations']:
+        if op['operation'] not in ('Assign', 'Append'):
+            raise NotImplementedError(f"Patch operation {op['operation']} is not replayed")
+        location = op['location']
+        if op['operation'] == 'Append':
+            target = value
+            for step in location:
+                target = target[step]
+            target.append(op['params']['value'])
+            continue
+        if not location:
+            value = op['params']['value']
+            continue
+        target = value
+        for step in location[:-1]:
+            target = target[step]
+        target[location[-1]] = op['params']['value']
+    return value
+
+
+class DashSession:
+    """One browser tab: loads the layout, runs the initial callbacks, then replays `set` calls."""
+
+    def __init__(self, dash_app=None, client=None):
+        #----- In-process through the app's test client, or against a running server through `client`
+        self.client = client if client is not None else dash_app.server.test_client()
+        if dash_app is not None:
+            specs = [dict(spec, output=output) for output, spec in dash_app.callback_map.items()]
+        else:
+            specs = json.loads(self.client.get('/_dash-dependencies').data)
+        self.callbacks = []
+        for spec in specs:
+            self.callbacks.append({
+                'outputs': [(o['id'], o['property']) for o in _flat(spec['output'])],
+                'inputs': [(i['id'], i['property']) for i in spec['inputs']],
+                'state': [(s['id'], s['property']) for s in spec['state']],
+                'initial': not spec.get('prevent_initial_call')
+            })
+        self.values = {}
+        self.requests = []
+
+    def _post(self, callback, changed):
+        body = {
+            'output': _output_key([{'id': i, 'property': p} for i, p in callback['outputs']]),
+            'outputs': [{'id': i, 'property': p} for i, p in callback['outputs']],
+            'inputs': [{'id': i, 'property': p, 'value': self.values.get((i, p))} for i, p in callback['inputs']],
+            'state': [{'id': i, 'property': p, 'value': self.values.get((i, p))} for i, p in callback['state']],
+            'changedPropIds': [f'{i}.{p}' for i, p in changed]
+        }
+        if len(callback['outputs']) == 1:
+            body['outputs'] = body['outputs'][0]
+
+        start = time.perf_counter()
+        response = self.client.post('/_dash-update-component', json=body)
+        elapsed = time.perf_counter() - start
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"{body['output']} failed with {response.status_code}: {response.data[:500]!r}")
+
+        self.requests.append({'output': body['output'], 'bytes': len(response.data), 'ms': elapsed * 1e3})
+        if response.status_code == 204:
+            return []
+
+        updated = []
+        for component_id, props in json.loads(response.data)['response'].items():
+            for prop, value in props.items():
+                key = (component_id, prop)
+                if isinstance(value, dict) and '__dash_patch_update' in value:
+                    value = apply_patch(self.values.get(key), value)
+                self.values[key] = value
+                updated.append(key)
+        return updated
+
+    def _run(self, changed, initial=False):
+        #----- Fire every callback listening to a changed prop, then whatever their outputs trigger
+        #----- (a callback's own outputs don't fire it again, as in the renderer)
+        pending = [(key, None) for key in changed]
+        while pending:
+            fired = []
+            for callback in self.callbacks:
+                triggers = [key for key, source in pending if key in callback['inputs'] and source is not callback]
+                if triggers and (callback['initial'] or not initial):
+                    fired.append((callback, triggers))
+            pending = []
+            for callback, triggers in fired:
+                pending += [(key, callback) for key in self._post(callback, triggers)]
+            initial = False
+
+    def load(self):
+        start = time.perf_counter()
+        response = self.client.get('/_dash-layout')
+        elapsed = time.perf_counter() - start
+        self.requests.append({'output': '_dash-layout', 'bytes': len(response.data), 'ms': elapsed * 1e3})
+        self.values = layout_values(json.loads(response.data))
+        self._run([key for cb in self.callbacks for key in cb['inputs']], initial=True)
+
+    def set(self, component_id, prop, value):
+        self.values[(component_id, prop)] = value
+        self._run([(component_id, prop)])
+
+    def measure(self, action):
+        #----- Bytes and server time of every request one interaction causes
+        first = len(self.requests)
+        action()
+        requests = self.requests[first:]
+        return {
+            'requests': len(requests),
+            'bytes': sum(r['bytes'] for r in requests),
+            'ms': sum(r['ms'] for r in requests),
+            'outputs': [r['output'] for r in requests]
+        }
+
+
+class HttpResponse:
+    def __init__(self, status_code, data, headers):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers
+
+
+class HttpClient:
+    """The slice of Flask's test client DashSession uses, over one keep-alive HTTP connection."""
+
+    def __init__(self, host, port, timeout=60):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method, path, body=None, headers=None):
+        try:
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            #----- The server closed the idle connection; one retry on a fresh one
+            self.connection.close()
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+        return HttpResponse(response.status, response.read(), dict(response.getheaders()))
+
+    def get(self, path):
+        return self._request('GET', path)
+
+    def post(self, path, json=None):
+        return self._request('POST', path, body=_json_dumps(json), headers={'Content-Type': 'application/json'})
+
+    def close(self):
+        self.connection.close()
+
+
+def _json_dumps(value):
+    return json.dumps(value).encode()
+
+
+def _flat(output):
+    #----- callback_map stores outputs as 'id.prop' or '..a.b...c.d..'
+    if output.startswith('..'):
+        parts = output[2:-2].split('...')
+    else:
+        parts = [output]
+    return [dict(zip(('id', 'property'), part.rsplit('.', 1))) for part in parts]
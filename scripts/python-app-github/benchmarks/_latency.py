@@ -0,0 +1,42 @@
+"""Latency percentiles and baseline checks shared by bench_callbacks.py and load_test.py."""
+import json
+
+import numpy as np
+
+PERCENTILES = [50, 95, 99]
+
+
+def percentiles(samples_ms):
+    #----- {'p50': ms, 'p95': ms, 'p99': ms}; empty samples give zeros so a missing callback still shows up
+    if not len(samples_ms):
+        return {f'p{q}': 0.0 for q in PERCENTILES}
+    values = np.percentile(np.asarray(samples_ms, dtype=float), PERCENTILES)
+    return {f'p{q}': float(value) for q, value in zip(PERCENTILES, values)}
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+
+
+def latency_regressions(results, baseline, tolerance, slack_ms, metric='p95'):
+    """Names whose `metric` grew past baseline * (1 + tolerance) + slack_ms.
+
+    Timings on a shared box are noisy, so the tolerance is relative and the
+    slack absolute: a 1 ms callback taking 3 ms is not a regression, a 50 ms
+    one taking 100 ms is.
+    """
+    failures = []
+    for name, expected in baseline.items():
+        if name not in results:
+            failures.append(f'{name}: missing from this run')
+            continue
+        limit = expected[metric] * (1 + tolerance) + slack_ms
+        if results[name][metric] > limit:
+            failures.append(f'{name}: {metric} {results[name][metric]:.1f} ms, baseline {expected[metric]:.1f} ms (limit {limit:.1f})')
+    return failures
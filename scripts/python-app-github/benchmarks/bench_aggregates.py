@@ -0,0 +1,74 @@
+"""Per-query cost of the callbacks' data step: full-frame mask + groupby vs. AggregateCube.
+
+Run from scripts/python-app-github:
+
+    python benchmarks/bench_aggregates.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from aggregates import AggregateCube
+from data_loader import load_amtrak_df
+
+
+#----- The per-request pandas work the callbacks used to do
+def old_parent_route_months(amtrak_df, bl, year):
+    parent_route = amtrak_df[amtrak_df['business_line'] == bl]
+    top5 = parent_route.groupby(['parent_route'], observed=True)['rides'].sum().reset_index()
+    top5 = top5.sort_values(by='rides', ascending=False).head(5)['parent_route'].unique()
+    df = amtrak_df[amtrak_df['parent_route'].isin(top5)]
+    df = df.groupby(['parent_route', 'year', 'month'], observed=True)['rides'].sum().reset_index()
+    return df[df['year'] == year]
+
+
+def old_station_months(amtrak_df, pr):
+    df = amtrak_df[amtrak_df['parent_route'] == pr]
+    return df.groupby(['station_name', 'month_date', 'key'], observed=True)['rides'].sum().reset_index()
+
+
+def old_map_points(amtrak_df, bl, pr, year):
+    df = amtrak_df[(amtrak_df['business_line'] == bl) & (amtrak_df['parent_route'] == pr) & (amtrak_df['year'] == year)]
+    return df.groupby(['business_line', 'parent_route', 'station_name', 'year', 'lat', 'lon'], observed=True)['rides'].sum().reset_index()
+
+
+def per_call_us(fn, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def main():
+    amtrak_df = load_amtrak_df()
+
+    start = time.perf_counter()
+    cube = AggregateCube(amtrak_df)
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    years = sorted(amtrak_df['year'].unique())
+    bl_pr = amtrak_df[['business_line', 'parent_route']].dropna().drop_duplicates().itertuples(index=False)
+    bl_pr = [tuple(x) for x in bl_pr]
+
+    month_args = [(bl, y) for bl in cube.top_routes for y in years]
+    station_args = [(pr,) for _, pr in bl_pr]
+    map_args = [(bl, pr, y) for bl, pr in bl_pr for y in years]
+    geometry_args = [(bl, pr) for bl, pr in bl_pr]
+
+    rows = [
+        ('parent_route_months', per_call_us(lambda *a: old_parent_route_months(amtrak_df, *a), month_args), per_call_us(cube.parent_route_months, month_args)),
+        ('station_months', per_call_us(lambda *a: old_station_months(amtrak_df, *a), station_args), per_call_us(cube.station_months, station_args)),
+        ('map_geometry', per_call_us(lambda *a: old_map_points(amtrak_df, *a), map_args), per_call_us(cube.map_geometry, geometry_args)),
+        ('station_table', per_call_us(lambda *a: old_map_points(amtrak_df, *a), map_args), per_call_us(cube.station_table, map_args)),
+    ]
+
+    print(f'cube build: {build_ms:.1f} ms')
+    print(f"{'query':<22}{'mask+groupby us':>18}{'cube us':>12}")
+    for name, old_us, new_us in rows:
+        print(f'{name:<22}{old_us:>18.1f}{new_us:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
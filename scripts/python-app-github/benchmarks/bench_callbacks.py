@@ -0,0 +1,95 @@
+"""Latency of the dashboard callbacks over every dropdown/slider combination, in process.
+
+Calls monthly_chart_parent_routes, stn_fc_chart_many, route_map and
+update_station_table directly for every business line, parent route and
+year the app offers. Each call is timed together with the JSON encoding
+Dash does on its response. Callbacks behind the figure cache are called
+twice per combination: once with the cache cleared (what the first user to
+pick it waits for) and once straight after (everyone else). Prints
+p50/p95/p99 per callback. With --baseline the run fails if any p95 grew
+past the recorded one by more than --tolerance plus --slack-ms.
+
+Run from scripts/python-app-github:
+
+    python benchmarks/bench_callbacks.py [--repeats 2] [--out results.json] [--baseline benchmarks/baselines/callbacks.json]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+import app
+from _latency import latency_regressions, load_baseline, percentiles, save_results
+
+
+def callback_grid():
+    #----- [(callback, [args, ...], goes through the figure cache)] covering every value the dropdowns and sliders can take
+    years = list(range(int(app.amtrak_df['year'].min()), int(app.amtrak_df['year'].max()) + 1))
+    routes = [
+        (bl, pr) for bl in app.bl_choices for pr in app.business_line_parent_route_dict.get(bl, []) if not pd.isna(pr)
+    ]
+    return [
+        (app.monthly_chart_parent_routes, [(bl, year) for bl in app.bl_choices for year in years], True),
+        (app.stn_fc_chart_many, [(pr,) for _, pr in routes], True),
+        (app.route_map, [(bl, pr, year) for bl, pr in routes for year in years], True),
+        (app.update_station_table, [(bl, pr, year) for bl, pr in routes for year in years], False)
+    ]
+
+
+def time_call(func, args):
+    start = time.perf_counter()
+    payload = to_json_plotly(func(*args))
+    return (time.perf_counter() - start) * 1e3, len(payload)
+
+
+def run_grid(grid, repeats):
+    samples = {}
+    for func, calls, cached in grid:
+        names = [f'{func.__name__} cold', f'{func.__name__} cached'] if cached else [func.__name__]
+        for name in names:
+            samples[name] = {'ms': [], 'bytes': []}
+        for _ in range(repeats):
+            for args in calls:
+                app.figure_cache.clear()
+                for name in names:
+                    ms, size = time_call(func, args)
+                    samples[name]['ms'].append(ms)
+                    samples[name]['bytes'].append(size)
+    return {
+        name: {'calls': len(sample['ms']), 'kb': sum(sample['bytes']) / len(sample['bytes']) / 1024, **percentiles(sample['ms'])}
+        for name, sample in samples.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=2, help='passes over the whole grid')
+    parser.add_argument('--out', help='write this run as JSON (use it to refresh the baseline)')
+    parser.add_argument('--baseline', help='fail if any p95 regresses against this JSON')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed p95 growth, fraction of baseline')
+    parser.add_argument('--slack-ms', type=float, default=5.0, help='allowed p95 growth on top of --tolerance')
+    args = parser.parse_args()
+
+    results = run_grid(callback_grid(), args.repeats)
+    print(f"{'callback':<36}{'calls':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'KB':>8}")
+    for name, result in results.items():
+        print(f"{name:<36}{result['calls']:>7}{result['p50']:>9.1f}{result['p95']:>9.1f}{result['p99']:>9.1f}{result['kb']:>8.1f}")
+
+    if args.out:
+        save_results(args.out, results)
+
+    if args.baseline:
+        failures = latency_regressions(results, load_baseline(args.baseline), args.tolerance, args.slack_ms)
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
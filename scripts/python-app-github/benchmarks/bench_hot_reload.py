@@ -0,0 +1,120 @@
+"""Hot reload of a rebuilt snapshot across gunicorn workers.
+
+Starts gunicorn with and without preload_app, with AMTRAK_HOT_RELOAD=1 and
+AMTRAK_SNAPSHOT_DIR pointing at a copy of the shipped snapshot. It puts load
+on the workers and first publishes a broken build, a meta.json naming
+arrays that don't exist: every worker has to keep serving the data it has.
+It then rebuilds the copy in place with every ride doubled. New sessions on
+every worker have to show the doubled business line totals, served by the
+same worker processes, and the old version's figure cache directory has to
+still be there. Exits non-zero if the broken build got through, if the
+rebuild isn't seen everywhere, if a worker was replaced, if the reload
+deleted a figure cache directory or if any request failed.
+
+Run from scripts/python-app-github:
+
+    python benchmarks/bench_hot_reload.py [--workers 3] [--duration 5]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import numpy as np
+
+from _dash_client import DashSession, HttpClient
+from data_loader import SNAPSHOT_DIR, build_snapshot, load_snapshot
+from load_test import HOST, free_port, run_load, start_gunicorn, wait_ready, worker_pids
+
+CONFIGS = [
+    ('preload', {'AMTRAK_PRELOAD': '1'}),
+    ('no preload', {'AMTRAK_PRELOAD': '0'})
+]
+
+
+def business_line_totals(port):
+    #----- First row of the business line table a fresh session gets, in millions
+    client = HttpClient(HOST, port)
+    session = DashSession(client=client)
+    session.load()
+    client.close()
+    row = session.values[('business_line_table', 'data')][0]
+    return np.array([float(re.sub(r'[^0-9.]', '', value) or 'nan') for key, value in row.items() if key != 'Business Line'])
+
+
+def publish_broken_build(snapshot_dir):
+    #----- Replace meta.json the way a rebuild does, pointing at array files that were never written
+    meta_path = os.path.join(snapshot_dir, 'meta.json')
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta['files'] = {name: f'{name}.missing.npy' for name in meta['files']}
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of load before and after the rebuild')
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    snapshot = load_snapshot()
+    failures = []
+    for label, env in CONFIGS:
+        port = free_port()
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryFile() as log:
+            snapshot_dir = shutil.copytree(SNAPSHOT_DIR, os.path.join(tmp, 'amtrak_snapshot'))
+            cache_dir = os.path.join(tmp, 'figure_cache')
+            process = start_gunicorn(args.workers, port, log, env={
+                'AMTRAK_HOT_RELOAD': '1', 'AMTRAK_SNAPSHOT_DIR': snapshot_dir, 'AMTRAK_FIGURE_CACHE_DIR': cache_dir, **env
+            })
+            try:
+                wait_ready(process, port, args.startup_timeout)
+                _, errors, _ = run_load(port, args.users, args.duration)
+                failures += [f'{label}: {error}' for error in errors[:3]]
+                pids = worker_pids(process.pid)
+                before = business_line_totals(port)
+                versions = set(os.listdir(cache_dir))
+
+                publish_broken_build(snapshot_dir)
+                kept = [business_line_totals(port) for _ in range(args.workers * 4)]
+                if not all(np.allclose(after, before, atol=0.011, equal_nan=True) for after in kept):
+                    failures.append(f'{label}: some sessions lost the forecast after a broken build')
+
+                #----- Double every ride and rebuild the snapshot the running server loaded
+                build_snapshot(snapshot.assign(rides=snapshot['rides'] * 2), snapshot_dir)
+                reloaded = [business_line_totals(port) for _ in range(args.workers * 4)]
+                if not all(np.allclose(after, before * 2, atol=0.011, equal_nan=True) for after in reloaded):
+                    failures.append(f'{label}: some sessions still got the old forecast after the rebuild')
+                #----- Swapping in a version adds its figure cache directory; the old one may still be in use and stays
+                if not versions < set(os.listdir(cache_dir)):
+                    failures.append(f'{label}: the reload removed a figure cache directory ({sorted(versions)} -> {sorted(os.listdir(cache_dir))})')
+                if worker_pids(process.pid) != pids:
+                    failures.append(f'{label}: workers were replaced during the reload')
+                _, errors, _ = run_load(port, args.users, args.duration)
+                failures += [f'{label}, after the rebuild: {error}' for error in errors[:3]]
+                print(f'{label}: {len(reloaded)} sessions on {len(pids)} workers after the rebuild')
+            except RuntimeError:
+                log.seek(0)
+                print(log.read().decode(errors='replace')[-4000:])
+                raise
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
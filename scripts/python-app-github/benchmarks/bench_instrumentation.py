@@ -0,0 +1,123 @@
+"""Per-callback metrics from /metrics after replaying the interaction click path.
+
+Replays bench_interactions' click path through the Flask test client, then
+scrapes /metrics. It prints per callback the requests, mean wall time, how that
+splits into pandas, figure and serialize time, and the bytes sent. It then
+profiles one request with ?profile=1, the callback requests that follow
+it through the cookie it sets, and one request with the callback trigger,
+writing into a fresh temporary directory. Exits non-zero if a callback on the path is missing from the
+metrics, if the bytes don't add up to what the client received, or if a
+profile isn't written.
+
+Run from scripts/python-app-github:
+
+    python benchmarks/bench_instrumentation.py
+"""
+import os
+import re
+import sys
+import tempfile
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import app
+import instrumentation
+from _dash_client import DashSession
+from bench_interactions import INTERACTIONS
+
+SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+
+
+def scrape(client):
+    #----- {(metric, labels): value} for every labelled sample
+    samples = {}
+    for line in client.get('/metrics').get_data(as_text=True).splitlines():
+        match = SAMPLE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            samples[(name, tuple(sorted(re.findall(r'(\w+)="([^"]*)"', labels))))] = float(value)
+    return samples
+
+
+def per_callback(samples):
+    table = defaultdict(dict)
+    for (name, labels), value in samples.items():
+        labels = dict(labels)
+        if 'callback' not in labels or name.endswith('_bucket'):
+            continue
+        key = (labels['callback'], labels['output'])
+        column = labels['phase'] if 'phase' in labels else name
+        table[key][column] = value
+    return table
+
+
+def main():
+    session = DashSession(app.app)
+    session.load()
+    for _, component_id, prop, value in INTERACTIONS:
+        session.set(component_id, prop, value)
+
+    failures = []
+    table = per_callback(scrape(session.client))
+    print(f"{'callback':<30}{'output':<38}{'reqs':>5}{'wall ms':>9}{'pandas':>8}{'figure':>8}{'serial':>8}{'KB':>8}")
+    for (callback, output), row in sorted(table.items()):
+        count = row['amtrak_callback_requests_total']
+        per_request = lambda column: row.get(column, 0.0) / count * 1e3
+        print(
+            f"{callback:<30}{output:<38}{count:>5.0f}{per_request('amtrak_callback_duration_seconds_sum'):>9.2f}"
+            f"{per_request('pandas'):>8.2f}{per_request('figure'):>8.2f}{per_request('serialize'):>8.2f}"
+            f"{row['amtrak_callback_response_bytes_total'] / 1024:>8.1f}"
+        )
+        if row.get('callback', 0) + row.get('serialize', 0) > row['amtrak_callback_duration_seconds_sum'] + 1e-6:
+            failures.append(f'{callback}: phases add up to more than the wall time')
+
+    outputs = {output for _, output in table}
+    expected = {request['output'].strip('.').split('...')[0] for request in session.requests if request['output'] != '_dash-layout'}
+    if expected - outputs:
+        failures.append(f'no metrics for callbacks on {sorted(expected - outputs)}')
+    sent = sum(request['bytes'] for request in session.requests if request['output'] != '_dash-layout')
+    recorded = sum(row['amtrak_callback_response_bytes_total'] for row in table.values())
+    if sent != recorded:
+        failures.append(f'{recorded:.0f} bytes in the metrics, the client received {sent}')
+
+    print()
+    print('startup: ' + ', '.join(f'{step} {seconds * 1e3:.0f} ms' for step, seconds in instrumentation.METRICS.startup.items()))
+
+    #----- Profiles from earlier runs would be counted too, so this run writes its own directory
+    instrumentation.PROFILE_DIR = tempfile.mkdtemp(prefix='amtrak_profiles_')
+    hooks = next(func.__self__ for func in app.server.before_request_funcs[None] if isinstance(getattr(func, '__self__', None), instrumentation.Instrumentation))
+    hooks.profiling = True
+
+    #----- ?profile=1 on the page, then the callback requests after it through the cookie, as from a browser
+    profiled = [session.client.get('/?profile=1').headers.get('X-Amtrak-Profile')]
+    session.set('slider2', 'value', 2021)
+    cookie_profiles = os.listdir(instrumentation.PROFILE_DIR)
+    session.client.get('/?profile=0')
+    if not profiled[0] or not os.path.exists(profiled[0]):
+        failures.append('?profile=1 did not write a profile')
+    if not any(name.startswith(('route_map-', 'update_station_table-')) for name in cookie_profiles):
+        failures.append('callback requests after ?profile=1 were not profiled')
+
+    #----- Then one request through the callback trigger
+    hooks.profile_callback = 'route_map'
+    before = set(os.listdir(instrumentation.PROFILE_DIR))
+    first = len(session.requests)
+    session.set('slider2', 'value', 2019)
+    session.set('slider2', 'value', 2020)
+    profiled.append(session.client.get('/').headers.get('X-Amtrak-Profile'))
+    if profiled[1]:
+        failures.append('an unprofiled request came back with a profile')
+    written = [name for name in set(os.listdir(instrumentation.PROFILE_DIR)) - before if name.startswith('route_map-')]
+    if len(written) != 1:
+        failures.append(f'callback trigger wrote {len(written)} route_map profiles, expected exactly 1')
+    print(f'profiles in {instrumentation.PROFILE_DIR}: {len(cookie_profiles)} from ?profile=1, {len(written)} from the trigger after {len(session.requests) - first} callback requests')
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
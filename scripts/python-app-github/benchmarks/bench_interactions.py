@@ -0,0 +1,101 @@
+"""Response bytes and server time per dashboard interaction.
+
+Replays a fixed click path through the real callbacks (see _dash_client.py),
+once with the year-slider Patch updates and once forcing full figures, and
+prints both side by side. With --baseline the run fails if any interaction
+sends more bytes than the recorded baseline allows, so CI catches payload
+regressions. Timings are recorded but never gated on, they are too noisy.
+
+Run from scripts/python-app-github:
+
+    python benchmarks/bench_interactions.py [--out results.json] [--baseline benchmarks/baselines/interactions.json]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import app
+from _dash_client import DashSession
+
+#----- (name, component id, property, value); slider moves come in runs like a user dragging
+INTERACTIONS = [
+    ('tab1 business line', 'dropdown1', 'value', 'Long Distance'),
+    ('tab1 year 2017', 'slider1', 'value', 2017),
+    ('tab1 year 2018', 'slider1', 'value', 2018),
+    ('tab1 year 2023', 'slider1', 'value', 2023),
+    ('tab1 year 2024', 'slider1', 'value', 2024),
+    ('tab1 table page 2', 'business_line_table', 'page_current', 1),
+    ('tab3 business line', 'dropdown2', 'value', 'State Supported'),
+    ('tab4 business line', 'dropdown4', 'value', 'Long Distance'),
+    ('tab4 year 2017', 'slider2', 'value', 2017),
+    ('tab4 year 2018', 'slider2', 'value', 2018),
+    ('tab4 year 2023', 'slider2', 'value', 2023),
+    ('tab4 year 2024', 'slider2', 'value', 2024),
+    ('tab4 table page 2', 'station_table', 'page_current', 1)
+]
+
+
+def replay():
+    session = DashSession(app.app)
+    results = {'initial load': session.measure(session.load)}
+    for name, component_id, prop, value in INTERACTIONS:
+        results[name] = session.measure(lambda: session.set(component_id, prop, value))
+    return results
+
+
+def replay_full():
+    #----- Same click path with every callback treating its trigger as unknown, i.e. no Patch
+    triggered_id = app.triggered_id
+    app.triggered_id = lambda: None
+    try:
+        return replay()
+    finally:
+        app.triggered_id = triggered_id
+
+
+def regressions(results, baseline, tolerance):
+    failures = []
+    for name, expected in baseline.items():
+        if name not in results:
+            failures.append(f'{name}: missing from this run')
+        elif results[name]['bytes'] > expected['bytes'] * (1 + tolerance):
+            failures.append(f"{name}: {results[name]['bytes']} bytes, baseline {expected['bytes']}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', help='write this run as JSON (use it to refresh the baseline)')
+    parser.add_argument('--baseline', help='fail if bytes regress against this JSON')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='allowed byte growth, fraction of baseline')
+    args = parser.parse_args()
+
+    full = replay_full()
+    patched = replay()
+
+    print(f"{'interaction':<22}{'reqs':>6}{'full KB':>10}{'patch KB':>10}{'full ms':>10}{'patch ms':>10}")
+    for name, result in patched.items():
+        print(
+            f"{name:<22}{result['requests']:>6}{full[name]['bytes'] / 1024:>10.1f}{result['bytes'] / 1024:>10.1f}"
+            f"{full[name]['ms']:>10.1f}{result['ms']:>10.1f}"
+        )
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(patched, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = regressions(patched, baseline, args.tolerance)
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Initial layout payload with server-side paged tables vs. embedding every row.
+
+Run from scripts/python-app-github:
+
+    python benchmarks/bench_layout_payload.py
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import app
+from _dash_client import find_component
+
+
+def fetch_layout(client, repeats=5):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        response = client.get('/_dash-layout')
+        timings.append(time.perf_counter() - start)
+    return len(response.data), statistics.median(timings)
+
+
+def fetch_page(client):
+    #----- One paging round trip, as the browser sends it
+    body = {
+        'output': '..station_table.data...station_table.page_count...station_table.page_current..',
+        'outputs': [
+            {'id': 'station_table', 'property': 'data'},
+            {'id': 'station_table', 'property': 'page_count'},
+            {'id': 'station_table', 'property': 'page_current'}
+        ],
+        'inputs': [
+            {'id': 'dropdown4', 'property': 'value', 'value': 'Long Distance'},
+            {'id': 'dropdown5', 'property': 'value', 'value': 'Empire Builder'},
+            {'id': 'slider2', 'property': 'value', 'value': 2019},
+            {'id': 'station_table', 'property': 'page_current', 'value': 1},
+            {'id': 'station_table', 'property': 'page_size', 'value': app.STATION_TABLE_PAGE_SIZE},
+            {'id': 'station_table', 'property': 'sort_by', 'value': []},
+            {'id': 'station_table', 'property': 'filter_query', 'value': ''}
+        ],
+        'changedPropIds': ['station_table.page_current'],
+        'state': []
+    }
+    start = time.perf_counter()
+    response = client.post('/_dash-update-component', json=body)
+    return len(response.data), time.perf_counter() - start
+
+
+def main():
+    client = app.server.test_client()
+    client.get('/')
+
+    paged_bytes, paged_s = fetch_layout(client)
+
+    #----- Put back what the layout used to embed: every (station_name, rides) row and the full business line table
+    station_table = find_component(app.app.layout, 'station_table')
+    bl_table = find_component(app.app.layout, 'business_line_table')
+    paged_station_data, paged_bl_data = station_table.data, bl_table.data
+    station_table.data = app.amtrak_df[['station_name', 'rides']].to_dict('records')
+    bl_table.data = app.format_business_line_page(app.business_line_table).to_dict('records')
+    eager_bytes, eager_s = fetch_layout(client)
+    station_table.data, bl_table.data = paged_station_data, paged_bl_data
+
+    page_bytes, page_s = fetch_page(client)
+
+    print(f"{'payload':<34}{'KB':>10}{'server ms':>11}")
+    print(f"{'layout, all rows embedded':<34}{eager_bytes / 1024:>10.1f}{eager_s * 1e3:>11.1f}")
+    print(f"{'layout, first page only':<34}{paged_bytes / 1024:>10.1f}{paged_s * 1e3:>11.1f}")
+    print(f"{'one station_table page request':<34}{page_bytes / 1024:>10.1f}{page_s * 1e3:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Startup cost of the app's data load: CSV parse path vs. the local snapshot.
+
+Run from scripts/python-app-github:
+
+    python benchmarks/bench_startup.py            # local CSVs vs snapshot
+    python benchmarks/bench_startup.py --remote   # also time the old HTTP fetch
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import data_loader
+
+
+def time_it(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        df = fn()
+        timings.append(time.perf_counter() - start)
+    return timings, df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--remote', action='store_true', help='include the raw.githubusercontent.com fetch')
+    args = parser.parse_args()
+
+    if not data_loader.snapshot_exists():
+        data_loader.build_snapshot(data_loader.read_local_csvs())
+
+    cases = [
+        ('local csv + parse', data_loader.read_local_csvs),
+        ('snapshot (mmap)', lambda: data_loader.load_snapshot(mmap=True)),
+        ('snapshot (in memory)', lambda: data_loader.load_snapshot(mmap=False)),
+        ('snapshot, LD 2023 only', lambda: data_loader.load_snapshot(business_lines=['Long Distance'], years=[2023])),
+    ]
+    if args.remote:
+        cases.insert(0, ('remote csv + parse', data_loader.read_remote_csvs))
+
+    print(f"{'case':<24}{'median ms':>12}{'min ms':>10}{'frame MB':>10}")
+    for name, fn in cases:
+        timings, df = time_it(fn, args.repeats)
+        mem = df.memory_usage(deep=True).sum() / 1e6
+        print(f'{name:<24}{statistics.median(timings) * 1e3:>12.1f}{min(timings) * 1e3:>10.1f}{mem:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
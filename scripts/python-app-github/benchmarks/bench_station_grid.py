@@ -0,0 +1,59 @@
+"""Build time and payload size of the station forecast grid, legacy vs. vectorized.
+
+Run from scripts/python-app-github:
+
+    python benchmarks/bench_station_grid.py [--routes 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import plotly.io as pio
+
+from aggregates import AggregateCube
+from data_loader import load_amtrak_df
+from station_grid import build_station_grid, build_station_grid_legacy
+
+
+def measure(build, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fig = build()
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    payload = pio.to_json(fig, validate=False)
+    serialize_s = time.perf_counter() - start
+    return statistics.median(timings), serialize_s, len(payload), len(fig['data'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--routes', type=int, default=5, help='number of largest parent routes to time')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    amtrak_df = load_amtrak_df()
+    cube = AggregateCube(amtrak_df)
+    largest = amtrak_df.groupby('parent_route', observed=True)['station_name'].nunique().nlargest(args.routes)
+
+    modes = [
+        ('legacy', lambda df: build_station_grid_legacy(df, 'bench')),
+        ('vectorized', lambda df: build_station_grid(df, 'bench')),
+        ('scattergl', lambda df: build_station_grid(df, 'bench', trace_type='scattergl')),
+    ]
+
+    print(f"{'parent route':<22}{'stations':>9}{'mode':>12}{'traces':>8}{'build ms':>10}{'json ms':>9}{'payload KB':>12}")
+    for route, num_stations in largest.items():
+        stn_rides_df = cube.station_months(route)
+        for mode, build in modes:
+            build_s, serialize_s, size, traces = measure(lambda: build(stn_rides_df), args.repeats)
+            print(f'{route:<22}{num_stations:>9}{mode:>12}{traces:>8}{build_s * 1e3:>10.1f}{serialize_s * 1e3:>9.1f}{size / 1024:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
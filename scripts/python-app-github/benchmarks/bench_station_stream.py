@@ -0,0 +1,106 @@
+"""Time to first paint of the station grid: first streamed page vs. the whole route in one figure.
+
+For the parent routes with the most stations, builds the first page and the
+whole grid with the vectorized renderer. For each it prints build plus JSON
+time with the subplot layout cold and cached, payload size and the peak
+memory a cold build allocates (tracemalloc). It then replays picking each
+route in the app and ticks the stream interval until it stops, checking the
+first figure plus the streamed pages show every station of the route exactly
+once, in order. Each pick is followed by a stale tick, one the browser sent
+with the previous pick's grid and count but that is answered after the new
+pick, which must not add or replace pages. Exits non-zero on any mismatch.
+
+Run from scripts/python-app-github:
+
+    python benchmarks/bench_station_stream.py [--routes 5]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from plotly.io.json import to_json_plotly
+
+import app
+from _dash_client import DashSession
+from station_grid import _grid_skeleton, build_station_grid, grid_shape, station_page
+
+
+def measure(build):
+    #----- Cold (subplot layout not cached yet) and warm build + JSON time, then the peak memory of a cold build
+    timings = []
+    for cold in [True, False]:
+        if cold:
+            _grid_skeleton.cache_clear()
+        start = time.perf_counter()
+        payload = to_json_plotly(build())
+        timings.append((time.perf_counter() - start) * 1e3)
+    _grid_skeleton.cache_clear()
+    tracemalloc.start()
+    build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return timings, len(payload), peak
+
+
+def subplot_titles(figure):
+    return [annotation['text'] for annotation in figure['layout'].get('annotations', [])]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--routes', type=int, default=5, help='number of largest parent routes')
+    args = parser.parse_args()
+
+    page_size = app.STATION_GRID_PAGE_SIZE
+    largest = app.amtrak_df.groupby('parent_route', observed=True)['station_name'].nunique().nlargest(args.routes)
+
+    print(f'{page_size} stations per page')
+    print(f"{'parent route':<22}{'stations':>9}{'figure':>12}{'cold ms':>9}{'warm ms':>9}{'KB':>9}{'peak MB':>9}")
+    for route, num_stations in largest.items():
+        stn_rides_df = app.cube.station_months(route)
+        num_columns = grid_shape(num_stations)[1]
+        builds = [
+            ('first page', lambda: build_station_grid(station_page(stn_rides_df, 0, page_size), 'bench', num_columns=num_columns)),
+            ('whole route', lambda: build_station_grid(stn_rides_df, 'bench'))
+        ]
+        for label, build in builds:
+            (cold_ms, warm_ms), size, peak = measure(build)
+            print(f'{route:<22}{num_stations:>9}{label:>12}{cold_ms:>9.1f}{warm_ms:>9.1f}{size / 1024:>9.1f}{peak / 1e6:>9.1f}')
+
+    #----- Pick each route, then let the interval tick until it stops, as the browser would
+    failures = []
+    session = DashSession(app.app)
+    session.load()
+    for route in largest.index:
+        stream_keys = [('stn_fc_grid', 'data'), ('stn_fc_stream', 'n_intervals')]
+        before = {key: session.values.get(key) for key in stream_keys}
+        session.set('dropdown3', 'value', route)
+        after = {key: session.values.get(key) for key in stream_keys}
+        #----- The browser ticked on while the pick was in flight: old grid and count, new route
+        session.values.update(before)
+        session.set('stn_fc_stream', 'n_intervals', (before[('stn_fc_stream', 'n_intervals')] or 0) + 1)
+        session.values.update(after)
+        n_intervals = session.values[('stn_fc_stream', 'n_intervals')] or 0
+        while n_intervals < session.values[('stn_fc_stream', 'max_intervals')]:
+            n_intervals += 1
+            session.set('stn_fc_stream', 'n_intervals', n_intervals)
+
+        shown = subplot_titles(session.values[('stn_fc_charts', 'figure')])
+        for graph in session.values[('stn_fc_more', 'children')]:
+            shown += subplot_titles(graph['props']['figure'])
+        expected = list(app.cube.station_months(route)['station_name'].unique())
+        if shown != expected:
+            failures.append(f'{route}: streamed grid shows {len(shown)} panels, route has {len(expected)} stations')
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""HTTP load test: concurrent users replaying the click path against a local gunicorn.
+
+Starts `gunicorn -c gunicorn.conf.py app:server` on a free local port, so it
+runs with the production config (preloaded app, forked workers). It then runs
+--users threads for --duration seconds. Each thread behaves like a browser
+tab: it loads the page, fires the initial callbacks and replays
+bench_interactions' click path in a loop over plain HTTP. Prints p50/p95/p99
+latency per callback and overall, throughput, errors and each worker's
+memory (RSS, PSS, private and peak RSS from /proc, Linux only). With
+--baseline the run fails on any error, if any p95 grew past the recorded one
+by more than --tolerance plus --slack-ms, or if throughput dropped by more
+than --tolerance. A baseline is only compared against a run with the same
+workers and users.
+
+Run from scripts/python-app-github:
+
+    python benchmarks/load_test.py [--workers 2] [--users 8] [--duration 20] [--out results.json] [--baseline benchmarks/baselines/load_test.json]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, APP_DIR)
+
+from _dash_client import DashSession, HttpClient
+from _latency import latency_regressions, load_baseline, percentiles, save_results
+from bench_interactions import INTERACTIONS
+
+HOST = '127.0.0.1'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workers, port, log, env=None):
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+        '--workers', str(workers), '--bind', f'{HOST}:{port}', 'app:server'
+    ]
+    return subprocess.Popen(command, cwd=APP_DIR, stdout=log, stderr=subprocess.STDOUT, env={**os.environ, **(env or {})})
+
+
+def wait_ready(process, port, timeout):
+    #----- The preloaded app loads the snapshot before the workers fork, so give it a while
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {process.returncode} before serving')
+        try:
+            client = HttpClient(HOST, port, timeout=5)
+            ready = client.get('/_dash-layout').status_code == 200
+            client.close()
+            if ready:
+                return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f'gunicorn did not serve /_dash-layout within {timeout}s')
+
+
+def worker_pids(master_pid):
+    #----- Forked workers run the master's command line; anything else (e.g. multiprocessing's resource tracker) isn't a worker
+    children = f'/proc/{master_pid}/task/{master_pid}/children'
+    if not os.path.exists(children):
+        return []
+    with open(children) as f:
+        pids = [int(pid) for pid in f.read().split()]
+    with open(f'/proc/{master_pid}/cmdline', 'rb') as f:
+        command = f.read()
+    workers = []
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                if f.read() == command:
+                    workers.append(pid)
+        except OSError:
+            pass
+    return workers
+
+
+def worker_memory(pid):
+    #----- MB of resident, proportional (shared pages split between workers), private (this worker's alone) and peak resident memory
+    memory = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    memory[line.split(':')[0]] = int(line.split()[1]) / 1024
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Pss:', 'Private_Clean:', 'Private_Dirty:')):
+                    field = 'Private' if line.startswith('Private') else 'Pss'
+                    memory[field] = memory.get(field, 0) + int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return {
+        'rss_mb': memory.get('VmRSS'),
+        'pss_mb': memory.get('Pss'),
+        'private_mb': memory.get('Private'),
+        'peak_rss_mb': memory.get('VmHWM')
+    }
+
+
+def user(port, deadline, samples, errors, lock):
+    #----- One browser tab: page load, then the click path over and over until the deadline
+    while time.monotonic() < deadline:
+        client = HttpClient(HOST, port)
+        session = DashSession(client=client)
+        try:
+            session.load()
+            while time.monotonic() < deadline:
+                for _, component_id, prop, value in INTERACTIONS:
+                    session.set(component_id, prop, value)
+                    if time.monotonic() >= deadline:
+                        break
+        except (RuntimeError, OSError) as e:
+            with lock:
+                errors.append(repr(e))
+        finally:
+            client.close()
+            with lock:
+                for request in session.requests:
+                    samples[request['output']].append(request['ms'])
+
+
+def run_load(port, users, duration):
+    samples = defaultdict(list)
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=user, args=(port, deadline, samples, errors, lock)) for _ in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    results = {output: {'requests': len(ms), **percentiles(ms)} for output, ms in samples.items()}
+    everything = [value for ms in samples.values() for value in ms]
+    results['all requests'] = {'requests': len(everything), **percentiles(everything)}
+    return results, len(everything) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--users', type=int, default=8, help='concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of load')
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--out', help='write this run as JSON (use it to refresh the baseline)')
+    parser.add_argument('--baseline', help='fail if latency or throughput regress against this JSON')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed p95 growth and throughput drop, fraction of baseline')
+    parser.add_argument('--slack-ms', type=float, default=10.0, help='allowed p95 growth on top of --tolerance')
+    args = parser.parse_args()
+
+    port = free_port()
+    with tempfile.TemporaryFile() as log:
+        process = start_gunicorn(args.workers, port, log)
+        try:
+            wait_ready(process, port, args.startup_timeout)
+            samples, errors, elapsed = run_load(port, args.users, args.duration)
+            workers = {pid: worker_memory(pid) for pid in worker_pids(process.pid)}
+        except RuntimeError:
+            log.seek(0)
+            print(log.read().decode(errors='replace')[-4000:])
+            raise
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    results, throughput = summarize(samples, elapsed)
+    print(f'{args.users} users, {args.workers} workers, {elapsed:.1f}s')
+    print(f"{'output':<62}{'reqs':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for output, result in sorted(results.items(), key=lambda item: item[0] == 'all requests'):
+        print(f"{output:<62}{result['requests']:>7}{result['p50']:>9.1f}{result['p95']:>9.1f}{result['p99']:>9.1f}")
+    print()
+    print(f'throughput: {throughput:.1f} requests/s, {len(errors)} errors')
+    for error in errors[:5]:
+        print(f'  {error}')
+
+    print()
+    print(f"{'worker pid':<12}{'RSS MB':>9}{'PSS MB':>9}{'private MB':>12}{'peak RSS MB':>13}")
+    for pid, memory in workers.items():
+        cells = [f'{memory[key]:.0f}' if memory[key] is not None else 'n/a' for key in ['rss_mb', 'pss_mb', 'private_mb', 'peak_rss_mb']]
+        print(f'{pid:<12}{cells[0]:>9}{cells[1]:>9}{cells[2]:>12}{cells[3]:>13}')
+
+    run = {
+        'settings': {'workers': args.workers, 'users': args.users},
+        'throughput': throughput,
+        'errors': len(errors),
+        'latency': results,
+        'workers': list(workers.values())
+    }
+    if args.out:
+        save_results(args.out, run)
+
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        if baseline['settings'] != run['settings']:
+            print(f"baseline was recorded with {baseline['settings']}, this run used {run['settings']}; not compared")
+            sys.exit(1)
+        failures = latency_regressions(results, baseline['latency'], args.tolerance, args.slack_ms)
+        if errors:
+            failures.append(f'{len(errors)} requests failed')
+        if throughput < baseline['throughput'] * (1 - args.tolerance):
+            failures.append(f"throughput {throughput:.1f} requests/s, baseline {baseline['throughput']:.1f}")
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+#----- Where things live
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DATA_DIR = os.path.join(APP_DIR, os.pardir, os.pardir, 'data')
+SNAPSHOT_DIR = os.environ.get('AMTRAK_SNAPSHOT_DIR', os.path.join(APP_DIR, 'data', 'amtrak_snapshot'))
+
+REMOTE_PREDS_URL = 'https://raw.githubusercontent.com/statzenthusiast921/amtrak_analysis/main/data/amtrak_preds_df.csv'
+REMOTE_COORDS_URL = 'https://raw.githubusercontent.com/statzenthusiast921/amtrak_analysis/main/data/amtrak_df_v2.csv'
+
+#----- Bump this whenever the snapshot layout changes
+SNAPSHOT_FORMAT = 3
+
+#----- Per-row arrays: station and key codes, months since the snapshot's first month, rides
+ROW_ARRAYS = {'station': np.int16, 'key': np.int8, 'month': np.int16, 'rides': np.float64}
+#----- Per-station arrays (station_<name>.<tag>.npy), indexed by the row's station code
+STATION_ARRAYS = {'parent_route': np.int16, 'business_line': np.int16, 'lat': np.float64, 'lon': np.float64}
+
+COLUMN_ORDER = ['key', 'month_date', 'rides', 'station_name', 'parent_route', 'business_line', 'lat', 'lon', 'year', 'month']
+
+#----- Same manual fix the route notebook (and pipeline/routes.py) applies before writing amtrak_df_v2.csv
+COORD_OVERRIDES = {
+    'TOH': (43.985912, -90.506204)
+}
+
+
+def tidy_forecast(amtrak_df, amtrak_coords):
+    #----- Same shaping app.py used to do at import time; also how a pipeline run's CSVs (--preds, --coords) become the app's frame
+    amtrak_coords = amtrak_coords[['station_name', 'lat', 'lon']].drop_duplicates(subset='station_name')
+    amtrak_df = pd.merge(amtrak_df, amtrak_coords, on='station_name', how='left')
+    amtrak_df = amtrak_df.rename(
+        columns={
+            '.key': 'key',
+            '.index': 'month_date',
+            '.value': 'rides'
+        }
+    ).drop(columns='.model_desc')
+
+    amtrak_df['month_date'] = pd.to_datetime(amtrak_df['month_date'])
+    amtrak_df['year'] = amtrak_df['month_date'].dt.year
+    amtrak_df['month'] = amtrak_df['month_date'].dt.month
+    return amtrak_df
+
+
+def read_remote_csvs():
+    #----- The original startup path: two HTTP fetches + parsing
+    amtrak_df = pd.read_csv(REMOTE_PREDS_URL)
+    amtrak_coords = pd.read_csv(REMOTE_COORDS_URL)
+    return tidy_forecast(amtrak_df, amtrak_coords)
+
+
+def read_local_csvs(data_dir=REPO_DATA_DIR):
+    #----- Same as the remote path but against the CSVs checked into data/
+    amtrak_df = pd.read_csv(os.path.join(data_dir, 'amtrak_preds_df.csv'))
+    amtrak_coords = pd.read_csv(os.path.join(data_dir, 'amtrak_df.csv'))
+    for abbrev, (lat, lon) in COORD_OVERRIDES.items():
+        amtrak_coords.loc[amtrak_coords['abbrev'] == abbrev, ['lat', 'lon']] = [lat, lon]
+    return tidy_forecast(amtrak_df, amtrak_coords)
+
+
+def month_number(month_date):
+    #----- Months since year 0, so offsets are plain integer differences
+    month_date = pd.DatetimeIndex(month_date)
+    return month_date.year.to_numpy(dtype=np.int64) * 12 + month_date.month.to_numpy(dtype=np.int64) - 1
+
+
+def encode_codes(values, categories):
+    #----- Codes into `categories`, -1 where missing
+    return pd.Categorical(values, categories=categories).codes
+
+
+def build_snapshot(amtrak_df, out_dir=SNAPSHOT_DIR):
+    """Write `amtrak_df` as dictionary-encoded .npy columns plus a meta.json.
+
+    Rows keep only a station code, a key code, the month as an offset from
+    the first month and rides. Station names, parent routes, business lines
+    and keys are lookup tables in meta.json, and each station's route, line
+    and coordinates are stored once in station_*.npy. Rows are sorted by
+    (business line, year, station, key, month), and meta.json lists the row
+    range of every (business line, year) group so load_snapshot can read
+    just the groups it is asked for. Rebuilding in place is safe while the
+    app reads: the new arrays go in files of their own and replacing
+    meta.json switches readers over.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stations = sorted(amtrak_df['station_name'].unique())
+    parent_routes = sorted(amtrak_df['parent_route'].dropna().unique())
+    business_lines = sorted(amtrak_df['business_line'].dropna().unique())
+    keys = sorted(amtrak_df['key'].unique())
+
+    #----- Route, line and coordinates are stored once per station, so every row of a station has to agree on them
+    station_columns = ['parent_route', 'business_line', 'lat', 'lon']
+    per_station = amtrak_df.groupby('station_name', observed=True)[station_columns].nunique(dropna=False)
+    conflicts = per_station[per_station.gt(1).any(axis=1)]
+    if len(conflicts):
+        raise ValueError(
+            f'{len(conflicts)} stations have more than one value in {station_columns}, e.g. {list(conflicts.index[:5])}'
+        )
+    station_rows = amtrak_df.drop_duplicates(subset='station_name').set_index('station_name').loc[stations]
+    station_arrays = {
+        'parent_route': encode_codes(station_rows['parent_route'], parent_routes),
+        'business_line': encode_codes(station_rows['business_line'], business_lines),
+        'lat': station_rows['lat'].to_numpy(),
+        'lon': station_rows['lon'].to_numpy()
+    }
+
+    station = encode_codes(amtrak_df['station_name'], stations)
+    key = encode_codes(amtrak_df['key'], keys)
+    months = month_number(amtrak_df['month_date'])
+    origin = int(months.min()) if len(months) else 0
+    row_arrays = {
+        'station': station,
+        'key': key,
+        'month': months - origin,
+        'rides': amtrak_df['rides'].to_numpy()
+    }
+
+    #----- Group rows by (business line, year); each group's row range goes in the metadata
+    line = station_arrays['business_line'][station]
+    year = months // 12
+    order = np.lexsort((row_arrays['month'], key, station, year, line))
+    line, year = line[order], year[order]
+    starts = np.flatnonzero(np.r_[True, (line[1:] != line[:-1]) | (year[1:] != year[:-1])]) if len(order) else np.empty(0, dtype=np.int64)
+    stops = np.r_[starts[1:], len(order)]
+    row_groups = [[int(line[lo]), int(year[lo]), int(lo), int(hi)] for lo, hi in zip(starts, stops)]
+
+    arrays = {}
+    for prefix, columns, dtypes in (('', row_arrays, ROW_ARRAYS), ('station_', station_arrays, STATION_ARRAYS)):
+        for col, values in columns.items():
+            values = np.asarray(values, dtype=dtypes[col])
+            arrays[f'{prefix}{col}'] = values[order] if not prefix else values
+
+    #----- Array files are named after their contents, so a rebuild never overwrites a file an older meta.json points to
+    digest = hashlib.sha1()
+    for name, values in arrays.items():
+        digest.update(name.encode())
+        digest.update(values.tobytes())
+    tag = digest.hexdigest()[:12]
+    files = {name: f'{name}.{tag}.npy' for name in arrays}
+    for name, values in arrays.items():
+        path = os.path.join(out_dir, files[name])
+        if not os.path.exists(path):
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, values)
+            os.replace(path + '.tmp', path)
+
+    meta = {
+        'format': SNAPSHOT_FORMAT,
+        'rows': len(amtrak_df),
+        'origin': f'{origin // 12:04d}-{origin % 12 + 1:02d}',
+        'stations': stations,
+        'parent_routes': parent_routes,
+        'business_lines': business_lines,
+        'keys': keys,
+        'row_groups': row_groups,
+        'files': files
+    }
+
+    #----- Swapping meta.json in is the one step that moves readers to the new arrays
+    tmp_path = os.path.join(out_dir, 'meta.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp_path, os.path.join(out_dir, 'meta.json'))
+
+    #----- Then the arrays of earlier builds go; a reader that already mapped them keeps its mapping
+    for name in os.listdir(out_dir):
+        if name.endswith('.npy') and name not in files.values():
+            os.remove(os.path.join(out_dir, name))
+    return out_dir
+
+
+def snapshot_exists(path=SNAPSHOT_DIR):
+    return os.path.exists(os.path.join(path, 'meta.json'))
+
+
+def load_snapshot_arrays(path=SNAPSHOT_DIR, mmap=True):
+    #----- Raw arrays (row arrays by name, station arrays as station_<name>) + metadata
+    mmap_mode = 'r' if mmap else None
+    names = list(ROW_ARRAYS) + [f'station_{col}' for col in STATION_ARRAYS]
+    for attempt in range(3):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Snapshot at {path} has format {meta.get('format')}, expected {SNAPSHOT_FORMAT}")
+        try:
+            arrays = {name: np.load(os.path.join(path, meta['files'][name]), mmap_mode=mmap_mode) for name in names}
+            return arrays, meta
+        except FileNotFoundError:
+            #----- A rebuild swapped meta.json and removed these arrays after we read it; read the new one
+            if attempt == 2:
+                raise
+
+
+def row_slices(meta, business_lines=None, years=None):
+    """Row ranges of the (business line, year) groups that pass the filters, adjacent ones merged."""
+    line_codes = None if business_lines is None else {meta['business_lines'].index(bl) for bl in business_lines if bl in meta['business_lines']}
+    years = None if years is None else set(years)
+    slices = []
+    for line, year, lo, hi in meta['row_groups']:
+        if (line_codes is None or line in line_codes) and (years is None or year in years):
+            if slices and slices[-1][1] == lo:
+                slices[-1][1] = hi
+            else:
+                slices.append([lo, hi])
+    return [slice(lo, hi) for lo, hi in slices]
+
+
+def load_snapshot(path=SNAPSHOT_DIR, mmap=True, business_lines=None, years=None):
+    """Rebuild the app's `amtrak_df` from a snapshot written by `build_snapshot`.
+
+    With `business_lines` and/or `years` only the matching row groups are
+    read (from the memory map, so the other pages are never touched).
+    """
+    arrays, meta = load_snapshot_arrays(path, mmap=mmap)
+    slices = row_slices(meta, business_lines, years)
+
+    def rows(name):
+        if len(slices) == 1:
+            return arrays[name][slices[0]]
+        return np.concatenate([arrays[name][part] for part in slices] or [arrays[name][:0]])
+
+    station = rows('station')
+    origin = pd.Period(meta['origin'], freq='M')
+    months = origin.year * 12 + origin.month - 1 + rows('month').astype(np.int64)
+    columns = {
+        'key': pd.Categorical.from_codes(rows('key'), categories=meta['keys']),
+        'month_date': (months - 1970 * 12).astype('datetime64[M]').astype('datetime64[ns]'),
+        'rides': rows('rides'),
+        'station_name': pd.Categorical.from_codes(station, categories=meta['stations']),
+        'parent_route': pd.Categorical.from_codes(arrays['station_parent_route'][station], categories=meta['parent_routes']),
+        'business_line': pd.Categorical.from_codes(arrays['station_business_line'][station], categories=meta['business_lines']),
+        'lat': arrays['station_lat'][station],
+        'lon': arrays['station_lon'][station],
+        'year': (months // 12).astype(np.int16),
+        'month': (months % 12 + 1).astype(np.int8)
+    }
+    return pd.DataFrame(columns, columns=COLUMN_ORDER)
+
+
+def data_version(amtrak_df):
+    #----- Short content hash, changes whenever any value in the frame changes
+    row_hashes = pd.util.hash_pandas_object(amtrak_df, index=False).to_numpy()
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()[:12]
+
+
+class SnapshotWatch:
+    """Notices when the snapshot at `path` is rebuilt, for the app's hot reload.
+
+    A rebuild replaces meta.json last, so changed() is one stat per call and
+    only reads meta.json when the file was replaced. A build is told apart
+    by the array files it names, which carry a hash of their contents, so
+    rebuilding the same data is not a change. The build that was current
+    when the watch was made counts as seen. current() is the build to load,
+    and only mark() moves the watch on to it. A build that fails to
+    load or swap in is passed to reject(): it is not offered again, but the
+    next rebuild is, even if it names the same files.
+    """
+
+    def __init__(self, path=SNAPSHOT_DIR):
+        self.path = path
+        self.stamp, self.build = self._stat(), self._build()
+        self.rejected = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(os.path.join(self.path, 'meta.json'))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _build(self):
+        try:
+            with open(os.path.join(self.path, 'meta.json')) as f:
+                return json.load(f).get('files')
+        except (OSError, ValueError):
+            return None
+
+    def changed(self):
+        stamp = self._stat()
+        if stamp == self.stamp or stamp == self.rejected:
+            return False
+        if self._build() == self.build:
+            self.stamp = stamp
+            return False
+        return True
+
+    def current(self):
+        #----- Taken before loading the snapshot: a rebuild racing the load is noticed again, at worst loaded twice
+        return self._stat(), self._build()
+
+    def mark(self, seen):
+        self.stamp, self.build = seen
+
+    def reject(self, seen):
+        self.rejected = seen[0]
+
+
+def load_amtrak_df():
+    """Startup entry point for app.py.
+
+    Prefers the local snapshot and only falls back to the old HTTP fetch when
+    no snapshot has been built.
+    """
+    if snapshot_exists():
+        return load_snapshot()
+    return read_remote_csvs()
+
+
+if __name__ == '__main__':
+    #----- python data_loader.py [out_dir]  -> rebuild the snapshot from data/*.csv
+    #----- python data_loader.py --preds amtrak_preds_df.csv --coords amtrak_df_v2.csv out_dir  -> from a pipeline run (pipeline/snapshot.py)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('out_dir', nargs='?', default=SNAPSHOT_DIR)
+    parser.add_argument('--preds', help='forecast rows in the amtrak_preds_df.csv layout, instead of data/')
+    parser.add_argument('--coords', help='any frame with station_name, lat and lon, e.g. amtrak_df_v2.csv; goes with --preds')
+    args = parser.parse_args()
+    if bool(args.preds) != bool(args.coords):
+        parser.error('--preds and --coords go together')
+
+    amtrak_df = tidy_forecast(pd.read_csv(args.preds), pd.read_csv(args.coords)) if args.preds else read_local_csvs()
+    build_snapshot(amtrak_df, args.out_dir)
+    print(f'Wrote {len(amtrak_df)} rows to {args.out_dir}')
@@ -0,0 +1,212 @@
+import functools
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import plotly.io as pio
+
+
+def plain(value):
+    #----- numpy scalars as Python ones, so a key reads the same whatever the inputs came from (numpy 2 reprs np.int64(2016))
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (tuple, list)):
+        return tuple(plain(v) for v in value)
+    return value
+
+
+class FigureCache:
+    """Two-tier cache for callback figures.
+
+    The in-process tier is a bounded LRU of figure dicts. The optional disk
+    tier stores the serialized figure JSON under `disk_dir`, so every
+    gunicorn worker pointed at the same directory reuses the others' work.
+    Keys include `version` and `settings` (anything else that changes a
+    figure, e.g. the station grid renderer), so a new data snapshot or a
+    differently configured server never serves the wrong figures. The disk
+    tier keeps one directory per version and removes its least recently used
+    files past `disk_maxbytes`. Other workers may still be on an older
+    version, so setting a version deletes nothing; prune() drops all but the
+    `keep_versions` most recently used older directories, and runs once
+    when the cache is made.
+    """
+
+    def __init__(self, maxsize=256, disk_dir=None, version='', settings=(), disk_maxbytes=256 * 2 ** 20, keep_versions=2):
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self.disk_maxbytes = disk_maxbytes
+        self.keep_versions = keep_versions
+        self.settings = tuple(settings)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.set_version(version)
+        self.prune()
+
+    def set_version(self, version):
+        #----- New data: nothing cached so far applies, in memory or on disk
+        self.version = version
+        self.clear()
+        if self.disk_dir:
+            current = self._version_dir()
+            os.makedirs(current, exist_ok=True)
+            #----- Touched so prune() counts it as in use until it gets figures of its own
+            os.utime(current)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    def prune(self):
+        #----- A directory's mtime moves whenever a figure is written to it, so the oldest are the versions no worker is filling
+        if not self.disk_dir:
+            return
+        current = self._version_dir()
+        older = []
+        for entry in os.scandir(self.disk_dir):
+            try:
+                if entry.path == current:
+                    continue
+                if entry.is_dir():
+                    older.append((entry.stat().st_mtime, entry.path))
+                elif entry.name.endswith(('.json', '.tmp')):
+                    #----- Figures from before the cache kept a directory per version
+                    os.remove(entry.path)
+            except OSError:
+                #----- Another worker pruned it first
+                continue
+        for _, path in sorted(older, reverse=True)[self.keep_versions:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _version_dir(self):
+        return os.path.join(self.disk_dir, self.version or 'unversioned')
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self._version_dir(), f'{digest}.json')
+
+    def _disk_files(self):
+        #----- (mtime, size, path) of every figure file for the current version
+        files = []
+        try:
+            entries = list(os.scandir(self._version_dir()))
+        except OSError:
+            return files
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if entry.name.endswith('.json'):
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _trim_disk(self):
+        #----- Oldest first (reads touch their file) down to 3/4 of the limit, so this doesn't run on every write
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.disk_maxbytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.disk_evictions += 1
+        self._disk_bytes = total
+
+    def _remember(self, key, figure):
+        with self._lock:
+            self._entries[key] = figure
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path) as f:
+                    figure = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                pass
+            else:
+                self.disk_hits += 1
+                self._remember(key, figure)
+                return figure
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, figure):
+        #----- Store the JSON-ready dict, Dash sends it as is without re-validating a go.Figure
+        figure_json = pio.to_json(figure, validate=False)
+        figure = json.loads(figure_json)
+        self._remember(key, figure)
+
+        if self.disk_dir:
+            #----- Write then rename so another worker never reads a half-written file
+            path = self._disk_path(key)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, 'w') as f:
+                    f.write(figure_json)
+                os.replace(tmp_path, path)
+            except OSError:
+                #----- The disk tier is only a cache; a full disk or a pruned directory costs a rebuild, not the request
+                return figure
+            with self._lock:
+                self._disk_bytes += len(figure_json)
+                trim = self._disk_bytes > self.disk_maxbytes
+            if trim:
+                self._trim_disk()
+        return figure
+
+    def memoize(self, func):
+        #----- Cache a figure callback on (callback name, data version, settings, inputs)
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = (func.__name__, self.version, self.settings) + plain(args)
+            figure = self.get(key)
+            if figure is None:
+                figure = self.set(key, func(*args))
+            return figure
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'version': self.version,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'disk_dir': self.disk_dir,
+                'disk_bytes': self._disk_bytes if self.disk_dir else 0,
+                'disk_evictions': self.disk_evictions
+            }
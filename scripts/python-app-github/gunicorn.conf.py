@@ -0,0 +1,8 @@
+import os
+
+#----- Load app.py (and the data snapshot) once in the master, then fork.
+#----- Workers share the loaded arrays copy-on-write instead of each parsing the data. AMTRAK_PRELOAD=0 has every worker import app.py itself
+preload_app = os.environ.get('AMTRAK_PRELOAD', '1') == '1'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
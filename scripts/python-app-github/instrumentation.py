@@ -0,0 +1,264 @@
+import bisect
+import cProfile
+import functools
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from dash.dependencies import Output
+from flask import Response, g, request
+
+#----- Phases a callback's time is split into; 'callback' is the whole callback function
+PHASES = ['callback', 'pandas', 'figure', 'serialize']
+
+#----- Wall-time histogram buckets in seconds, Prometheus style (cumulative, +Inf added on output)
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+#----- Opt-in profiling: AMTRAK_PROFILING=1 enables ?profile=1, AMTRAK_PROFILE_CALLBACK=<name> profiles that callback's next request
+#----- The Dash renderer's callback POSTs never carry the page's query string, so ?profile=1 also sets a cookie they do carry (?profile=0 clears it)
+PROFILING = os.environ.get('AMTRAK_PROFILING') == '1'
+PROFILE_COOKIE = 'amtrak_profile'
+PROFILE_CALLBACK = os.environ.get('AMTRAK_PROFILE_CALLBACK')
+PROFILE_DIR = os.environ.get('AMTRAK_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'amtrak_profiles'))
+
+DASH_UPDATE_PATH = '/_dash-update-component'
+
+#----- Per-request state: the callback being served and its phase times
+_local = threading.local()
+
+
+class Metrics:
+    """Per-callback request counts, wall-time histogram, phase seconds and response bytes.
+
+    Everything is in-process, so each gunicorn worker reports its own
+    requests. render() gives the Prometheus text format.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.wall = defaultdict(float)
+        self.histogram = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self.phases = defaultdict(float)
+        self.bytes = defaultdict(int)
+        self.startup = {}
+        self.gauges = []
+
+    def observe(self, labels, wall, phases, response_bytes):
+        with self._lock:
+            self.requests[labels] += 1
+            self.wall[labels] += wall
+            self.histogram[labels][bisect.bisect_left(self.buckets, wall)] += 1
+            for phase, seconds in phases.items():
+                self.phases[labels + (phase,)] += seconds
+            self.bytes[labels] += response_bytes
+
+    def add_gauges(self, func):
+        #----- `func` returns {name: value}, read at every scrape (e.g. figure cache stats)
+        self.gauges.append(func)
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {kind}'])
+
+        def label_text(labels):
+            return ','.join(f'{key}="{value}"' for key, value in labels)
+
+        with self._lock:
+            family('amtrak_callback_requests_total', 'counter', 'Dash callback requests served.')
+            for labels, count in sorted(self.requests.items()):
+                lines.append(f'amtrak_callback_requests_total{{{label_text(zip(("callback", "output"), labels))}}} {count}')
+
+            family('amtrak_callback_duration_seconds', 'histogram', 'Wall time of a Dash callback request, from Flask receiving it to the response.')
+            for labels, counts in sorted(self.histogram.items()):
+                base = label_text(zip(('callback', 'output'), labels))
+                cumulative = 0
+                for bound, count in zip(self.buckets + ['+Inf'], counts):
+                    cumulative += count
+                    lines.append(f'amtrak_callback_duration_seconds_bucket{{{base},le="{bound}"}} {cumulative}')
+                lines.append(f'amtrak_callback_duration_seconds_sum{{{base}}} {self.wall[labels]:.6f}')
+                lines.append(f'amtrak_callback_duration_seconds_count{{{base}}} {self.requests[labels]}')
+
+            family('amtrak_callback_phase_seconds_total', 'counter', 'Seconds spent per phase: callback, pandas, figure, serialize.')
+            for labels, seconds in sorted(self.phases.items()):
+                lines.append(f'amtrak_callback_phase_seconds_total{{{label_text(zip(("callback", "output", "phase"), labels))}}} {seconds:.6f}')
+
+            family('amtrak_callback_response_bytes_total', 'counter', 'Response body bytes sent by Dash callbacks.')
+            for labels, response_bytes in sorted(self.bytes.items()):
+                lines.append(f'amtrak_callback_response_bytes_total{{{label_text(zip(("callback", "output"), labels))}}} {response_bytes}')
+
+            family('amtrak_startup_seconds', 'gauge', 'Seconds each module-level setup step of app.py took.')
+            for step, seconds in self.startup.items():
+                lines.append(f'amtrak_startup_seconds{{step="{step}"}} {seconds:.6f}')
+
+            gauges = list(self.gauges)
+        for func in gauges:
+            for name, value in func().items():
+                family(name, 'gauge', name.replace('_', ' ') + '.')
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+_startup_mark = time.perf_counter()
+
+
+def startup_step(step):
+    #----- Record the time since the previous step (or since this module was imported) under `step`
+    global _startup_mark
+    now = time.perf_counter()
+    METRICS.startup[step] = now - _startup_mark
+    _startup_mark = now
+
+
+def phase(name):
+    """Decorator adding the function's time to phase `name` of the callback being served, if any."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = getattr(_local, 'record', None)
+            if record is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record['phases'][name] += time.perf_counter() - start
+        return wrapper
+    return decorator
+
+
+def timed_callback(func, output):
+    #----- Names the request after the callback and times the callback function itself
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        record = getattr(_local, 'record', None)
+        if record is None:
+            return func(*args, **kwargs)
+        record['labels'] = (func.__name__, output)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record['callback_end'] = time.perf_counter()
+            record['phases']['callback'] += record['callback_end'] - start
+    return wrapper
+
+
+def first_output(args):
+    for arg in args:
+        if isinstance(arg, list):
+            arg = next(iter(arg), None)
+        if isinstance(arg, Output):
+            return f'{arg.component_id}.{arg.component_property}'
+    return ''
+
+
+def start_profiler():
+    #----- pyinstrument when it's installed (sampling, HTML report), cProfile otherwise
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    profiler = Profiler(interval=0.001)
+    profiler.start()
+    return profiler
+
+
+def save_profile(profiler, name):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r'\W+', '_', name).strip('_') or 'index'
+    stem = os.path.join(PROFILE_DIR, f'{name}-{os.getpid()}-{time.time_ns()}')
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats(f'{stem}.pstats')
+        return f'{stem}.pstats'
+    profiler.stop()
+    with open(f'{stem}.html', 'w') as f:
+        f.write(profiler.output_html())
+    return f'{stem}.html'
+
+
+class Instrumentation:
+    """Hooks the Flask server behind a Dash app and wraps every callback registered after install.
+
+    Each Dash update request is timed from Flask receiving it to the
+    response. The callback function's own time is split into the pandas and
+    figure phases that app.py marks with @phase. Everything from the callback
+    returning to the response being built (Dash's JSON encoding) counts as
+    serialize. /metrics serves the Prometheus text format.
+    """
+
+    def __init__(self, dash_app, metrics=METRICS, profiling=PROFILING, profile_callback=PROFILE_CALLBACK):
+        self.metrics = metrics
+        self.profiling = profiling
+        self.profile_callback = profile_callback
+        self._profiled_callback = False
+        self._lock = threading.Lock()
+
+        register = dash_app.callback
+
+        def callback(*args, **kwargs):
+            decorator = register(*args, **kwargs)
+            output = first_output(list(args) + [kwargs.get('output')])
+
+            def wrap(func):
+                return decorator(timed_callback(func, output))
+            return wrap
+
+        dash_app.callback = callback
+        server = dash_app.server
+        server.before_request(self.before_request)
+        server.after_request(self.after_request)
+        server.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def wants_profile(self):
+        if self.profiling and (request.args.get('profile') == '1' or request.cookies.get(PROFILE_COOKIE) == '1'):
+            return True
+        if self.profile_callback and not self._profiled_callback and request.path == DASH_UPDATE_PATH:
+            #----- The callback isn't known until Dash dispatches; profile the request if the output matches
+            body = request.get_json(silent=True) or {}
+            with self._lock:
+                if self.profile_callback in body.get('output', '') and not self._profiled_callback:
+                    self._profiled_callback = True
+                    return True
+        return False
+
+    def before_request(self):
+        if request.path == DASH_UPDATE_PATH:
+            _local.record = {'start': time.perf_counter(), 'labels': None, 'callback_end': None, 'phases': defaultdict(float)}
+        g.profiler = start_profiler() if self.wants_profile() else None
+
+    def after_request(self, response):
+        record = getattr(_local, 'record', None)
+        _local.record = None
+        if record is not None and record['labels'] is not None:
+            end = time.perf_counter()
+            phases = dict(record['phases'])
+            phases['serialize'] = end - record['callback_end']
+            self.metrics.observe(record['labels'], end - record['start'], phases, response.calculate_content_length() or 0)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            name = record['labels'][0] if record and record['labels'] else request.endpoint or 'request'
+            response.headers['X-Amtrak-Profile'] = save_profile(profiler, name)
+        if self.profiling and request.args.get('profile') == '1':
+            response.set_cookie(PROFILE_COOKIE, '1', httponly=True, samesite='Lax')
+        elif request.args.get('profile') == '0':
+            response.delete_cookie(PROFILE_COOKIE)
+        return response
+
+    def metrics_view(self):
+        return Response(self.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def install(dash_app):
+    return Instrumentation(dash_app)
@@ -0,0 +1,115 @@
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from dash import Patch
+
+#----- Same marker scaling px.scatter_mapbox uses (size_max=20, area sizing)
+SIZE_MAX = 20
+
+
+def build_route_geometry(station_years):
+    """Per (business_line, parent_route): station coordinates once, rides as a station x year matrix.
+
+    `station_years` is the cube's (business_line, parent_route, station_name,
+    year, lat, lon, rides) frame. Moving the year slider then only needs one
+    column of the matrix.
+    """
+    geometry = {}
+    for (bl, pr), group in station_years.groupby(['business_line', 'parent_route'], observed=True, sort=False):
+        rides = group.pivot(index='station_name', columns='year', values='rides')
+        coords = group.drop_duplicates(subset='station_name').set_index('station_name').loc[rides.index]
+        geometry[(bl, pr)] = {
+            'business_line': bl,
+            'parent_route': pr,
+            'station_name': np.asarray(rides.index, dtype=object),
+            'lat': coords['lat'].to_numpy(),
+            'lon': coords['lon'].to_numpy(),
+            'years': {year: i for i, year in enumerate(rides.columns)},
+            'rides': rides.to_numpy()
+        }
+    return geometry
+
+
+def year_rides(geom, year):
+    #----- Rides for every station on the route in one year (None if the year isn't in the data)
+    year_idx = geom['years'].get(year)
+    if year_idx is None:
+        return None
+    return geom['rides'][:, year_idx]
+
+
+def _hovertemplate(year):
+    return (
+        '<b>%{hovertext}</b><br><br>Rides=%{marker.color:,.0f}'
+        '<br>Business Line=%{customdata[0]}<br>Parent Route=%{customdata[1]}'
+        f'<br>Station Name=%{{customdata[2]}}<br>Year={year}<extra></extra>'
+    )
+
+
+def _sizeref(rides):
+    return np.nanmax(rides) / SIZE_MAX ** 2 if len(rides) else 1
+
+
+def map_figure(geom, year):
+    """Full route map, laid out like the px.scatter_mapbox version it replaces."""
+    rides = year_rides(geom, year) if geom is not None else None
+    if rides is None:
+        return go.Figure(go.Scattermapbox(), layout=dict(
+            mapbox=dict(style='carto-positron', zoom=4),
+            margin=dict(l=0, r=0, t=0, b=0)
+        ))
+
+    num_stations = len(geom['station_name'])
+    customdata = np.column_stack([
+        np.full(num_stations, geom['business_line'], dtype=object),
+        np.full(num_stations, geom['parent_route'], dtype=object),
+        geom['station_name']
+    ])
+    colors = px.colors.sequential.Plasma
+
+    fig = go.Figure(
+        go.Scattermapbox(
+            lat=geom['lat'],
+            lon=geom['lon'],
+            mode='markers',
+            hovertext=geom['station_name'],
+            customdata=customdata,
+            hovertemplate=_hovertemplate(year),
+            marker=dict(
+                color=rides,
+                size=rides,
+                sizemode='area',
+                sizeref=_sizeref(rides),
+                coloraxis='coloraxis'
+            ),
+            name='',
+            showlegend=False
+        )
+    )
+    fig.update_layout(
+        mapbox=dict(
+            style='carto-positron',
+            zoom=4,
+            center=dict(lat=geom['lat'].mean(), lon=geom['lon'].mean())
+        ),
+        coloraxis=dict(
+            colorbar=dict(title=dict(text='Rides')),
+            colorscale=[[i / (len(colors) - 1), c] for i, c in enumerate(colors)]
+        ),
+        margin=dict(l=0, r=0, t=0, b=0),
+        legend=dict(
+            bgcolor='rgba(0, 0, 0, 0)'
+        )
+    )
+    return fig
+
+
+def map_year_patch(geom, year):
+    """Partial update for a year change: marker colour/size and the hover year, nothing else."""
+    rides = year_rides(geom, year)
+    patch = Patch()
+    patch['data'][0]['marker']['color'] = rides
+    patch['data'][0]['marker']['size'] = rides
+    patch['data'][0]['marker']['sizeref'] = _sizeref(rides)
+    patch['data'][0]['hovertemplate'] = _hovertemplate(year)
+    return patch
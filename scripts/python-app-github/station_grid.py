@@ -0,0 +1,175 @@
+import functools
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+#----- Grid settings shared by both rendering modes
+MAX_COLUMNS = 4
+SUBPLOT_HEIGHT = 200
+VERTICAL_SPACING = 0.1
+
+
+def grid_shape(num_stations, max_columns=MAX_COLUMNS, num_columns=None):
+    if num_columns is None:
+        num_columns = max(1, min(max_columns, int(num_stations ** 0.5)))
+    num_rows = (num_stations + num_columns - 1) // num_columns
+    return num_rows, num_columns
+
+
+def num_pages(num_stations, page_size):
+    #----- page_size 0 means the whole route on one page
+    if page_size <= 0:
+        return 1
+    return max(1, (num_stations + page_size - 1) // page_size)
+
+
+def station_page(stn_rides_df, page, page_size):
+    """Rows of the stations on page `page` (0-based), stations counted in the order the grid draws them."""
+    if page_size <= 0:
+        return stn_rides_df
+    station_codes, _ = pd.factorize(stn_rides_df['station_name'])
+    return stn_rides_df[station_codes // page_size == page]
+
+
+def _vertical_spacing(num_rows):
+    #----- make_subplots rejects spacing above 1 / (rows - 1), which big routes like Empire Builder hit
+    if num_rows <= 1:
+        return VERTICAL_SPACING
+    return min(VERTICAL_SPACING, 0.9 / (num_rows - 1))
+
+
+def _grid_figure(title, station_names, num_rows, num_columns):
+    fig = make_subplots(
+        rows=num_rows,
+        cols=num_columns,
+        subplot_titles=station_names,
+        vertical_spacing=_vertical_spacing(num_rows)
+    )
+    fig.update_layout(
+        title_text=title,
+        title_x=0.5,
+        height=SUBPLOT_HEIGHT * num_rows,
+        showlegend=False,
+        plot_bgcolor='black',
+        paper_bgcolor='black',
+        font_color='white'
+    )
+    fig.update_xaxes(title_text=None)
+    return fig
+
+
+@functools.lru_cache(maxsize=64)
+def _grid_skeleton(num_rows, num_columns, num_stations):
+    #----- make_subplots dominates the build, so lay out each grid shape once with placeholder titles
+    return _grid_figure('', [str(i) for i in range(num_stations)], num_rows, num_columns).layout.to_plotly_json()
+
+
+def _grid_layout(title, station_names, num_rows, num_columns):
+    skeleton = _grid_skeleton(num_rows, num_columns, len(station_names))
+    layout = dict(skeleton)
+    layout['title'] = dict(skeleton['title'], text=title)
+    layout['annotations'] = [
+        dict(annotation, text=name)
+        for annotation, name in zip(skeleton['annotations'], station_names)
+    ]
+    return layout
+
+
+def _color_map(keys):
+    colors = px.colors.qualitative.Plotly
+    return {key: colors[i % len(colors)] for i, key in enumerate(keys)}
+
+
+def _trace_name(key):
+    if key == 'actual_key_identifier':
+        return 'Actual'
+    elif key == 'forecast_key_identifier':
+        return 'Forecast'
+    return ''
+
+
+def build_station_grid_legacy(stn_rides_df, title, num_columns=None):
+    """Original renderer: one boolean mask and one add_trace call per (station, key)."""
+    station_names = stn_rides_df['station_name'].unique()
+    num_rows, num_columns = grid_shape(len(station_names), num_columns=num_columns)
+    color_map = _color_map(stn_rides_df['key'].unique())
+
+    fig = _grid_figure(title, list(station_names), num_rows, num_columns)
+
+    for i, station in enumerate(station_names):
+        station_data = stn_rides_df[stn_rides_df['station_name'] == station]
+        row = i // num_columns + 1
+        col = i % num_columns + 1
+
+        for key in station_data['key'].unique():
+            key_data = station_data[station_data['key'] == key]
+            fig.add_trace(
+                go.Scatter(
+                    x=key_data['month_date'],
+                    y=key_data['rides'],
+                    mode='lines+markers',
+                    hovertemplate='Station: ' + station + '<br>Rides: %{y}<br>Mon-Yr: %{x}<br>Key: %{customdata}<extra></extra>',
+                    customdata=[key] * len(key_data),
+                    name=_trace_name(key),
+                    line=dict(color=color_map[key])
+                ),
+                row=row,
+                col=col
+            )
+
+    return fig
+
+
+def build_station_grid(stn_rides_df, title, trace_type='scatter', num_columns=None):
+    """Vectorized renderer returning a JSON-ready figure dict.
+
+    Rows are ordered once by (station, key, date); each (station, key) run
+    becomes one trace built from NumPy slices. The key is baked into the
+    hovertemplate instead of a per-point customdata list, and `trace_type`
+    can be 'scattergl' to draw with WebGL. `num_columns` overrides the
+    column count, so every page of a paged route lines up.
+    """
+    station_codes, station_names = pd.factorize(stn_rides_df['station_name'])
+    key_codes, keys = pd.factorize(stn_rides_df['key'])
+    station_names = [str(name) for name in station_names]
+    keys = [str(key) for key in keys]
+    if not station_names:
+        return {'data': [], 'layout': go.Layout(title_text=title, title_x=0.5, template='plotly_dark').to_plotly_json()}
+
+    num_rows, num_columns = grid_shape(len(station_names), num_columns=num_columns)
+    color_map = _color_map(keys)
+
+    dates = stn_rides_df['month_date'].to_numpy(dtype='datetime64[D]')
+    order = np.lexsort((dates, key_codes, station_codes))
+    station_codes = station_codes[order]
+    key_codes = key_codes[order]
+    dates = np.datetime_as_string(dates[order], unit='D')
+    rides = stn_rides_df['rides'].to_numpy()[order]
+
+    #----- Start of every (station, key) run in the sorted arrays
+    run_starts = np.flatnonzero(
+        np.r_[True, (station_codes[1:] != station_codes[:-1]) | (key_codes[1:] != key_codes[:-1])]
+    )
+    run_ends = np.r_[run_starts[1:], len(order)]
+
+    traces = []
+    for start, end in zip(run_starts, run_ends):
+        station_idx = station_codes[start]
+        key = keys[key_codes[start]]
+        axis_num = '' if station_idx == 0 else str(station_idx + 1)
+        traces.append({
+            'type': trace_type,
+            'x': dates[start:end],
+            'y': rides[start:end],
+            'mode': 'lines+markers',
+            'hovertemplate': f'Station: {station_names[station_idx]}<br>Rides: %{{y}}<br>Mon-Yr: %{{x}}<br>Key: {key}<extra></extra>',
+            'name': _trace_name(key),
+            'line': {'color': color_map[key]},
+            'xaxis': f'x{axis_num}',
+            'yaxis': f'y{axis_num}'
+        })
+
+    return {'data': traces, 'layout': _grid_layout(title, station_names, num_rows, num_columns)}
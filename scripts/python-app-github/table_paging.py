@@ -0,0 +1,129 @@
+import math
+
+import pandas as pd
+
+#----- DataTable filter operators, longest first so '>=' wins over '>'
+FILTER_OPERATORS = [
+    ['ge ', '>='],
+    ['le ', '<='],
+    ['lt ', '<'],
+    ['gt ', '>'],
+    ['ne ', '!='],
+    ['eq ', '='],
+    ['contains '],
+    ['datestartswith ']
+]
+
+
+def split_filter_part(filter_part):
+    #----- '{rides} > 1000' -> ('rides', 'gt', 1000); same parsing as the Dash custom filtering docs
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                return name, operator_type[0].strip(), value
+
+    return None, None, None
+
+
+def _column(df, name):
+    #----- Year columns have integer ids but arrive from the browser as strings
+    if name in df.columns:
+        return name
+    try:
+        return int(name) if int(name) in df.columns else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_text(value):
+    #----- The parser turns '5' into 5.0; a text column should see '5'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _compare(series, operator, value):
+    #----- Mask for one comparison, None when it can't apply to the column; the native DataTable filter skips those clauses too
+    try:
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            if not isinstance(value, (int, float)):
+                return None
+            return getattr(series, operator)(value)
+        #----- Text and categorical columns compare as strings, so '<' and '>' work on unordered categories
+        return getattr(series.astype(object).astype(str), operator)(_as_text(value))
+    except TypeError:
+        return None
+
+
+def apply_filter(df, filter_query, display=None):
+    """Rows of `df` matching a DataTable filter query.
+
+    `display` maps columns to the formatter the table shows them with;
+    'contains' and 'datestartswith' match that text, comparisons the raw
+    values.
+    """
+    if not filter_query:
+        return df
+
+    display = display or {}
+    for filter_part in filter_query.split(' && '):
+        name, operator, value = split_filter_part(filter_part)
+        col = _column(df, name)
+        if col is None:
+            continue
+
+        if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            mask = _compare(df[col], operator, value)
+            if mask is not None:
+                df = df.loc[mask]
+        elif operator in ('contains', 'datestartswith'):
+            shown = df[col].map(display[col]) if col in display else df[col]
+            shown = shown.astype(object).astype(str)
+            if operator == 'contains':
+                df = df.loc[shown.str.contains(_as_text(value), case=False, regex=False)]
+            else:
+                df = df.loc[shown.str.startswith(_as_text(value))]
+    return df
+
+
+def apply_sort(df, sort_by):
+    if not sort_by:
+        return df
+
+    cols, ascending = [], []
+    for sort in sort_by:
+        col = _column(df, sort['column_id'])
+        if col is not None:
+            cols.append(col)
+            ascending.append(sort['direction'] == 'asc')
+    if not cols:
+        return df
+    return df.sort_values(by=cols, ascending=ascending, kind='mergesort')
+
+
+def page_of(df, page_current, page_size, sort_by=None, filter_query=None, display=None):
+    """Filter, sort and slice one page of `df` server-side.
+
+    Returns (page frame, page count, page index). `page_current` is clamped
+    so a page index left over from a bigger selection still returns the last
+    page; the callback sends the clamped index back so the table labels it
+    right. `display` is passed on to apply_filter.
+    """
+    df = apply_sort(apply_filter(df, filter_query, display), sort_by)
+    page_count = max(1, math.ceil(len(df) / page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    start = page_current * page_size
+    return df.iloc[start:start + page_size], page_count, page_current